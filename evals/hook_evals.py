@@ -11,12 +11,20 @@ Tests:
   - Boulder resume injection
   - Stop continuation (ULW enabled blocks, all disabled allows, max blocks auto-disables,
     continuation disabled allows)
+  - Plan checklist index (parse, cache reuse/rebuild, resume progress, excerpt, tick)
+  - Boulder registry (per-session resolution, single-plan fallback, legacy fallback)
+  - Handoff generation (state + redacted event tail)
+  - Ralph loop (block increments once, custom done_marker, max_iterations, concurrent rewrite)
+  - Stop continuation script (one transaction, lock busy writes nothing)
+  - Debug logger (buffered JSONL records, rotation, evidence budget)
+  - Hook input recorder (ring bound, redaction, export, replay)
 """
 
 import io
 import json
 import os
 import sys
+import time
 from datetime import datetime, timezone
 
 import pytest
@@ -28,9 +36,20 @@ if ROOT_DIR not in sys.path:
 
 DATASETS = os.path.join(ROOT_DIR, "evals", "datasets")
 
+import scripts._debug as debug_mod
 from scripts.detect import detect_ulw
 from scripts.sanitize import HookInput
 import scripts.hook_router as hook_router
+import scripts.boulder as boulder_mod
+from scripts.boulder import bind_session, plan_slug, resolve_boulder_path, start_boulder
+from scripts.handoff import build_handoff, tail_events, write_handoff
+from scripts.plan import (
+    build_index, format_tick, index_cache_path, load_index, next_task, plan_excerpt, tick_task,
+)
+import scripts.plan as plan_mod
+from scripts.ralph import load_ralph, save_ralph
+from scripts import recorder, telemetry
+from scripts.stop_continuation import format_summary, stop_continuation
 from scripts.state import write_json
 
 
@@ -48,6 +67,12 @@ _pretool_data = _load_dataset("pretool-cases.json")
 _hook_data = _load_dataset("hook-inputs.json")
 
 
+@pytest.fixture(autouse=True)
+def _isolated_plan_index(tmp_path, monkeypatch):
+    """Plan index caches go under tmp_path, never into the checkout."""
+    monkeypatch.setattr(plan_mod, "PLAN_INDEX_DIR", str(tmp_path / "plan-index"))
+
+
 # ---- ULW Detection Tests -----------------------------------------------------
 
 
@@ -335,5 +360,777 @@ class TestStopContinuation:
         )
 
 
+# ---- Plan Index Tests --------------------------------------------------------
+
+
+_PLAN_TEXT = """# Plan
+
+## Context
+Something.
+
+## Tasks
+- [x] 1. Scaffold module
+- [X] 2. Write parser
+  - [ ] sub-step without a number
+- [ ] 3. Wire into hook
+- [ ] 4. Document
+
+## Verification
+- run evals
+"""
+
+
+class TestPlanIndex:
+    """Checklist indexing for boulder plans."""
+
+    def test_parses_numbered_tasks(self, tmp_path):
+        plan = tmp_path / "plan.md"
+        plan.write_text(_PLAN_TEXT)
+        index = build_index(str(plan))
+        assert [t["number"] for t in index["tasks"]] == [1, 2, 3, 4]
+        assert (index["done"], index["total"]) == (2, 4)
+        third = index["tasks"][2]
+        assert third["label"] == "Wire into hook"
+        raw = plan.read_bytes()
+        assert raw[third["offset"]:].startswith(b"- [ ] 3. Wire into hook")
+        assert raw.split(b"\n")[third["line"] - 1].startswith(b"- [ ] 3.")
+        assert next_task(index)["number"] == 3
+
+    def test_cache_reused_until_plan_changes(self, tmp_path, monkeypatch):
+        plan = tmp_path / "plan.md"
+        plan.write_text(_PLAN_TEXT)
+        first = load_index(str(plan))
+        assert os.path.isfile(index_cache_path(str(plan)))
+
+        def _no_rebuild(*args, **kwargs):
+            raise AssertionError("plan was re-parsed despite unchanged mtime/size")
+
+        with monkeypatch.context() as patched:
+            patched.setattr(plan_mod, "build_index", _no_rebuild)
+            assert load_index(str(plan)) == first
+
+        plan.write_text(_PLAN_TEXT.replace("- [ ] 3.", "- [x] 3."))
+        updated = load_index(str(plan))
+        assert updated["done"] == 3
+        assert next_task(updated)["number"] == 4
+
+    def test_cache_lives_in_state_dir_not_next_to_plan(self, tmp_path):
+        plans = tmp_path / "readonly"
+        plans.mkdir()
+        plan = plans / "plan.md"
+        plan.write_text(_PLAN_TEXT)
+        os.chmod(plans, 0o555)
+        try:
+            assert load_index(str(plan))["total"] == 4
+            assert os.listdir(plans) == ["plan.md"]
+        finally:
+            os.chmod(plans, 0o755)
+        cache = index_cache_path(str(plan))
+        assert os.path.dirname(cache) == plan_mod.PLAN_INDEX_DIR
+        assert os.path.basename(cache) == f"{plan_slug(str(plan))}.json"
+        assert os.path.isfile(cache)
+
+    def test_missing_plan_returns_none(self, tmp_path):
+        assert load_index(str(tmp_path / "nope.md")) is None
+
+    def test_resume_block_shows_progress(self, tmp_path, monkeypatch):
+        plan = tmp_path / ".agent-kit" / "plans" / "p.md"
+        plan.parent.mkdir(parents=True)
+        plan.write_text(_PLAN_TEXT)
+        boulder_file = str(tmp_path / ".agent-kit" / "boulder.json")
+        write_json(boulder_file, {
+            "version": 1, "active": True, "status": "in_progress",
+            "planPath": str(plan), "currentTask": {"number": 3, "label": "Wire into hook"},
+        })
+        monkeypatch.setattr(hook_router, "BOULDER_FILE", boulder_file)
+        block = hook_router._resume_block(_make_hook_input())
+        assert "- Progress: 2/4 tasks done" in block
+        assert "- Next unchecked task: 3. Wire into hook" in block
+        assert "- Plan excerpt:" in block
+        assert "    - [ ] 3. Wire into hook" in block
+        assert "    ## Verification" in block
+
+    def test_excerpt_windows_current_task_and_verification(self, tmp_path):
+        plan = tmp_path / "plan.md"
+        plan.write_text(_PLAN_TEXT + "\n## Notes\nnot included\n")
+        index = load_index(str(plan))
+        assert index["verification"]["line"] == 13
+        assert plan_excerpt(str(plan), index, 4, context=1) == [
+            "- [ ] 3. Wire into hook",
+            "- [ ] 4. Document",
+            "",
+            "## Verification",
+            "- run evals",
+        ]
+
+    def test_excerpt_respects_byte_budget(self, tmp_path):
+        plan = tmp_path / "plan.md"
+        plan.write_text(_PLAN_TEXT)
+        index = load_index(str(plan))
+        excerpt = plan_excerpt(str(plan), index, 3, budget=60)
+        assert excerpt[-1] == "[... truncated]"
+        assert sum(len(line) + 1 for line in excerpt[:-1]) <= 60
+        assert "## Verification" not in excerpt
+
+    def _registered_plan(self, tmp_path):
+        plan = tmp_path / ".agent-kit" / "plans" / "p.md"
+        plan.parent.mkdir(parents=True)
+        plan.write_text(_PLAN_TEXT)
+        boulder_file = str(tmp_path / ".agent-kit" / "boulder.json")
+        start_boulder(boulder_file, str(plan), "s-a", {"number": 3, "label": "Wire into hook"},
+                      "2026-02-22T19:00:00Z")
+        return plan, boulder_file
+
+    def test_tick_flips_checkbox_and_advances_boulder(self, tmp_path):
+        plan, boulder_file = self._registered_plan(tmp_path)
+        load_index(str(plan))
+        result = tick_task(str(plan), 3, boulder_file)
+        assert result["ok"]
+        assert plan.read_text() == _PLAN_TEXT.replace("- [ ] 3.", "- [x] 3.")
+        assert format_tick(result) == "Ticked 3. Wire into hook (3/4 done); next: 4. Document"
+
+        boulder = json.loads((tmp_path / ".agent-kit" / "boulders" / "p.json").read_text())
+        assert boulder["currentTask"] == {"number": 4, "label": "Document"}
+        assert boulder["updatedAt"] != "2026-02-22T19:00:00Z"
+        assert boulder["active"] is True
+        # Cache was refreshed in the same transaction
+        assert load_index(str(plan))["done"] == 3
+
+    def test_tick_last_task_completes_boulder(self, tmp_path):
+        plan, boulder_file = self._registered_plan(tmp_path)
+        tick_task(str(plan), 3, boulder_file)
+        result = tick_task(str(plan), 4, boulder_file)
+        assert format_tick(result).endswith("(4/4 done); plan complete, boulder done")
+
+        boulder = json.loads((tmp_path / ".agent-kit" / "boulders" / "p.json").read_text())
+        assert (boulder["status"], boulder["active"]) == ("done", False)
+        index = json.loads((tmp_path / ".agent-kit" / "boulders" / "index.json").read_text())
+        assert index["plans"]["p"]["status"] == "done"
+        assert "s-a" not in index["sessions"]
+
+    def test_tick_is_idempotent_and_survives_stale_index(self, tmp_path):
+        plan, boulder_file = self._registered_plan(tmp_path)
+        # Cache still matches (mtime, size) but its offsets point at the wrong lines
+        stale = build_index(str(plan))
+        for task in stale["tasks"]:
+            task["offset"] += 1
+        write_json(index_cache_path(str(plan)), stale)
+        assert tick_task(str(plan), 3, boulder_file)["ok"]
+        assert tick_task(str(plan), 3, boulder_file)["done"] == 3
+        assert plan.read_text().count("- [x] 3. Wire into hook") == 1
+
+    def test_tick_preserves_non_utf8_bytes(self, tmp_path):
+        plan, boulder_file = self._registered_plan(tmp_path)
+        raw = plan.read_bytes().replace(b"# ", b"# caf\xe9 ", 1)
+        plan.write_bytes(raw)
+        result = tick_task(str(plan), 3, boulder_file)
+        assert result["ok"], result["error"]
+        assert plan.read_bytes() == raw.replace(b"- [ ] 3.", b"- [x] 3.", 1)
+
+    def test_tick_unknown_task_fails_without_writing(self, tmp_path):
+        plan, boulder_file = self._registered_plan(tmp_path)
+        result = tick_task(str(plan), 9, boulder_file)
+        assert not result["ok"]
+        assert "task 9 not found" in format_tick(result)
+        assert plan.read_text() == _PLAN_TEXT
+
+    def test_tick_with_busy_boulder_writes_nothing(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(plan_mod, "PLAN_LOCK_WAIT_SECONDS", 0.05)
+        plan, boulder_file = self._registered_plan(tmp_path)
+        boulder_path = str(tmp_path / ".agent-kit" / "boulders" / "p.json")
+        os.mkdir(boulder_path + ".lock")
+        result = tick_task(str(plan), 3, boulder_file)
+        assert not result["ok"]
+        assert "boulder busy" in result["error"]
+        assert plan.read_text() == _PLAN_TEXT
+
+    def test_tick_rolls_back_plan_when_boulder_write_fails(self, tmp_path, monkeypatch):
+        plan, boulder_file = self._registered_plan(tmp_path)
+        boulder_path = str(tmp_path / ".agent-kit" / "boulders" / "p.json")
+        before = open(boulder_path).read()
+        real_rename = os.rename
+
+        def failing_rename(src, dst):
+            if dst == boulder_path:
+                raise OSError("disk full")
+            return real_rename(src, dst)
+
+        monkeypatch.setattr(os, "rename", failing_rename)
+        result = tick_task(str(plan), 3, boulder_file)
+        assert not result["ok"]
+        assert plan.read_text() == _PLAN_TEXT
+        assert open(boulder_path).read() == before
+
+    def test_tick_keeps_plan_permissions(self, tmp_path):
+        plan, boulder_file = self._registered_plan(tmp_path)
+        os.chmod(plan, 0o640)
+        assert tick_task(str(plan), 3, boulder_file)["ok"]
+        assert os.stat(plan).st_mode & 0o777 == 0o640
+
+
+# ---- Boulder Registry Tests --------------------------------------------------
+
+
+class TestBoulderRegistry:
+    """Multiple concurrent boulders in one checkout."""
+
+    def _now(self):
+        return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def _setup(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)  # plan paths below are relative to the checkout
+        runtime_file = _setup_runtime_state(tmp_path, "sisyphus")
+        boulder_file = str(tmp_path / ".agent-kit" / "boulder.json")
+        monkeypatch.setattr(hook_router, "RUNTIME_FILE", runtime_file)
+        monkeypatch.setattr(hook_router, "BOULDER_FILE", boulder_file)
+        monkeypatch.setattr(hook_router, "RALPH_FILE", str(tmp_path / ".agent-kit" / "ralph.md"))
+        return boulder_file
+
+    def test_sessions_resolve_their_own_plan(self, tmp_path, monkeypatch):
+        boulder_file = self._setup(tmp_path, monkeypatch)
+        start_boulder(boulder_file, ".agent-kit/plans/alpha.md", "s-a",
+                      {"number": 1, "label": "Alpha one"}, self._now())
+        start_boulder(boulder_file, ".agent-kit/plans/beta.md", "s-b",
+                      {"number": 4, "label": "Beta four"}, self._now())
+
+        assert resolve_boulder_path(boulder_file, "s-a").endswith("alpha.json")
+        assert resolve_boulder_path(boulder_file, "s-b").endswith("beta.json")
+
+        out_a = hook_router._resume_block(_make_hook_input(session_id="s-a"))
+        out_b = hook_router._resume_block(_make_hook_input(session_id="s-b"))
+        assert "alpha.md" in out_a and "Alpha one" in out_a
+        assert "beta.md" in out_b and "Beta four" in out_b
+
+    def test_new_session_resumes_plan_after_bind(self, tmp_path, monkeypatch):
+        boulder_file = self._setup(tmp_path, monkeypatch)
+        path = start_boulder(boulder_file, ".agent-kit/plans/solo.md", "s-a",
+                             {"number": 2, "label": "Solo two"}, self._now())
+        new = _make_hook_input(session_id="new-session")
+
+        # Not adopted on its own, but SessionStart points at the plan
+        assert resolve_boulder_path(boulder_file, "new-session") == boulder_file
+        assert not hook_router._boulder_active(new)
+        out = _capture_stdout(hook_router.handle_session_start, new)
+        assert ".agent-kit/plans/solo.md" in out
+        assert "boulder.py bind <planPath> --session new-session" in out
+
+        # start-work binds it; the session then resumes the same boulder
+        assert bind_session(boulder_file, ".agent-kit/plans/solo.md", "new-session") == path
+        assert hook_router._boulder_active(new)
+        assert "Solo two" in _capture_stdout(hook_router.handle_session_start, new)
+        assert bind_session(boulder_file, ".agent-kit/plans/other.md", "new-session") is None
+
+    def test_cli_start_without_session_binds_global(self, tmp_path, monkeypatch):
+        self._setup(tmp_path, monkeypatch)
+        monkeypatch.setattr(sys, "argv", ["boulder.py", "start", ".agent-kit/plans/solo.md"])
+        path = _capture_stdout(boulder_mod.main).strip()
+
+        assert path.endswith("solo.json")
+        assert hook_router._boulder_active(_make_hook_input())
+        monkeypatch.setattr(sys, "argv", ["boulder.py", "resolve"])
+        assert _capture_stdout(boulder_mod.main).strip() == path
+
+        plan = tmp_path / ".agent-kit" / "plans" / "solo.md"
+        plan.parent.mkdir(parents=True, exist_ok=True)
+        plan.write_text(_PLAN_TEXT)
+        monkeypatch.setattr(sys, "argv", ["plan.py", "tick", "3"])
+        with pytest.raises(SystemExit) as exit_info:
+            _capture_stdout(plan_mod.main)
+        assert exit_info.value.code == 0
+        assert json.loads(open(path).read())["currentTask"]["number"] == 4
+
+    def test_same_name_plans_in_subdirectories_get_own_boulders(self, tmp_path, monkeypatch):
+        boulder_file = self._setup(tmp_path, monkeypatch)
+        path_a = start_boulder(boulder_file, ".agent-kit/plans/a/roadmap.md", "s-a",
+                               {"number": 1, "label": "A"}, self._now())
+        path_b = start_boulder(boulder_file, ".agent-kit/plans/b/roadmap.md", "s-b",
+                               {"number": 2, "label": "B"}, self._now())
+
+        assert path_a != path_b
+        assert os.path.basename(path_a).startswith("roadmap-")
+        assert plan_slug(".agent-kit/plans/top.md") == "top"
+        assert "A" in hook_router._resume_block(_make_hook_input(session_id="s-a"))
+        assert "B" in hook_router._resume_block(_make_hook_input(session_id="s-b"))
+
+    def test_ambiguous_unbound_session_falls_back_to_legacy(self, tmp_path, monkeypatch):
+        boulder_file = self._setup(tmp_path, monkeypatch)
+        start_boulder(boulder_file, ".agent-kit/plans/a.md", "s-a", {}, self._now())
+        start_boulder(boulder_file, ".agent-kit/plans/b.md", "s-b", {}, self._now())
+        assert resolve_boulder_path(boulder_file, "s-c") == boulder_file
+        assert not hook_router._boulder_active(_make_hook_input(session_id="s-c"))
+
+    def test_stale_registry_boulder_is_cleared_in_index(self, tmp_path, monkeypatch):
+        boulder_file = self._setup(tmp_path, monkeypatch)
+        start_boulder(boulder_file, ".agent-kit/plans/old.md", "s-a", {}, "2020-01-01T00:00:00Z")
+        assert not hook_router._boulder_active(_make_hook_input(session_id="s-a"))
+
+        index = json.loads((tmp_path / ".agent-kit" / "boulders" / "index.json").read_text())
+        assert index["plans"]["old"]["status"] == "stale_auto_cleared"
+        assert index["plans"]["old"]["active"] is False
+        assert "s-a" not in index["sessions"]
+
+
+# ---- Handoff Tests -----------------------------------------------------------
+
+
+class TestHandoff:
+    """Deterministic handoff generation from local state."""
+
+    def test_builds_from_boulder_plan_runtime_and_events(self, tmp_path):
+        plan = tmp_path / ".agent-kit" / "plans" / "p.md"
+        plan.parent.mkdir(parents=True)
+        plan.write_text(_PLAN_TEXT)
+        boulder_file = str(tmp_path / ".agent-kit" / "boulder.json")
+        start_boulder(boulder_file, str(plan), "global", {"number": 3, "label": "Wire into hook"})
+        runtime_file = _setup_runtime_state(tmp_path, "atlas")
+        log = tmp_path / "hook-router.jsonl"
+        log.write_text(
+            '{"ts":1767225600.0,"event":"Stop","session":"global","phase":"Stop","msg":"handler",'
+            '"apiKey":"hunter2"}\n'
+            '{"event":"Stop","session":"global","msg":"plain api_key=hunter2 line"}\n'
+        )
+
+        text = build_handoff("global", boulder_file=boulder_file, runtime_file=runtime_file,
+                             log_path=str(log), now="2026-01-01T00:00:00Z")
+        assert f"- Active plan: {plan}" in text
+        assert "- Current task: 3. Wire into hook" in text
+        assert "- Progress: 2/4 tasks done" in text
+        assert "- Next unchecked task: 3. Wire into hook" in text
+        assert "- Persona: atlas" in text
+        assert "00:00:00 Stop Stop handler apiKey=[REDACTED]" in text
+        assert "api_key=[REDACTED]" in text
+        assert "hunter2" not in text
+        assert "/claude-agent-kit:start-work" in text
+
+        out = tmp_path / ".agent-kit" / "handoff" / "last.md"
+        assert write_handoff(text, str(out))
+        assert out.read_text() == text
+
+    def test_missing_state_fails_open(self, tmp_path):
+        text = build_handoff("", boulder_file=str(tmp_path / "boulder.json"),
+                             runtime_file=str(tmp_path / "runtime.json"),
+                             log_path=str(tmp_path / "none.log"))
+        assert "- Active plan: none" in text
+        assert "- Runtime state: none" in text
+        assert "- none recorded" in text
+
+    def test_tail_reads_only_last_events(self, tmp_path):
+        log = tmp_path / "hook-router.jsonl"
+        log.write_text("".join(f"line {i} {'x' * 100}\n" for i in range(1000)))
+        events = tail_events(str(log), limit=3)
+        assert [e.split()[1] for e in events] == ["997", "998", "999"]
+
+    def test_handoff_keeps_only_its_sessions_events(self, tmp_path):
+        log = tmp_path / "hook-router.jsonl"
+        lines = []
+        for i in range(300):
+            session = "s-a" if i % 10 == 0 else "s-b"
+            lines.append(json.dumps({"event": "Stop", "session": session, "msg": f"{session}-{i}"}))
+        lines.append("unattributed line")
+        log.write_text("\n".join(lines) + "\n")
+
+        events = tail_events(str(log), limit=3, session_key="s-a")
+        assert [e.split()[-1] for e in events] == ["s-a-270", "s-a-280", "s-a-290"]
+        text = build_handoff("s-a", boulder_file=str(tmp_path / "boulder.json"),
+                             runtime_file=str(tmp_path / "runtime.json"), log_path=str(log))
+        assert "s-a-290" in text
+        assert "s-b-" not in text and "unattributed" not in text
+
+
+# ---- Ralph Loop Tests --------------------------------------------------------
+
+
+_RALPH_TEMPLATE = """# ralph-loop
+
+status: active
+created_at: 2026-02-22T19:00:00Z
+max_iterations: {max_iterations}
+iterations: {iterations}
+
+goal: |
+  ship it
+
+done_marker: "{marker}"
+"""
+
+
+class TestRalphLoop:
+    """Stop handler behaviour driven by .agent-kit/ralph-loop.local.md."""
+
+    def _setup(self, tmp_path, monkeypatch, iterations=0, max_iterations=8, marker="RALPH_DONE"):
+        state_dir = tmp_path / ".agent-kit" / "state"
+        state_dir.mkdir(parents=True, exist_ok=True)
+        runtime_file = str(state_dir / "runtime.local.json")
+        write_json(runtime_file, {"version": 1, "sessions": {}})
+        ralph_file = tmp_path / ".agent-kit" / "ralph-loop.local.md"
+        ralph_file.write_text(_RALPH_TEMPLATE.format(
+            iterations=iterations, max_iterations=max_iterations, marker=marker,
+        ))
+        monkeypatch.setattr(hook_router, "RUNTIME_FILE", runtime_file)
+        monkeypatch.setattr(hook_router, "BOULDER_FILE", str(tmp_path / ".agent-kit" / "boulder.json"))
+        monkeypatch.setattr(hook_router, "RALPH_FILE", str(ralph_file))
+        return ralph_file
+
+    def test_active_loop_blocks_and_increments(self, tmp_path, monkeypatch):
+        ralph_file = self._setup(tmp_path, monkeypatch, iterations=2)
+        output = _capture_stdout(hook_router.handle_stop, _make_hook_input(event="Stop"))
+        assert '"decision":"block"' in output
+        state = load_ralph(str(ralph_file))
+        assert state.iterations == 3
+        assert state.status == "active"
+        assert "goal: |\n  ship it" in ralph_file.read_text()
+
+    def test_custom_done_marker_is_honored(self, tmp_path, monkeypatch):
+        ralph_file = self._setup(tmp_path, monkeypatch, marker="SHIPPED")
+        hook_input = _make_hook_input(event="Stop", assistant_text="all good SHIPPED")
+        output = _capture_stdout(hook_router.handle_stop, hook_input)
+        assert '"decision":"block"' not in output
+        assert load_ralph(str(ralph_file)).status == "done"
+
+    def test_default_marker_ignored_when_custom_set(self, tmp_path, monkeypatch):
+        ralph_file = self._setup(tmp_path, monkeypatch, marker="SHIPPED")
+        hook_input = _make_hook_input(event="Stop", assistant_text="RALPH_DONE")
+        output = _capture_stdout(hook_router.handle_stop, hook_input)
+        assert '"decision":"block"' in output
+        assert load_ralph(str(ralph_file)).status == "active"
+
+    def test_max_iterations_marks_done(self, tmp_path, monkeypatch):
+        ralph_file = self._setup(tmp_path, monkeypatch, iterations=8, max_iterations=8)
+        output = _capture_stdout(hook_router.handle_stop, _make_hook_input(event="Stop"))
+        assert '"decision":"block"' not in output
+        state = load_ralph(str(ralph_file))
+        assert state.status == "done"
+        assert state.iterations == 8
+
+    def test_status_change_does_not_add_iterations(self, tmp_path):
+        ralph_file = tmp_path / "ralph-loop.local.md"
+        ralph_file.write_text("# ralph-loop\n\nstatus: active\n")
+        state = load_ralph(str(ralph_file))
+        state.mark_done()
+        assert save_ralph(state) is True
+        assert ralph_file.read_text() == "# ralph-loop\n\nstatus: done\n"
+
+    def test_concurrent_rewrite_wins(self, tmp_path, monkeypatch):
+        ralph_file = self._setup(tmp_path, monkeypatch, iterations=1)
+        state = load_ralph(str(ralph_file))
+        ralph_file.write_text(ralph_file.read_text().replace("status: active", "status: cancelled"))
+        state.increment()
+        assert save_ralph(state) is False
+        assert load_ralph(str(ralph_file)).status == "cancelled"
+        assert not os.path.exists(str(ralph_file) + ".lock")
+
+
+# ---- Stop Continuation Script Tests ------------------------------------------
+
+
+class TestStopContinuationScript:
+    """One-shot escape hatch across runtime, ralph and boulder state."""
+
+    def _setup(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        agent_dir = tmp_path / ".agent-kit"
+        (agent_dir / "state").mkdir(parents=True)
+        runtime_file = str(agent_dir / "state" / "runtime.local.json")
+        write_json(runtime_file, {"version": 1, "sessions": {"s-a": {"ulw": {"enabled": True}}}})
+        ralph_file = agent_dir / "ralph-loop.local.md"
+        ralph_file.write_text(_RALPH_TEMPLATE.format(iterations=0, max_iterations=8, marker="RALPH_DONE"))
+        boulder_file = str(agent_dir / "boulder.json")
+        start_boulder(boulder_file, ".agent-kit/plans/p.md", "s-a", {}, "2099-01-01T00:00:00Z")
+        monkeypatch.setattr(hook_router, "RUNTIME_FILE", runtime_file)
+        monkeypatch.setattr(hook_router, "BOULDER_FILE", boulder_file)
+        monkeypatch.setattr(hook_router, "RALPH_FILE", str(ralph_file))
+        return runtime_file, str(ralph_file), boulder_file
+
+    def test_disables_everything_in_one_call(self, tmp_path, monkeypatch):
+        runtime_file, ralph_file, boulder_file = self._setup(tmp_path, monkeypatch)
+        hook_input = _make_hook_input(event="Stop", session_id="s-a")
+        assert '"decision":"block"' in _capture_stdout(hook_router.handle_stop, hook_input)
+
+        result = stop_continuation("s-a", runtime_file=runtime_file, ralph_file=ralph_file,
+                                   boulder_file=boulder_file)
+        assert result["ok"] and result["ralph"]
+        assert "ralph loop: cancelled" in format_summary(result)
+
+        session = json.loads(open(runtime_file).read())["sessions"]["s-a"]
+        assert session["stopContinuation"]["disabled"] is True
+        assert session["ulw"]["enabled"] is False
+        assert load_ralph(ralph_file).status == "cancelled"
+        boulder = json.loads((tmp_path / ".agent-kit" / "boulders" / "p.json").read_text())
+        assert (boulder["active"], boulder["status"]) == (False, "done")
+        index = json.loads((tmp_path / ".agent-kit" / "boulders" / "index.json").read_text())
+        assert index["sessions"] == {}
+        assert not os.path.exists(boulder_file)
+
+        assert '"decision":"block"' not in _capture_stdout(hook_router.handle_stop, hook_input)
+
+    def test_lock_busy_writes_nothing(self, tmp_path, monkeypatch):
+        import scripts.state as state_mod
+
+        runtime_file, ralph_file, boulder_file = self._setup(tmp_path, monkeypatch)
+        monkeypatch.setattr(state_mod, "BATCH_LOCK_WAIT_SECONDS", 0.0)
+        ralph_before = open(ralph_file).read()
+        os.mkdir(ralph_file + ".lock")
+        try:
+            result = stop_continuation("s-a", runtime_file=runtime_file, ralph_file=ralph_file,
+                                       boulder_file=boulder_file)
+        finally:
+            os.rmdir(ralph_file + ".lock")
+        assert not result["ok"]
+        assert format_summary(result).startswith("stop-continuation failed, nothing written")
+        assert open(ralph_file).read() == ralph_before
+        assert "stopContinuation" not in json.loads(open(runtime_file).read())["sessions"]["s-a"]
+
+    def test_index_update_rolls_back_with_the_batch(self, tmp_path, monkeypatch):
+        runtime_file, ralph_file, boulder_file = self._setup(tmp_path, monkeypatch)
+        registry = tmp_path / ".agent-kit" / "boulders"
+        boulder_before = (registry / "p.json").read_text()
+        index_file = str(registry / "index.json")
+        real_rename = os.rename
+
+        def failing_rename(src, dst):
+            if dst == index_file:
+                raise OSError("disk full")
+            return real_rename(src, dst)
+
+        monkeypatch.setattr(os, "rename", failing_rename)
+        result = stop_continuation("s-a", runtime_file=runtime_file, ralph_file=ralph_file,
+                                   boulder_file=boulder_file)
+        assert not result["ok"]
+        assert (registry / "p.json").read_text() == boulder_before
+        assert json.loads(open(index_file).read())["sessions"] == {"s-a": "p"}
+        assert "stopContinuation" not in json.loads(open(runtime_file).read())["sessions"]["s-a"]
+
+    def test_dotted_plan_slug_is_marked_done_in_index(self, tmp_path, monkeypatch):
+        runtime_file, ralph_file, boulder_file = self._setup(tmp_path, monkeypatch)
+        start_boulder(boulder_file, ".agent-kit/plans/v1.2.md", "s-b", {}, "2099-01-01T00:00:00Z")
+        assert stop_continuation("s-b", runtime_file=runtime_file, ralph_file=ralph_file,
+                                 boulder_file=boulder_file)["ok"]
+
+        index = json.loads((tmp_path / ".agent-kit" / "boulders" / "index.json").read_text())
+        assert (index["plans"]["v1.2"]["active"], index["plans"]["v1.2"]["status"]) == (False, "done")
+        assert index["sessions"] == {"s-a": "p"}
+
+
+# ---- Debug Logger Tests ------------------------------------------------------
+
+
+def _read_jsonl(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def _setup_debug(tmp_path, monkeypatch, **env):
+    """Point the debug logger at tmp_path with a fresh buffer and enable it."""
+    debug_dir = tmp_path / "evidence" / "debug"
+    monkeypatch.setattr(debug_mod, "DEBUG_DIR", str(debug_dir))
+    monkeypatch.setattr(debug_mod, "_AGE_CHECKED", set())
+    monkeypatch.setattr(debug_mod, "_BUFFER", {})
+    monkeypatch.setattr(debug_mod, "_CONTEXT", {})
+    monkeypatch.setattr(debug_mod, "_ATEXIT_REGISTERED", True)
+    monkeypatch.setenv("AGENT_KIT_DEBUG", "1")
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    return debug_dir
+
+
+class TestDebugLogger:
+    """Buffered structured JSONL debug records."""
+
+    def test_records_buffer_until_flush(self, tmp_path, monkeypatch):
+        debug_dir = _setup_debug(tmp_path, monkeypatch)
+        debug_mod.set_context(event="Stop", session="s-a")
+        debug_mod.debug("handler", phase="Stop")
+        debug_mod.debug("state_checked", phase="Stop", ulw=True)
+        assert not (debug_dir / "hook-router.jsonl").exists()
+
+        debug_mod.flush()
+        records = _read_jsonl(debug_dir / "hook-router.jsonl")
+        assert [r["msg"] for r in records] == ["handler", "state_checked", "exit"]
+        assert all(r["event"] == "Stop" and r["session"] == "s-a" for r in records)
+        assert records[1]["ulw"] is True
+        assert records[0]["us"] <= records[1]["us"] <= records[2]["us"]
+        assert "ulw" not in records[2]
+
+    def test_disabled_records_nothing(self, tmp_path, monkeypatch):
+        debug_dir = _setup_debug(tmp_path, monkeypatch)
+        monkeypatch.delenv("AGENT_KIT_DEBUG")
+        debug_mod.debug("handler", phase="Stop")
+        debug_mod.flush()
+        assert not debug_dir.exists()
+
+    def test_hook_run_writes_one_batch(self, tmp_path, monkeypatch):
+        import scripts.sanitize as sanitize_mod
+
+        debug_dir = _setup_debug(tmp_path, monkeypatch)
+        monkeypatch.setattr(sanitize_mod, "HOOK_INPUT_DEBUG_DIR", str(tmp_path / "hook-input"))
+        monkeypatch.setattr(telemetry, "LATENCY_FILE", str(tmp_path / "latency.hist"))
+        monkeypatch.setattr(hook_router, "RUNTIME_FILE", _setup_runtime_state(tmp_path, "sisyphus"))
+        monkeypatch.setattr(hook_router, "BOULDER_FILE", str(tmp_path / "boulder.json"))
+        monkeypatch.setattr(hook_router, "RALPH_FILE", str(tmp_path / "ralph.md"))
+        monkeypatch.setattr(sys, "argv", ["hook_router.py", "Stop"])
+        monkeypatch.setattr(sys, "stdin", io.StringIO('{"session_id": "s-b"}'))
+        _capture_stdout(hook_router.main)
+        debug_mod.flush()
+        records = _read_jsonl(debug_dir / "hook-router.jsonl")
+        assert [r["phase"] for r in records][:2] == ["router", "Stop"]
+        assert {r["session"] for r in records} == {"s-b"}
+
+
+# ---- Debug Log Rotation Tests ------------------------------------------------
+
+
+class TestDebugLogRotation:
+    """Size/age rotation of debug logs and the evidence budget."""
+
+    def test_size_rotation_gzips_segment(self, tmp_path, monkeypatch):
+        import gzip
+
+        debug_dir = _setup_debug(tmp_path, monkeypatch, AGENT_KIT_DEBUG_MAX_BYTES="400")
+        for i in range(20):
+            debug_mod.debug(f"message {i:02d}")
+            debug_mod.flush()
+
+        live = debug_dir / "hook-router.jsonl"
+        segments = sorted(debug_dir.glob("hook-router.*.jsonl.gz"), key=lambda p: p.stat().st_mtime_ns)
+        assert segments
+        assert live.stat().st_size < 400 + 400
+        text = "".join(gzip.open(seg, "rt").read() for seg in segments) + live.read_text()
+        messages = [json.loads(line)["msg"] for line in text.splitlines()]
+        assert [m for m in messages if m != "exit"] == [f"message {i:02d}" for i in range(20)]
+
+    def test_age_rotation_without_gzip(self, tmp_path, monkeypatch):
+        debug_dir = _setup_debug(tmp_path, monkeypatch, AGENT_KIT_DEBUG_GZIP="0")
+        debug_dir.mkdir(parents=True)
+        old = '{"ts":1577836800.0,"msg":"old entry"}\n'
+        (debug_dir / "hook-router.jsonl").write_text(old)
+        debug_mod.debug("new entry")
+        debug_mod.flush()
+        assert _read_jsonl(debug_dir / "hook-router.jsonl")[0]["msg"] == "new entry"
+        rotated = list(debug_dir.glob("hook-router.*.jsonl"))
+        assert len(rotated) == 1
+        assert rotated[0].read_text() == old
+
+    def test_cleanup_enforces_budget_oldest_segments_first(self, tmp_path, monkeypatch):
+        debug_dir = _setup_debug(tmp_path, monkeypatch)
+        debug_dir.mkdir(parents=True)
+        now = time.time()
+        files = {
+            "debug/hook-router.jsonl": 0,
+            "debug/hook-router.20260101T000000.1.jsonl.gz": 300,
+            "debug/hook-router.20260102T000000.2.jsonl.gz": 200,
+            "final/qa.log": 100,
+        }
+        for name, age in files.items():
+            path = tmp_path / "evidence" / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (now - age, now - age))
+
+        report = debug_mod.cleanup_evidence(str(tmp_path / "evidence"), budget=250, now=now)
+        assert (report["bytesBefore"], report["bytesAfter"]) == (400, 200)
+        remaining = sorted(str(p.relative_to(tmp_path / "evidence"))
+                           for p in (tmp_path / "evidence").rglob("*") if p.is_file())
+        assert remaining == ["debug/hook-router.jsonl", "final/qa.log"]
+
+    def test_cleanup_drops_expired_segments_under_budget(self, tmp_path, monkeypatch):
+        debug_dir = _setup_debug(tmp_path, monkeypatch, AGENT_KIT_DEBUG_MAX_AGE_DAYS="1")
+        debug_dir.mkdir(parents=True)
+        old = debug_dir / "hook-router.20200101T000000.1.jsonl.gz"
+        old.write_bytes(b"x")
+        os.utime(old, (time.time() - 3 * 86400,) * 2)
+        report = debug_mod.cleanup_evidence(str(tmp_path / "evidence"), budget=10 ** 9)
+        assert report["removed"] == [str(old)]
+
+
+# ---- Hook Input Recorder Tests -----------------------------------------------
+
+
+class TestHookRecorder:
+    """Opt-in ring buffer of redacted hook inputs and offline replay."""
+
+    def test_ring_keeps_last_inputs_redacted(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_RECORD_MAX", "40")
+        record_dir = str(tmp_path / "sessions")
+        for i in range(100):
+            raw = json.dumps({"session_id": "s/a", "prompt": f"p{i}" + "x" * 3000, "api_key": "k"})
+            assert recorder.record("UserPromptSubmit", ["UserPromptSubmit"], raw, "s/a", i, record_dir)
+
+        segments = os.listdir(recorder.session_dir("s/a", record_dir))
+        assert len(segments) == 3  # ceil(40 / 32) + 1
+        records = recorder.load_session("s/a", record_dir)
+        assert 40 <= len(records) < 40 + 2 * recorder.RECORDS_PER_SEGMENT
+        assert records[-1]["durationUs"] == 99
+        assert records[-1]["input"]["api_key"] == "[REDACTED]"
+        assert len(records[-1]["input"]["prompt"]) == 2000
+
+        dataset = recorder.export_dataset("s/a", record_dir=record_dir)
+        assert [e["input"]["prompt"][:3] for e in dataset["events"]][-2:] == ["p98", "p99"]
+        assert len(dataset["events"]) == 40
+
+    def test_router_records_when_enabled(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(recorder, "RECORD_DIR", str(tmp_path / "sessions"))
+        monkeypatch.setattr(telemetry, "LATENCY_FILE", str(tmp_path / "latency.hist"))
+        monkeypatch.setattr(hook_router, "RUNTIME_FILE", _setup_runtime_state(tmp_path, "sisyphus"))
+        monkeypatch.setattr(hook_router, "BOULDER_FILE", str(tmp_path / "boulder.json"))
+        monkeypatch.setattr(hook_router, "RALPH_FILE", str(tmp_path / "ralph.md"))
+        monkeypatch.setattr(sys, "argv", ["hook_router.py", "Stop"])
+        for enabled in ("0", "1"):
+            monkeypatch.setenv("AGENT_KIT_RECORD", enabled)
+            monkeypatch.setattr(sys, "stdin", io.StringIO('{"session_id": "s-r"}'))
+            _capture_stdout(hook_router.main)
+
+        records = recorder.load_session("s-r", str(tmp_path / "sessions"))
+        assert len(records) == 1
+        assert records[0]["argv"] == ["Stop"]
+        assert records[0]["durationUs"] >= 0
+
+    def test_replay_harness_runs_dataset_in_isolation(self, tmp_path, monkeypatch):
+        import importlib.util
+
+        spec = importlib.util.spec_from_file_location(
+            "hook_replay", os.path.join(ROOT_DIR, "evals", "hook_replay.py"))
+        hook_replay = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(hook_replay)
+
+        runtime = {"version": 1, "sessions": {"global": {"ulw": {"enabled": True}}}}
+        state_dir = tmp_path / "scratch"
+        (state_dir / ".agent-kit" / "state").mkdir(parents=True)
+        (state_dir / ".agent-kit" / "state" / "runtime.local.json").write_text(json.dumps(runtime))
+        events = [
+            {"event": "UserPromptSubmit", "argv": ["UserPromptSubmit"], "input": {"prompt": "hi"}},
+            {"event": "Stop", "argv": ["Stop"], "input": {}, "durationUs": 500},
+        ]
+        results = hook_replay.replay(events, str(state_dir))
+        assert [r["blocked"] for r in results] == [False, True]
+        rows = {row["event"]: row for row in hook_replay.summarize(results)}
+        assert rows["Stop"]["recorded_p50_us"] == 500
+        assert os.getcwd() != str(state_dir)
+
+    def test_replay_disables_every_exporter(self, tmp_path, monkeypatch):
+        import importlib.util
+
+        spec = importlib.util.spec_from_file_location(
+            "hook_replay", os.path.join(ROOT_DIR, "evals", "hook_replay.py"))
+        hook_replay = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(hook_replay)
+
+        spawned = []
+        monkeypatch.setattr(telemetry.subprocess, "Popen", lambda *a, **k: spawned.append(a))
+        jsonl_path = tmp_path / "export.jsonl"
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_EXPORTER", "jsonl")
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_JSONL", str(jsonl_path))
+        state_dir = tmp_path / "scratch"
+        state_dir.mkdir()
+        events = [
+            {"event": "UserPromptSubmit", "argv": ["UserPromptSubmit"], "input": {"prompt": "hi"}},
+            {"event": "Stop", "argv": ["Stop"], "input": {}},
+        ]
+        hook_replay.replay(events, str(state_dir))
+
+        assert not jsonl_path.exists()
+        assert not (state_dir / telemetry.SPOOL_DIR / telemetry.SPOOL_FILE).exists()
+        assert spawned == []
+        assert os.environ["AGENT_KIT_TELEMETRY_EXPORTER"] == "jsonl"
+
+
 if __name__ == "__main__":
     sys.exit(pytest.main([__file__, "-v"]))
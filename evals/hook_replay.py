@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Replay recorded hook inputs through the hook router and report latency.
+
+Reads a dataset exported by `python3 scripts/recorder.py export` and feeds each
+event to hook_router with its recorded argv and (redacted) stdin, in order,
+against an isolated scratch state directory. Reports per-event latency
+percentiles next to the latency recorded in production (`durationUs`), plus
+how many Stop events were blocked.
+
+  --subprocess  run `python3 scripts/hook_router.py` per event (includes
+                interpreter start-up, like Claude Code does); default is
+                in-process, which isolates handler cost.
+
+Telemetry, debug logging and recording are disabled during replay.
+Not part of run_evals.py: results are machine-dependent, not pass/fail.
+
+Usage:
+  python3 evals/hook_replay.py <dataset.json> [--repeat N] [--subprocess] [--json]
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import scripts.hook_router as hook_router
+
+HOOK_ROUTER = os.path.join(ROOT_DIR, "scripts", "hook_router.py")
+_ISOLATED_ENV = (
+    "LANGFUSE_BASE_URL", "LANGFUSE_PUBLIC_KEY", "LANGFUSE_SECRET_KEY",
+    "AGENT_KIT_TELEMETRY_EXPORTER", "AGENT_KIT_TELEMETRY_JSONL",
+    "OTEL_EXPORTER_OTLP_ENDPOINT", "OTEL_EXPORTER_OTLP_HEADERS",
+    "AGENT_KIT_DEBUG", "AGENT_KIT_RECORD",
+)
+
+
+def load_dataset(path: str) -> list:
+    """Events of an exported replay dataset, oldest first."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    events = data.get("events", []) if isinstance(data, dict) else []
+    return [e for e in events if isinstance(e, dict) and e.get("event")]
+
+
+def _run_in_process(argv: list, raw: str) -> tuple:
+    saved = sys.argv, sys.stdin, sys.stdout
+    sys.argv = ["hook_router.py", *argv]
+    sys.stdin = io.StringIO(raw)
+    sys.stdout = io.StringIO()
+    start = time.perf_counter_ns()
+    try:
+        hook_router.main()
+    except Exception as e:  # replay keeps going, like the fail-open router
+        print(f"[hook-replay] {argv}: {e}", file=sys.stderr)
+    finally:
+        elapsed_us = (time.perf_counter_ns() - start) / 1000
+        output = sys.stdout.getvalue()
+        sys.argv, sys.stdin, sys.stdout = saved
+    return elapsed_us, output
+
+
+def _run_subprocess(argv: list, raw: str) -> tuple:
+    start = time.perf_counter_ns()
+    proc = subprocess.run(
+        [sys.executable, HOOK_ROUTER, *argv], input=raw, capture_output=True, text=True,
+    )
+    return (time.perf_counter_ns() - start) / 1000, proc.stdout
+
+
+def replay(events: list, state_dir: str, use_subprocess: bool = False) -> list:
+    """Replay events in order with cwd=state_dir. Returns one result per event."""
+    run = _run_subprocess if use_subprocess else _run_in_process
+    saved_env = {key: os.environ.pop(key) for key in _ISOLATED_ENV if key in os.environ}
+    saved_cwd = os.getcwd()
+    os.chdir(state_dir)
+    results = []
+    try:
+        for event in events:
+            argv = event.get("argv") or [event["event"]]
+            elapsed_us, output = run(argv, json.dumps(event.get("input", {})))
+            results.append({
+                "event": event["event"],
+                "replayUs": elapsed_us,
+                "recordedUs": event.get("durationUs"),
+                "blocked": '"decision":"block"' in output,
+            })
+    finally:
+        os.chdir(saved_cwd)
+        os.environ.update(saved_env)
+    return results
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def summarize(results: list) -> list:
+    """Per-event-type latency rows (microseconds)."""
+    rows = []
+    for name in sorted({r["event"] for r in results}):
+        subset = [r for r in results if r["event"] == name]
+        replayed = sorted(r["replayUs"] for r in subset)
+        recorded = sorted(r["recordedUs"] for r in subset if isinstance(r["recordedUs"], (int, float)))
+        rows.append({
+            "event": name,
+            "count": len(subset),
+            "blocked": sum(1 for r in subset if r["blocked"]),
+            "p50_us": round(_percentile(replayed, 50), 1),
+            "p90_us": round(_percentile(replayed, 90), 1),
+            "p99_us": round(_percentile(replayed, 99), 1),
+            "max_us": round(replayed[-1], 1),
+            "recorded_p50_us": round(_percentile(recorded, 50), 1) if recorded else None,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded hook inputs")
+    parser.add_argument("dataset", help="Dataset from scripts/recorder.py export")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the stream N times")
+    parser.add_argument("--subprocess", action="store_true", help="One router process per event")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    args = parser.parse_args()
+
+    events = load_dataset(args.dataset)
+    if not events:
+        print(f"hook-replay: no events in {args.dataset}", file=sys.stderr)
+        return 1
+
+    results = []
+    for _ in range(max(1, args.repeat)):
+        state_dir = tempfile.mkdtemp(prefix="hook-replay.")
+        try:
+            results.extend(replay(events, state_dir, args.subprocess))
+        finally:
+            shutil.rmtree(state_dir, ignore_errors=True)
+    rows = summarize(results)
+
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+        return 0
+
+    mode = "subprocess" if args.subprocess else "in-process"
+    print(f"hook replay: {len(events)} events x {max(1, args.repeat)} ({mode})")
+    print(f"{'event':<18} {'count':>6} {'blocked':>8} {'p50':>10} {'p90':>10} {'p99':>10} "
+          f"{'max':>10} {'rec p50':>10}  (us)")
+    for row in rows:
+        print(
+            f"{row['event']:<18} {row['count']:>6} {row['blocked']:>8} {row['p50_us']:>10} "
+            f"{row['p90_us']:>10} {row['p99_us']:>10} {row['max_us']:>10} "
+            f"{row['recorded_p50_us'] if row['recorded_p50_us'] is not None else '-':>10}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
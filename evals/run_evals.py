@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 """Orchestrator for the evaluation suite.
 
-Replaces run-evals.sh. Runs hook_evals, state_evals, and prompt_regression
-via subprocess pytest invocations and reports summary.
+Replaces run-evals.sh. Runs hook_evals, state_evals, telemetry_evals, and
+prompt_regression via subprocess pytest invocations and reports summary.
 
 Exit 0 if all pass, 1 if any fail.
 """
@@ -52,6 +52,7 @@ def main():
     suites = [
         ("Hook Evals", os.path.join(SCRIPT_DIR, "hook_evals.py"), True),
         ("State Evals", os.path.join(SCRIPT_DIR, "state_evals.py"), True),
+        ("Telemetry Evals", os.path.join(SCRIPT_DIR, "telemetry_evals.py"), True),
     ]
 
     # Prompt regression is a standalone script, not a pytest module
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Per-write latency benchmark for scripts.state.write_json durability modes.
+
+Writes a runtime-sized JSON document repeatedly in each durability mode
+("none", "file", "file+dir") and reports latency percentiles. The scratch
+directory defaults to .agent-kit/bench/ under the current directory so the
+numbers reflect the filesystem that holds real state (not a tmpfs /tmp).
+
+Not part of run_evals.py: results are machine-dependent, not pass/fail.
+
+Usage:
+  python3 evals/state_bench.py [--writes 200] [--dir PATH] [--json]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.state import DURABILITY_MODES, write_json
+
+
+def _sample_runtime(sessions: int = 20) -> dict:
+    """A runtime.local.json-shaped document with a few sessions."""
+    return {
+        "version": 1,
+        "sessions": {
+            f"session-{i}": {
+                "activePersona": "sisyphus",
+                "updatedAt": "2026-02-22T19:00:00Z",
+                "ulw": {"enabled": True, "stopBlocks": i % 8, "lastStopEpoch": 1771786800},
+            }
+            for i in range(sessions)
+        },
+    }
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def bench_mode(directory: str, mode: str, writes: int, payload: dict) -> dict:
+    """Time `writes` calls of write_json in one durability mode (microseconds)."""
+    target = os.path.join(directory, f"bench-{mode.replace('+', '-')}.json")
+    samples = []
+    for i in range(writes):
+        payload["seq"] = i
+        start = time.perf_counter_ns()
+        ok = write_json(target, payload, durability=mode)
+        samples.append((time.perf_counter_ns() - start) / 1000)
+        if not ok:
+            raise RuntimeError(f"write_json failed in mode {mode}")
+    samples.sort()
+    return {
+        "mode": mode,
+        "writes": writes,
+        "mean_us": round(sum(samples) / len(samples), 1),
+        "p50_us": round(_percentile(samples, 50), 1),
+        "p90_us": round(_percentile(samples, 90), 1),
+        "p99_us": round(_percentile(samples, 99), 1),
+        "max_us": round(samples[-1], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="write_json durability latency benchmark")
+    parser.add_argument("--writes", type=int, default=200, help="Writes per mode")
+    parser.add_argument("--dir", default=".agent-kit/bench", help="Parent of the scratch directory")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    scratch = tempfile.mkdtemp(prefix="state-bench.", dir=args.dir)
+    payload = _sample_runtime()
+    try:
+        results = [bench_mode(scratch, mode, args.writes, payload) for mode in DURABILITY_MODES]
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.json:
+        for row in results:
+            print(json.dumps(row))
+        return 0
+
+    print(f"write_json latency ({args.writes} writes/mode, dir={os.path.abspath(args.dir)})")
+    print(f"{'mode':<10} {'mean':>10} {'p50':>10} {'p90':>10} {'p99':>10} {'max':>10}  (us)")
+    for row in results:
+        print(
+            f"{row['mode']:<10} {row['mean_us']:>10} {row['p50_us']:>10} "
+            f"{row['p90_us']:>10} {row['p99_us']:>10} {row['max_us']:>10}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,22 +4,41 @@
 Replaces state-evals.sh. Uses pytest with tmp_path fixture.
 
 Tests:
-  - state read: missing file, empty path, corrupt file, empty file, valid JSON, creates parent dir
+  - state read: missing file, empty path, corrupt file, empty file, valid JSON, no parent dir creation
+  - read cache: shared view reuse, private copies, external rewrites, deleted files
   - state write: creates file, roundtrip preserves fields, creates nested dir, accepts string data,
     fails on empty path, fails on empty content
+  - durability: every mode round-trips, per-file and env defaults
   - concurrent safety: sequential writes last wins, file is valid JSON after rapid writes
+  - batch: ops share in-memory state, all-or-nothing writes, markdown fields, lock busy
+  - journal: merge patches, replay at a timestamp, compaction keeps replay exact
+  - runtime gc: expired sessions pruned, pinned/kept sessions retained, interval respected
 """
 
 import json
 import os
 import sys
+import time
+
+import pytest
 
 # Ensure repo root is importable
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 
-from scripts.state import read_json, write_json
+from scripts import journal, plan, state
+from scripts.state import (
+    DURABILITY_MODES,
+    dotted_key,
+    gc_runtime,
+    maybe_gc_runtime,
+    read_json,
+    read_json_view,
+    resolve_durability,
+    run_batch,
+    write_json,
+)
 
 
 # ---- state read tests --------------------------------------------------------
@@ -55,10 +74,65 @@ class TestStateRead:
         assert "hello" in result
         assert result["hello"] == "world"
 
-    def test_creates_parent_directory(self, tmp_path):
+    def test_does_not_create_parent_directory(self, tmp_path):
         deep_path = tmp_path / "deep" / "nested" / "dir" / "file.json"
-        read_json(str(deep_path))
-        assert (tmp_path / "deep" / "nested" / "dir").is_dir()
+        assert read_json(str(deep_path)) == {}
+        assert not (tmp_path / "deep").exists()
+
+
+# ---- read cache tests --------------------------------------------------------
+
+
+class TestReadCache:
+    """Tests for the stat-validated in-process read cache."""
+
+    def test_view_is_shared_until_file_changes(self, tmp_path):
+        target = str(tmp_path / "cached.json")
+        write_json(target, {"n": 1})
+        first = read_json_view(target)
+        assert read_json_view(target) is first
+
+        write_json(target, {"n": 2})
+        second = read_json_view(target)
+        assert second is not first
+        assert second["n"] == 2
+
+    def test_read_json_returns_private_copy(self, tmp_path):
+        target = str(tmp_path / "copy.json")
+        write_json(target, {"nested": {"n": 1}})
+        data = read_json(target)
+        data["nested"]["n"] = 99
+        assert read_json(target)["nested"]["n"] == 1
+        assert read_json_view(target)["nested"]["n"] == 1
+
+    def test_cache_hit_skips_json_parse(self, tmp_path, monkeypatch):
+        target = str(tmp_path / "parsed.json")
+        write_json(target, {"n": 1})
+        assert read_json(target) == {"n": 1}
+
+        monkeypatch.setattr(state.json, "loads", lambda *a, **k: pytest.fail("re-parsed"))
+        assert read_json(target) == {"n": 1}
+
+    def test_json_list_is_returned_as_list(self, tmp_path):
+        target = tmp_path / "list.json"
+        target.write_text("[]")
+        assert read_json(str(target)) == []
+        target.write_text("[1, 2]")
+        assert read_json(str(target)) == [1, 2]
+
+    def test_external_rewrite_is_detected(self, tmp_path):
+        target = tmp_path / "external.json"
+        target.write_text('{"v":1}')
+        assert read_json(str(target))["v"] == 1
+        target.write_text('{"v":22}')
+        assert read_json(str(target))["v"] == 22
+
+    def test_deleted_file_drops_cache(self, tmp_path):
+        target = tmp_path / "gone.json"
+        target.write_text('{"v":1}')
+        assert read_json_view(str(target)) == {"v": 1}
+        target.unlink()
+        assert read_json_view(str(target)) == {}
 
 
 # ---- state write tests -------------------------------------------------------
@@ -105,6 +179,35 @@ class TestStateWrite:
         assert result is False
 
 
+# ---- durability tests --------------------------------------------------------
+
+
+class TestDurability:
+    """Tests for write_json durability modes."""
+
+    @pytest.mark.parametrize("mode", DURABILITY_MODES)
+    def test_each_mode_roundtrips(self, tmp_path, mode):
+        target = str(tmp_path / "durable.json")
+        assert write_json(target, {"mode": mode}, durability=mode) is True
+        assert read_json(target) == {"mode": mode}
+        assert [p.name for p in tmp_path.iterdir()] == ["durable.json"]
+
+    def test_boulder_defaults_to_strict(self, monkeypatch):
+        monkeypatch.delenv("AGENT_KIT_STATE_DURABILITY", raising=False)
+        assert resolve_durability(".agent-kit/boulder.json") == "file+dir"
+        assert resolve_durability(".agent-kit/state/runtime.local.json") == "none"
+
+    def test_env_default_and_explicit_override(self, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_STATE_DURABILITY", "file")
+        assert resolve_durability("runtime.local.json") == "file"
+        assert resolve_durability("runtime.local.json", "none") == "none"
+        assert resolve_durability("boulder.json", "none") == "none"
+
+    def test_unknown_env_mode_falls_back(self, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_STATE_DURABILITY", "paranoid")
+        assert resolve_durability("runtime.local.json") == "none"
+
+
 # ---- concurrent safety tests -------------------------------------------------
 
 
@@ -132,6 +235,293 @@ class TestConcurrentSafety:
         assert isinstance(parsed, dict)
 
 
+# ---- runtime gc tests --------------------------------------------------------
+
+
+def _iso(epoch):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(epoch))
+
+
+class TestRuntimeGc:
+    """Tests for TTL-based runtime session pruning."""
+
+    def _write_runtime(self, tmp_path, sessions, **extra):
+        target = str(tmp_path / "runtime.local.json")
+        write_json(target, {"version": 1, "sessions": sessions, **extra})
+        return target
+
+    def test_prunes_expired_sessions(self, tmp_path):
+        old = _iso(time.time() - 30 * 86400)
+        fresh = _iso(time.time())
+        target = self._write_runtime(tmp_path, {
+            "dead": {"ulw": {"enabled": False, "updatedAt": old}},
+            "alive": {"updatedAt": fresh},
+        })
+        report = gc_runtime(target, ttl_seconds=86400)
+        sessions = read_json(target)["sessions"]
+        assert "dead" not in sessions
+        assert "alive" in sessions
+        assert report["sessionsRemoved"] == 1
+        assert report["bytesReclaimed"] > 0
+
+    def test_keeps_global_and_explicit_keep(self, tmp_path):
+        old = _iso(time.time() - 30 * 86400)
+        target = self._write_runtime(tmp_path, {
+            "global": {"updatedAt": old},
+            "current": {"updatedAt": old},
+        })
+        gc_runtime(target, ttl_seconds=86400, keep=("current",))
+        sessions = read_json(target)["sessions"]
+        assert set(sessions) == {"global", "current"}
+
+    def test_untimestamped_session_is_stamped_not_dropped(self, tmp_path):
+        target = self._write_runtime(tmp_path, {"legacy": {"activePersona": "atlas"}})
+        gc_runtime(target, ttl_seconds=86400)
+        legacy = read_json(target)["sessions"]["legacy"]
+        assert legacy["activePersona"] == "atlas"
+        assert legacy.get("updatedAt")
+
+    def test_lastStopEpoch_counts_as_update(self, tmp_path):
+        target = self._write_runtime(tmp_path, {
+            "stopper": {"ulw": {"lastStopEpoch": int(time.time())}},
+        })
+        gc_runtime(target, ttl_seconds=86400)
+        assert "stopper" in read_json(target)["sessions"]
+
+    def test_maybe_gc_respects_interval(self, tmp_path):
+        old = _iso(time.time() - 30 * 86400)
+        target = self._write_runtime(
+            tmp_path, {"dead": {"updatedAt": old}}, gcEpoch=int(time.time()),
+        )
+        assert maybe_gc_runtime(target, interval_seconds=3600) is None
+        assert "dead" in read_json(target)["sessions"]
+
+        report = maybe_gc_runtime(target, interval_seconds=0, ttl_seconds=86400)
+        assert report["sessionsRemoved"] == 1
+        assert "dead" not in read_json(target)["sessions"]
+
+    def test_gc_holds_runtime_lock_and_skips_when_busy(self, tmp_path, monkeypatch):
+        import scripts.state as state_mod
+
+        old = _iso(time.time() - 30 * 86400)
+        target = self._write_runtime(tmp_path, {"dead": {"updatedAt": old}})
+        os.mkdir(target + ".lock")
+        report = gc_runtime(target, ttl_seconds=86400)
+        assert report["sessionsRemoved"] == 0
+        assert "dead" in read_json(target)["sessions"]
+        os.rmdir(target + ".lock")
+
+        # A runtime writer that races the prune waits for the lock instead of being overwritten
+        real_prune = state_mod.prune_sessions
+        racing = []
+
+        def prune_with_racing_writer(runtime, *args, **kwargs):
+            racing.append(write_json(target, {"version": 1, "sessions": {"new": {}}}))
+            return real_prune(runtime, *args, **kwargs)
+
+        monkeypatch.setattr(state_mod, "prune_sessions", prune_with_racing_writer)
+        assert gc_runtime(target, ttl_seconds=86400)["sessionsRemoved"] == 1
+        assert racing == [False]
+
+    def test_missing_file_reports_nothing(self, tmp_path):
+        report = gc_runtime(str(tmp_path / "missing.json"))
+        assert report["sessionsRemoved"] == 0
+        assert report["bytesReclaimed"] == 0
+
+
+# ---- batch tests -------------------------------------------------------------
+
+
+class TestBatch:
+    """Tests for run_batch (state.py batch)."""
+
+    def test_update_then_read_sees_pending_state(self, tmp_path):
+        target = str(tmp_path / "runtime.local.json")
+        write_json(target, {"version": 1, "sessions": {}})
+        results, ok = run_batch([
+            {"op": "update", "path": target, "set": {"sessions.global.ulw.enabled": False}},
+            {"op": "update", "path": target, "set": {"sessions.global.stopContinuation.disabled": True}},
+            {"op": "read", "path": target, "id": "r"},
+        ])
+        assert ok is True
+        assert results[2]["id"] == "r"
+        session = results[2]["data"]["sessions"]["global"]
+        assert session == {"ulw": {"enabled": False}, "stopContinuation": {"disabled": True}}
+        assert read_json(target)["sessions"]["global"] == session
+
+    def test_unset_and_escaped_dots(self, tmp_path):
+        target = str(tmp_path / "index.json")
+        write_json(target, {"plans": {}, "sessions": {"a": "v1.2", "b": "x"}})
+        results, ok = run_batch([{"op": "update", "path": target,
+                                  "set": {dotted_key("plans", "v1.2", "status"): "done"},
+                                  "unset": [dotted_key("sessions", "a"), "sessions.missing"]}])
+        assert ok is True, results
+        assert read_json(target) == {"plans": {"v1.2": {"status": "done"}}, "sessions": {"b": "x"}}
+
+    def test_now_placeholder_expands(self, tmp_path):
+        target = str(tmp_path / "boulder.json")
+        run_batch([{"op": "write", "path": target, "data": {"updatedAt": "$now"}}])
+        assert read_json(target)["updatedAt"].endswith("Z")
+
+    def test_failure_writes_nothing(self, tmp_path):
+        first = str(tmp_path / "a.json")
+        write_json(first, {"v": 1})
+        results, ok = run_batch([
+            {"op": "update", "path": first, "set": {"v": 2}},
+            {"op": "explode", "path": first},
+        ])
+        assert ok is False
+        assert results[1]["ok"] is False
+        assert read_json(first) == {"v": 1}
+
+    def test_failed_rename_rolls_back_earlier_files(self, tmp_path, monkeypatch):
+        first, created, last = (str(tmp_path / n) for n in ("a.json", "b.json", "c.json"))
+        write_json(first, {"v": 1})
+        write_json(last, {"v": 1})
+        real_rename = os.rename
+
+        def rename(src, dst):
+            if dst == last:
+                raise OSError("disk full")
+            real_rename(src, dst)
+
+        monkeypatch.setattr(state.os, "rename", rename)
+        results, ok = run_batch([
+            {"op": "update", "path": first, "set": {"v": 2}},
+            {"op": "write", "path": created, "data": {"v": 2}},
+            {"op": "update", "path": last, "set": {"v": 2}},
+        ])
+        monkeypatch.undo()
+
+        assert ok is False
+        assert results[-1]["path"] == last and "rolled back" in results[-1]["error"]
+        assert read_json(first) == {"v": 1}
+        assert not os.path.exists(created)
+        assert read_json(last) == {"v": 1}
+        assert sorted(os.listdir(tmp_path)) == ["a.json", "c.json"]
+
+    def test_markdown_fields(self, tmp_path):
+        ralph = tmp_path / "ralph-loop.local.md"
+        ralph.write_text("# ralph-loop\n\nstatus: active\niterations: 2\n")
+        results, ok = run_batch([
+            {"op": "update", "path": str(ralph), "set": {"status": "cancelled"}},
+            {"op": "read", "path": str(ralph)},
+        ])
+        assert ok is True
+        assert results[1]["data"]["status"] == "cancelled"
+        assert ralph.read_text() == "# ralph-loop\n\nstatus: cancelled\niterations: 2\n"
+
+    def test_if_exists_skips_missing_files(self, tmp_path):
+        missing = str(tmp_path / "boulder.json")
+        results, ok = run_batch([
+            {"op": "update", "path": missing, "set": {"active": False}, "ifExists": True},
+        ])
+        assert ok is True
+        assert results[0]["skipped"] is True
+        assert not os.path.exists(missing)
+
+    def test_lock_busy_fails_whole_batch(self, tmp_path, monkeypatch):
+        import scripts.state as state
+        monkeypatch.setattr(state, "BATCH_LOCK_WAIT_SECONDS", 0.0)
+        target = str(tmp_path / "locked.json")
+        os.mkdir(target + ".lock")
+        results, ok = run_batch([{"op": "write", "path": target, "data": {"v": 1}}])
+        assert ok is False
+        assert "lock busy" in results[0]["error"]
+        assert not os.path.exists(target)
+
+
+# ---- journal tests -----------------------------------------------------------
+
+
+class TestJournal:
+    """Tests for the opt-in state journal and replay."""
+
+    @pytest.fixture(autouse=True)
+    def _journal(self, tmp_path, monkeypatch):
+        self.journal_dir = str(tmp_path / "journal")
+        monkeypatch.setenv("AGENT_KIT_STATE_JOURNAL", "1")
+        monkeypatch.setattr(journal, "JOURNAL_DIR", self.journal_dir)
+
+    def test_merge_patch_roundtrip(self):
+        before = {"a": 1, "b": {"c": 2, "d": 3}, "gone": True}
+        after = {"a": 1, "b": {"c": 5, "d": 3}, "new": [1, 2]}
+        patch = journal.merge_patch(before, after)
+        assert patch == {"b": {"c": 5}, "gone": None, "new": [1, 2]}
+        assert journal.apply_merge_patch(before, patch) == after
+
+    def test_write_json_appends_record(self, tmp_path):
+        target = str(tmp_path / "runtime.local.json")
+        write_json(target, {"version": 1}, session="s1")
+        write_json(target, {"version": 1, "x": 2}, session="s1")
+        with open(os.path.join(self.journal_dir, journal.CURRENT_SEGMENT)) as f:
+            records = [json.loads(line) for line in f]
+        assert [r["patch"] for r in records] == [{"version": 1}, {"x": 2}]
+        assert all(r["session"] == "s1" and r["path"] == target for r in records)
+
+    def test_explicit_null_survives_replay(self, tmp_path):
+        target = str(tmp_path / "breaker.json")
+        write_json(target, {"k": 1, "nested": {"a": 1}})
+        write_json(target, {"k": None, "nested": {"a": None}, "new": {"b": None}})
+        write_json(target, {"k": None, "nested": {"a": None}, "new": {"b": None}, "x": 2})
+
+        assert journal.replay()[target] == {"k": None, "nested": {"a": None}, "new": {"b": None}, "x": 2}
+        with open(os.path.join(self.journal_dir, journal.CURRENT_SEGMENT)) as f:
+            records = [json.loads(line) for line in f]
+        assert ["data" in r for r in records] == [False, True, False]
+
+    def test_disabled_writes_nothing(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("AGENT_KIT_STATE_JOURNAL")
+        write_json(str(tmp_path / "quiet.json"), {"a": 1})
+        assert not os.path.exists(self.journal_dir)
+
+    def test_plan_index_cache_is_not_journaled(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(plan, "PLAN_INDEX_DIR", str(tmp_path / "plan-index"))
+        plan_path = tmp_path / "plan.md"
+        plan_path.write_text("- [ ] 1. First\n- [ ] 2. Second\n")
+        assert plan.load_index(str(plan_path))["total"] == 2
+        assert os.path.exists(plan.index_cache_path(str(plan_path)))
+        assert not os.path.exists(self.journal_dir)
+
+    def test_replay_until_timestamp(self, tmp_path):
+        target = str(tmp_path / "boulder.json")
+        write_json(target, {"active": True, "currentTask": 1})
+        time.sleep(0.01)
+        middle = time.time()
+        time.sleep(0.01)
+        write_json(target, {"active": False, "currentTask": 1})
+
+        assert journal.replay(middle)[target] == {"active": True, "currentTask": 1}
+        assert journal.replay()[target] == {"active": False, "currentTask": 1}
+
+    def test_compaction_preserves_history(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(journal, "SEGMENT_MAX_BYTES", 200)
+        monkeypatch.setattr(journal, "KEEP_SNAPSHOTS", 100)
+        target = str(tmp_path / "counter.json")
+        stamps = []
+        for i in range(30):
+            write_json(target, {"n": i, "pad": "x" * 20})
+            stamps.append(time.time())
+            time.sleep(0.002)
+
+        assert len(journal._snapshots(self.journal_dir)) >= 2
+        assert journal.replay()[target]["n"] == 29
+        assert journal.replay(stamps[0])[target]["n"] == 0
+        assert journal.replay(stamps[4])[target]["n"] == 4
+        assert journal.replay(stamps[17])[target]["n"] == 17
+
+    def test_pruned_history_is_reported(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(journal, "SEGMENT_MAX_BYTES", 100)
+        monkeypatch.setattr(journal, "KEEP_SNAPSHOTS", 2)
+        target = str(tmp_path / "pruned.json")
+        start = time.time()
+        for i in range(40):
+            write_json(target, {"n": i, "pad": "y" * 40})
+            time.sleep(0.002)
+        assert len(journal._snapshots(self.journal_dir)) == 2
+        assert journal.replay(start) is None
+        assert journal.replay()[target]["n"] == 39
+
+
 if __name__ == "__main__":
-    import pytest
     sys.exit(pytest.main([__file__, "-v"]))
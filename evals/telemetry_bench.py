@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Ingestion throughput benchmark for scripts.telemetry against a local stub.
+
+Starts a keep-alive HTTP/1.1 stub ingestion server on 127.0.0.1 and sends the
+same number of single-batch POSTs three ways:
+
+  urlopen      one urllib.request.urlopen per request: new TCP connection and
+               auth header every time (the pre-pool behavior)
+  pooled       telemetry._post through the keep-alive ConnectionPool, sequential
+  pooled-conc  telemetry._send_batches: pooled, POOL_MAX_CONNECTIONS in flight
+
+--latency-ms adds a fixed server-side delay per request to approximate a
+remote Langfuse; concurrency only pays off when it is non-zero.
+
+Not part of run_evals.py: results are machine-dependent, not pass/fail.
+
+Usage:
+  python3 evals/telemetry_bench.py [--requests 500] [--batch-items 10] [--latency-ms 0] [--json]
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import scripts.telemetry as telemetry
+
+
+class _StubIngestion(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.send_response(207)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+def _sample_batch(items: int) -> list:
+    """Ingestion items shaped like hook_router's event + latency score."""
+    batch = []
+    for i in range(items):
+        batch.append({
+            "id": f"hook.pretool-{i}",
+            "type": "event-create" if i % 2 == 0 else "score-create",
+            "timestamp": "2026-02-22T19:00:00.000Z",
+            "body": {"traceId": "session-bench", "name": "hook.pretool",
+                     "metadata": {"tool_name": "Bash", "decision": "allow"}},
+        })
+    return batch
+
+
+def _post_urlopen(base_url: str, body: dict) -> bool:
+    """The pre-pool _post: fresh connection and auth header per request."""
+    creds = base64.b64encode(b"pk-bench:sk-bench").decode("utf-8")
+    req = urllib.request.Request(
+        f"{base_url}/api/public/ingestion",
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Authorization": f"Basic {creds}", "Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=telemetry.POST_TIMEOUT_SECONDS) as resp:
+        return 200 <= resp.status < 300
+
+
+def bench(mode: str, base_url: str, requests: int, batch: list) -> dict:
+    """Send `requests` batches in one mode; returns throughput and failures."""
+    start = time.perf_counter()
+    if mode == "urlopen":
+        results = [_post_urlopen(base_url, {"batch": batch}) for _ in range(requests)]
+    elif mode == "pooled":
+        results = [telemetry._post("/ingestion", {"batch": batch}) for _ in range(requests)]
+    else:
+        results = [m["ok"] for m in telemetry._send_batches([batch] * requests)]
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": mode,
+        "requests": requests,
+        "failed": sum(1 for ok in results if not ok),
+        "seconds": round(elapsed, 3),
+        "req_per_s": round(requests / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Telemetry ingestion throughput benchmark")
+    parser.add_argument("--requests", type=int, default=500, help="POSTs per mode")
+    parser.add_argument("--batch-items", type=int, default=10, help="Ingestion items per POST")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Stub server delay per request")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubIngestion)
+    server.latency = args.latency_ms / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    os.environ.update({
+        "LANGFUSE_BASE_URL": base_url,
+        "LANGFUSE_PUBLIC_KEY": "pk-bench",
+        "LANGFUSE_SECRET_KEY": "sk-bench",
+    })
+
+    batch = _sample_batch(args.batch_items)
+    try:
+        results = [bench(mode, base_url, args.requests, batch)
+                   for mode in ("urlopen", "pooled", "pooled-conc")]
+    finally:
+        telemetry.get_pool().close()
+        server.shutdown()
+        server.server_close()
+
+    if args.json:
+        for row in results:
+            print(json.dumps(row))
+        return 0
+
+    print(f"ingestion throughput ({args.requests} POSTs/mode, {args.batch_items} items/POST, "
+          f"server latency {args.latency_ms} ms, pool {telemetry.POOL_MAX_CONNECTIONS})")
+    print(f"{'mode':<12} {'req/s':>10} {'seconds':>10} {'failed':>8}")
+    for row in results:
+        print(f"{row['mode']:<12} {row['req_per_s']:>10} {row['seconds']:>10} {row['failed']:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
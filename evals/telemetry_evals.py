@@ -0,0 +1,1044 @@
+#!/usr/bin/env python3
+"""Deterministic tests for scripts.telemetry spooling and delivery.
+
+Uses pytest with tmp_path and a local stub ingestion server (no network).
+
+Tests:
+  - collector: one invocation's events and scores are spooled in one write
+    and start one flusher
+  - spool: emits append ingestion items, disabled telemetry writes nothing,
+    torn lines are skipped
+  - connection pool: keep-alive reuse, reconnect after server close,
+    bounded concurrency, cached auth
+  - sampling: per-name rates with sampleRate annotation, always-keep rules,
+    scores follow their event, per-session token bucket
+  - latency histogram: fixed-size records, percentiles per event/outcome,
+    window filter, generation rotation and its lock, stats CLI, router outcomes
+  - spans: no-op when disabled, nesting, child observations of the hook
+    event, dropped with a sampled-out event, hook_router phases
+  - identity: unique time-ordered UUIDv7 ids (also within one millisecond),
+    stable trace id without a session id, retries resend the same ids, an
+    item left in two spool segments is sent once
+  - payloads: gzip above GZIP_MIN_BYTES, batches split by bytes and items,
+    per-batch metrics returned and logged
+  - exporters: selection by env, JSONL file output, OTLP/HTTP JSON spans
+    and gauges, retries resend only refused requests
+  - circuit breaker: opens after consecutive failures, half-open probe,
+    exponential backoff, spool size cap while open
+  - flusher: drains in batches, keeps items when the endpoint fails,
+    skips when another flusher holds the lock, recovers in-flight files
+"""
+
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Ensure repo root is importable
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts import _debug
+import scripts.hook_router as hook_router
+import scripts.telemetry as telemetry
+
+# The fixture stubs out spawning; breaker tests call the real one with Popen patched
+_START_FLUSHER = telemetry._start_flusher
+
+
+class _StubIngestion(BaseHTTPRequestHandler):
+    """Records every ingestion body; answers with server.status (HTTP/1.1 keep-alive).
+
+    gzip bodies are decompressed; anything that is not a Langfuse batch or an
+    OTLP export request gets a 400.
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        wire = self.rfile.read(length)
+        try:
+            body = gzip.decompress(wire) if self.headers.get("Content-Encoding") == "gzip" else wire
+            payload = json.loads(body)
+            valid = any(isinstance(payload.get(key), list)
+                        for key in ("batch", "resourceSpans", "resourceMetrics"))
+        except (OSError, ValueError, AttributeError):
+            body, valid = wire, False
+        with self.server.lock:
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+            self.server.requests.append({
+                "path": self.path,
+                "headers": dict(self.headers),
+                "body": body,
+                "wireBytes": len(wire),
+                "client": self.client_address,
+            })
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.in_flight -= 1
+        self.send_response(self.server.status if valid else 400)
+        self.send_header("Content-Length", "2")
+        if self.server.close_connections:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubIngestion)
+    server.requests = []
+    server.status = 207
+    server.delay = 0
+    server.close_connections = False
+    server.lock = threading.Lock()
+    server.in_flight = 0
+    server.max_in_flight = 0
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch, stub_server):
+    """Telemetry enabled against the stub server, spool under tmp_path, no flusher spawn."""
+    directory = str(tmp_path / "telemetry")
+    monkeypatch.setenv("LANGFUSE_BASE_URL", f"http://127.0.0.1:{stub_server.server_port}")
+    monkeypatch.setenv("LANGFUSE_PUBLIC_KEY", "pk-test")
+    monkeypatch.setenv("LANGFUSE_SECRET_KEY", "sk-test")
+    monkeypatch.delenv("AGENT_KIT_TELEMETRY_EXPORTER", raising=False)
+    monkeypatch.setattr(telemetry, "SPOOL_DIR", directory)
+    monkeypatch.setattr(telemetry, "FLUSH_BACKOFF_SECONDS", 0)
+    monkeypatch.setattr(telemetry, "_BATCH", [])
+    monkeypatch.setattr(telemetry, "_TRACE_DECISIONS", {})
+    monkeypatch.setattr(telemetry, "_SPANS", [])
+    monkeypatch.setattr(telemetry, "_SPAN_STACK", [])
+    monkeypatch.setattr(telemetry, "_SPANS_ENABLED", None)
+    monkeypatch.setattr(telemetry, "_start_flusher", lambda *a, **k: None)
+    monkeypatch.setattr(telemetry, "_POOL", None)
+    yield directory
+    if telemetry._POOL is not None:
+        telemetry._POOL.close()
+
+
+def _emit_events(*names):
+    """One invocation: emit an event per name, then spool them."""
+    for name in names:
+        telemetry.emit_event("trace-1", name, {})
+    telemetry.flush()
+
+
+def _spooled(spool_dir):
+    path = os.path.join(spool_dir, telemetry.SPOOL_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def _sent_items(server):
+    items = []
+    for req in server.requests:
+        items.extend(json.loads(req["body"])["batch"])
+    return items
+
+
+# ---- collector tests ---------------------------------------------------------
+
+
+class TestTelemetryCollector:
+    """Everything one invocation emits is spooled together and sent as one batch."""
+
+    def test_emits_are_held_until_flush(self, spool_dir):
+        telemetry.emit_event("trace-1", "hook.stop", {})
+        telemetry.emit_score("trace-1", "hook.latency_ms", 3)
+        assert not os.path.exists(spool_dir)
+
+        assert telemetry.flush() == 2
+        assert len(_spooled(spool_dir)) == 2
+        assert telemetry.flush() == 0
+
+    def test_flush_writes_once_and_starts_one_flusher(self, spool_dir, monkeypatch):
+        appends, spawns = [], []
+        real_append = telemetry._spool_append
+        monkeypatch.setattr(
+            telemetry, "_spool_append",
+            lambda items, *a, **k: appends.append(len(items)) or real_append(items, *a, **k),
+        )
+        monkeypatch.setattr(telemetry, "_start_flusher", lambda *a: spawns.append(a))
+
+        telemetry.emit_event("trace-1", "hook.stop", {"decision": "block"})
+        telemetry.emit_score("trace-1", "hook.latency_ms", 3)
+        telemetry.emit_score("trace-1", "sisyphus.followed", True, "BOOLEAN")
+        telemetry.flush()
+
+        assert appends == [3]
+        assert len(spawns) == 1
+
+    def test_invocations_share_one_ingestion_request(self, spool_dir, stub_server):
+        for n in range(3):
+            telemetry.emit_event("trace-1", "hook.pretool", {"n": n})
+            telemetry.emit_score("trace-1", "hook.latency_ms", n)
+            telemetry.flush()
+
+        telemetry.drain_spool(spool_dir)
+
+        assert len(stub_server.requests) == 1
+        assert len(_sent_items(stub_server)) == 6
+
+    def test_hook_router_spools_once_per_invocation(self, spool_dir, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(hook_router, "RUNTIME_FILE", str(tmp_path / "runtime.json"))
+        monkeypatch.setattr(hook_router, "BOULDER_FILE", str(tmp_path / "boulder.json"))
+        monkeypatch.setattr(hook_router, "RALPH_FILE", str(tmp_path / "ralph.md"))
+        monkeypatch.setattr(sys, "argv", ["hook_router.py", "PreToolUse"])
+        monkeypatch.setattr(sys, "stdin", io.StringIO(json.dumps({
+            "session_id": "s1", "tool_name": "Read", "tool_input": {"file_path": "x"},
+        })))
+        monkeypatch.setattr(sys, "stdout", io.StringIO())
+
+        hook_router.main()
+
+        items = _spooled(spool_dir)
+        assert [i["type"] for i in items if i["type"] != "span-create"] == ["event-create", "score-create"]
+        assert telemetry._BATCH == []
+
+
+# ---- spool tests -------------------------------------------------------------
+
+
+class TestTelemetrySpool:
+    """emit_event / emit_score append to the local spool without network I/O."""
+
+    def test_emits_append_ingestion_items(self, spool_dir, stub_server):
+        telemetry.emit_event("trace-1", "hook.stop", {"decision": "block"})
+        telemetry.emit_score("trace-1", "hook.latency_ms", "12")
+        telemetry.flush()
+
+        items = _spooled(spool_dir)
+        assert [i["type"] for i in items] == ["event-create", "score-create"]
+        assert items[0]["body"]["metadata"] == {"decision": "block"}
+        assert items[1]["body"]["value"] == 12.0
+        assert stub_server.requests == []
+
+    def test_disabled_writes_nothing(self, spool_dir, monkeypatch):
+        monkeypatch.delenv("LANGFUSE_SECRET_KEY")
+        telemetry.emit_event("trace-1", "hook.stop", {})
+        assert telemetry.flush() == 0
+        assert not os.path.exists(spool_dir)
+
+    def test_torn_lines_are_skipped(self, spool_dir, stub_server):
+        _emit_events("hook.stop")
+        with open(os.path.join(spool_dir, telemetry.SPOOL_FILE), "a", encoding="utf-8") as f:
+            f.write('{"type": "event-cre')
+        stats = telemetry.drain_spool(spool_dir)
+        assert stats["sentItems"] == 1
+
+
+# ---- connection pool tests ---------------------------------------------------
+
+
+class TestTelemetryConnectionPool:
+    """Ingestion POSTs reuse keep-alive connections with bounded concurrency."""
+
+    def test_sequential_posts_reuse_one_connection(self, spool_dir, stub_server):
+        for n in range(5):
+            assert telemetry._post("/ingestion", {"batch": [{"n": n}]})
+
+        assert len(stub_server.requests) == 5
+        assert len({req["client"] for req in stub_server.requests}) == 1
+
+    def test_reconnects_when_server_closes(self, spool_dir, stub_server):
+        stub_server.close_connections = True
+        assert telemetry._post("/ingestion", {"batch": []})
+        assert telemetry._post("/ingestion", {"batch": []})
+        assert len({req["client"] for req in stub_server.requests}) == 2
+
+    def test_concurrency_is_bounded(self, spool_dir, stub_server, monkeypatch):
+        monkeypatch.setattr(telemetry, "FLUSH_BATCH_ITEMS", 1)
+        stub_server.delay = 0.05
+        _emit_events(*(f"hook.e{n}" for n in range(10)))
+
+        stats = telemetry.drain_spool(spool_dir)
+
+        assert stats["sentItems"] == 10
+        assert 1 < stub_server.max_in_flight <= telemetry.POOL_MAX_CONNECTIONS
+
+    def test_unreachable_host_fails_open(self, spool_dir, monkeypatch):
+        monkeypatch.setenv("LANGFUSE_BASE_URL", "http://127.0.0.1:9")
+        assert telemetry._post("/ingestion", {"batch": []}) is False
+
+    def test_auth_header_is_cached(self, spool_dir, monkeypatch):
+        telemetry._basic_auth.cache_clear()
+        first = telemetry._auth_header()
+        assert telemetry._auth_header() == first
+        assert telemetry._basic_auth.cache_info().hits == 1
+
+        monkeypatch.setenv("LANGFUSE_SECRET_KEY", "sk-rotated")
+        assert telemetry._auth_header() != first
+
+
+# ---- sampling tests ----------------------------------------------------------
+
+
+def _collected():
+    items = list(telemetry._BATCH)
+    telemetry._BATCH.clear()
+    return items
+
+
+class TestTelemetrySampling:
+    """Per-event sampling with always-keep rules and a per-session token bucket."""
+
+    def test_unmatched_events_are_kept_without_sample_rate(self, spool_dir, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_SAMPLE", "hook.pretool=0")
+        telemetry.emit_event("trace-1", "hook.stop", {"decision": "allow"})
+        telemetry.emit_score("trace-1", "hook.latency_ms", 4)
+
+        items = _collected()
+        assert len(items) == 2
+        assert "sampleRate" not in items[0]["body"]["metadata"]
+        assert "metadata" not in items[1]["body"]
+
+    def test_sampled_out_event_drops_its_score(self, spool_dir, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_SAMPLE", "hook.pre*=0.25")
+        monkeypatch.setattr(telemetry.random, "random", lambda: 0.9)
+        telemetry.emit_event("trace-1", "hook.pretool", {"decision": "allow"})
+        telemetry.emit_score("trace-1", "hook.latency_ms", 4)
+        assert _collected() == []
+
+    def test_kept_sample_carries_rate_on_event_and_score(self, spool_dir, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_SAMPLE", "hook.pretool=0.25")
+        monkeypatch.setattr(telemetry.random, "random", lambda: 0.1)
+        telemetry.emit_event("trace-1", "hook.pretool", {"decision": "allow"})
+        telemetry.emit_score("trace-1", "hook.latency_ms", 4)
+
+        event, score = _collected()
+        assert event["body"]["metadata"]["sampleRate"] == 0.25
+        assert score["body"]["metadata"] == {"sampleRate": 0.25}
+
+    def test_block_decisions_are_always_kept(self, spool_dir, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_SAMPLE", "hook.*=0")
+        telemetry.emit_event("trace-1", "hook.pretool", {"decision": "block"})
+        telemetry.emit_score("trace-1", "hook.latency_ms", 4)
+
+        event, score = _collected()
+        assert "sampleRate" not in event["body"]["metadata"]
+        assert score["body"]["name"] == "hook.latency_ms"
+
+    def test_keep_rules_are_configurable(self, spool_dir, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_SAMPLE", "hook.*=0")
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_KEEP", "reason=continuation_disabled")
+        telemetry.emit_event("trace-1", "hook.stop", {"decision": "block"})
+        telemetry.emit_event("trace-1", "hook.stop", {"reason": "continuation_disabled"})
+
+        assert [i["body"]["metadata"] for i in _collected()] == [{"reason": "continuation_disabled"}]
+
+    def test_token_bucket_limits_each_session(self, spool_dir, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_RATE", "1")
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_BURST", "2")
+        clock = [1000.0]
+        monkeypatch.setattr(telemetry.time, "time", lambda: clock[0])
+
+        for _ in range(4):
+            telemetry.emit_event("trace-1", "hook.pretool", {"decision": "allow"})
+            telemetry.emit_score("trace-1", "hook.latency_ms", 1)
+        telemetry.emit_event("trace-2", "hook.pretool", {"decision": "allow"})
+        assert [i["body"]["traceId"] for i in _collected()] == ["trace-1"] * 4 + ["trace-2"]
+
+        clock[0] += 1.0
+        telemetry.emit_event("trace-1", "hook.pretool", {"decision": "allow"})
+        assert _collected()[0]["body"]["metadata"]["rateLimitedDropped"] == 2
+
+    def test_block_bypasses_empty_bucket(self, spool_dir, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_RATE", "0.001")
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_BURST", "1")
+        telemetry.emit_event("trace-1", "hook.pretool", {"decision": "allow"})
+        telemetry.emit_event("trace-1", "hook.pretool", {"decision": "allow"})
+        telemetry.emit_event("trace-1", "hook.stop", {"decision": "block"})
+
+        assert [i["body"]["name"] for i in _collected()] == ["hook.pretool", "hook.stop"]
+
+
+# ---- latency histogram tests -------------------------------------------------
+
+
+def _run_router(tmp_path, monkeypatch, event, payload):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(hook_router, "RUNTIME_FILE", str(tmp_path / "runtime.json"))
+    monkeypatch.setattr(hook_router, "BOULDER_FILE", str(tmp_path / "boulder.json"))
+    monkeypatch.setattr(hook_router, "RALPH_FILE", str(tmp_path / "ralph.md"))
+    monkeypatch.setattr(sys, "argv", ["hook_router.py", event])
+    monkeypatch.setattr(sys, "stdin", io.StringIO(json.dumps(payload)))
+    monkeypatch.setattr(sys, "stdout", io.StringIO())
+    hook_router.main()
+    return sys.stdout.getvalue()
+
+
+class TestLatencyHistogram:
+    """Per-invocation latency samples and the stats percentiles."""
+
+    def test_percentiles_per_event_and_outcome(self, tmp_path):
+        path = str(tmp_path / "latency.hist")
+        for us in range(1000, 101000, 1000):  # 1..100 ms
+            telemetry.record_latency("PreToolUse", "ok", us, path=path, now=1000)
+        telemetry.record_latency("Stop", "block", 2500, path=path, now=1000)
+
+        rows = {(r["event"], r["outcome"]): r for r in telemetry.latency_stats(path=path, now=1000)}
+
+        pretool = rows[("PreToolUse", "ok")]
+        assert pretool["count"] == 100
+        assert pretool["max_ms"] == 100.0
+        # Log buckets: within one sub-bucket (~19%) above the exact value
+        for pct, exact in ((50, 50), (90, 90), (99, 99)):
+            assert exact <= pretool[f"p{pct}_ms"] <= exact * 1.19 + 0.01
+        assert rows[("Stop", "block")]["p99_ms"] == 2.5
+        assert os.path.getsize(path) == 101 * 12
+
+    def test_window_excludes_old_samples(self, tmp_path):
+        path = str(tmp_path / "latency.hist")
+        telemetry.record_latency("Stop", "ok", 500, path=path, now=1000)
+        telemetry.record_latency("Stop", "ok", 900, path=path, now=5000)
+
+        rows = telemetry.latency_stats(3600, path=path, now=5000)
+        assert rows[0]["count"] == 1 and rows[0]["max_ms"] == 0.9
+        assert telemetry.latency_stats(None, path=path, now=5000)[0]["count"] == 2
+
+    def test_file_rotates_to_one_older_generation(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(telemetry, "LATENCY_MAX_RECORDS", 10)
+        path = str(tmp_path / "latency.hist")
+        for n in range(35):
+            telemetry.record_latency("PreToolUse", "ok", 100 + n, path=path, now=1000)
+
+        assert os.path.getsize(path) <= 10 * 12
+        assert os.path.getsize(path + ".1") == 10 * 12
+        rows = telemetry.latency_stats(path=path, now=1000)
+        assert 10 < rows[0]["count"] <= 20
+        assert rows[0]["max_ms"] == 0.13
+
+    def test_late_rotation_keeps_the_saved_generation(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(telemetry, "LATENCY_MAX_RECORDS", 10)
+        path = str(tmp_path / "latency.hist")
+        for n in range(11):
+            telemetry.record_latency("PreToolUse", "ok", 100, path=path, now=1000)
+        saved = open(path + ".1", "rb").read()
+
+        # A second hook that saw the old file full rotates after the first one
+        telemetry._rotate_latency(path)
+        assert open(path + ".1", "rb").read() == saved
+        assert os.path.getsize(path) == 12
+
+    def test_held_rotation_lock_skips_rotating(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(telemetry, "LATENCY_MAX_RECORDS", 10)
+        path = str(tmp_path / "latency.hist")
+        os.mkdir(path + ".lock")
+        for n in range(12):
+            telemetry.record_latency("PreToolUse", "ok", 100, path=path, now=1000)
+        assert os.path.getsize(path) == 12 * 12
+        assert not os.path.exists(path + ".1")
+
+        old = time.time() - telemetry.LATENCY_LOCK_STALE_SECONDS - 1
+        os.utime(path + ".lock", (old, old))
+        telemetry.record_latency("PreToolUse", "ok", 100, path=path, now=1000)
+        telemetry.record_latency("PreToolUse", "ok", 100, path=path, now=1000)
+        assert os.path.getsize(path + ".1") == 13 * 12
+        assert not os.path.exists(path + ".lock")
+
+    def test_torn_tail_and_unknown_events(self, tmp_path):
+        path = str(tmp_path / "latency.hist")
+        telemetry.record_latency("Notification", "weird", 10, path=path, now=1000)
+        with open(path, "ab") as f:
+            f.write(b"\x01\x02\x03")
+
+        rows = telemetry.latency_stats(path=path, now=1000)
+        assert [(r["event"], r["outcome"], r["count"]) for r in rows] == [("unknown", "ok", 1)]
+
+    def test_router_records_outcomes(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(telemetry, "LATENCY_FILE", str(tmp_path / "latency.hist"))
+        _run_router(tmp_path, monkeypatch, "PreToolUse",
+                    {"session_id": "s1", "tool_name": "Read", "tool_input": {"file_path": "x"}})
+        output = _run_router(tmp_path, monkeypatch, "PreToolUse",
+                             {"session_id": "s1", "tool_name": "Bash", "tool_input": {"command": "rm -rf /"}})
+        assert '"decision":"block"' in output
+
+        rows = telemetry.latency_stats(path=str(tmp_path / "latency.hist"))
+        assert [(r["event"], r["outcome"], r["count"]) for r in rows] == [
+            ("PreToolUse", "ok", 1), ("PreToolUse", "block", 1),
+        ]
+
+    def test_stats_cli(self, tmp_path):
+        path = tmp_path / ".agent-kit" / "telemetry" / "latency.hist"
+        telemetry.record_latency("Stop", "ok", 4000, path=str(path))
+        script = os.path.join(ROOT_DIR, "scripts", "telemetry.py")
+
+        result = subprocess.run([sys.executable, script, "stats", "--window", "1h", "--json"],
+                                cwd=tmp_path, capture_output=True, text=True)
+        assert result.returncode == 0
+        assert json.loads(result.stdout)["max_ms"] == 4.0
+
+        table = subprocess.run([sys.executable, script, "stats"], cwd=tmp_path,
+                               capture_output=True, text=True).stdout
+        assert "hook latency over 24h" in table and "Stop" in table
+
+        bad = subprocess.run([sys.executable, script, "stats", "--window", "soon"],
+                             cwd=tmp_path, capture_output=True, text=True)
+        assert bad.returncode == 1
+
+
+# ---- span tests --------------------------------------------------------------
+
+
+class TestTelemetrySpans:
+    """Per-phase spans become child observations of the next hook event."""
+
+    def test_disabled_span_is_shared_noop(self, spool_dir, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_SPANS", "0")
+        with telemetry.span("sections.build") as phase:
+            phase.set(bytes=1)
+        assert phase is telemetry._NOOP_SPAN
+        assert telemetry._SPANS == []
+
+        monkeypatch.delenv("AGENT_KIT_TELEMETRY_SPANS")
+        monkeypatch.delenv("LANGFUSE_BASE_URL")
+        monkeypatch.setattr(telemetry, "_SPANS_ENABLED", None)
+        assert telemetry.span("x") is telemetry._NOOP_SPAN
+
+    def test_spans_attach_to_event_with_nesting(self, spool_dir, monkeypatch):
+        with telemetry.span("guard.prometheus_write", tool="Write"):
+            with telemetry.span("output", kind="block") as out:
+                out.set(bytes=42)
+        telemetry.emit_event("trace-1", "hook.pretool", {"decision": "block"})
+
+        event, outer_or_inner, other = _collected()
+        spans = {i["body"]["name"]: i["body"] for i in (outer_or_inner, other)}
+        event_id = event["body"]["id"]
+        assert spans["guard.prometheus_write"]["parentObservationId"] == event_id
+        assert spans["output"]["parentObservationId"] == spans["guard.prometheus_write"]["id"]
+        assert spans["output"]["metadata"]["bytes"] == 42
+        assert spans["guard.prometheus_write"]["metadata"]["tool"] == "Write"
+        for body in spans.values():
+            assert body["traceId"] == "trace-1"
+            assert body["startTime"] <= body["endTime"]
+            assert body["metadata"]["durationUs"] >= 0
+        assert telemetry._SPANS == []
+
+    def test_span_records_exception_and_reraises(self, spool_dir):
+        with pytest.raises(OSError):
+            with telemetry.span("state.commit"):
+                raise OSError("disk full")
+        assert telemetry._SPANS[0].attrs["error"] == "OSError"
+        assert telemetry._SPAN_STACK == []
+
+    def test_sampled_out_event_drops_its_spans(self, spool_dir, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_SAMPLE", "hook.pretool=0")
+        with telemetry.span("guard.destructive_bash"):
+            pass
+        telemetry.emit_event("trace-1", "hook.pretool", {"decision": "allow"})
+        assert _collected() == []
+        assert telemetry._SPANS == []
+
+    def test_hook_router_emits_phase_spans(self, spool_dir, tmp_path, monkeypatch):
+        monkeypatch.setattr(telemetry, "LATENCY_FILE", str(tmp_path / "latency.hist"))
+        _run_router(tmp_path, monkeypatch, "SessionStart", {"session_id": "s1"})
+        _run_router(tmp_path, monkeypatch, "PreToolUse",
+                    {"session_id": "s1", "tool_name": "Bash", "tool_input": {"command": "rm -rf /"}})
+
+        items = _spooled(spool_dir)
+        names = [i["body"]["name"] for i in items if i["type"] == "span-create"]
+        assert {"state.maintenance", "state.snapshot", "sections.build", "output"} <= set(names)
+        assert "guard.destructive_bash" in names
+        events = {i["body"]["id"]: i["body"]["name"] for i in items if i["type"] == "event-create"}
+        spans = [i["body"] for i in items if i["type"] == "span-create"]
+        sections = next(b for b in spans if b["name"] == "sections.build")
+        assert events[sections["parentObservationId"]] == "hook.session_start"
+        assert sections["metadata"]["bytes"] > 0
+
+
+# ---- identity tests ----------------------------------------------------------
+
+
+def _ids(items):
+    return [i["id"] for i in items] + [i["body"]["id"] for i in items]
+
+
+class TestTelemetryIdentity:
+    """UUIDv7 observation ids, stable session traces, idempotent retries."""
+
+    def test_ids_are_unique_time_ordered_uuid7(self):
+        ids = [telemetry._uuid7() for _ in range(2000)]
+
+        assert len(set(ids)) == len(ids)
+        assert sorted(ids) == ids
+        parsed = uuid.UUID(ids[0])
+        assert parsed.version == 7 and parsed.variant == uuid.RFC_4122
+        assert abs(int(ids[0].replace("-", "")[:12], 16) - time.time() * 1000) < 5000
+
+    def test_same_millisecond_counter_and_overflow(self, monkeypatch):
+        monkeypatch.setattr(telemetry.time, "time_ns", lambda: 1_700_000_000_000_000_000)
+        monkeypatch.setattr(telemetry, "_UUID7_STATE", [0, 0])
+        ids = [telemetry._uuid7() for _ in range(3)]
+        assert sorted(ids) == ids and len(set(ids)) == 3
+
+        monkeypatch.setattr(telemetry, "_UUID7_STATE", [1_700_000_000_000, 0xFFF])
+        borrowed = telemetry._uuid7()
+        assert int(borrowed.replace("-", "")[:12], 16) == 1_700_000_000_001
+
+    def test_event_and_score_back_to_back_get_distinct_ids(self, spool_dir):
+        telemetry.emit_event("trace-1", "hook.stop", {})
+        telemetry.emit_score("trace-1", "hook.latency_ms", 2)
+
+        ids = _ids(_collected())
+        assert len(set(ids)) == 4
+
+    def test_session_trace_id(self, tmp_path, monkeypatch):
+        assert telemetry.session_trace_id("session-abc") == "session-abc"
+
+        (tmp_path / "a").mkdir()
+        (tmp_path / "b").mkdir()
+        monkeypatch.chdir(tmp_path / "a")
+        first = hook_router._get_trace_id(hook_router.parse_hook_input("{}"))
+        assert first == telemetry.session_trace_id("", hook_router.SESSION_KEY_DEFAULT)
+        assert uuid.UUID(first).version == 5
+        monkeypatch.chdir(tmp_path / "b")
+        assert telemetry.session_trace_id("", hook_router.SESSION_KEY_DEFAULT) != first
+
+    def test_retries_resend_the_same_ids(self, spool_dir, stub_server):
+        stub_server.status = 500
+        telemetry.emit_event("trace-1", "hook.stop", {})
+        telemetry.emit_score("trace-1", "hook.latency_ms", 2)
+        telemetry.flush()
+        telemetry.drain_spool(spool_dir)
+        failed = json.loads(stub_server.requests[0]["body"])["batch"]
+
+        stub_server.status = 207
+        stub_server.requests.clear()
+        telemetry.drain_spool(spool_dir)
+
+        assert _ids(_sent_items(stub_server)) == _ids(failed)
+
+    def test_item_in_two_segments_is_sent_once(self, spool_dir, stub_server):
+        _emit_events("hook.stop")
+        spool = os.path.join(spool_dir, telemetry.SPOOL_FILE)
+        with open(spool, "rb") as src, open(os.path.join(spool_dir, "inflight-1-99.jsonl"), "wb") as dst:
+            dst.write(src.read())
+
+        stats = telemetry.drain_spool(spool_dir)
+
+        assert stats["sentItems"] == 1
+        assert len(_sent_items(stub_server)) == 1
+        assert os.listdir(spool_dir) == []
+
+
+# ---- payload tests -----------------------------------------------------------
+
+
+def _big_event(n, size=2000):
+    return {"id": f"e{n}", "type": "event-create", "timestamp": "2026-02-22T19:00:00.000Z",
+            "body": {"traceId": "trace-1", "name": "hook.sections", "metadata": {"text": "x" * size}}}
+
+
+class TestTelemetryPayloads:
+    """Ingestion bodies are compressed above a threshold and split by size."""
+
+    def test_large_body_is_gzipped(self, spool_dir, stub_server):
+        metrics = telemetry._send_batch([_big_event(n) for n in range(5)])
+
+        req = stub_server.requests[0]
+        assert metrics["ok"] and metrics["gzip"]
+        assert req["headers"]["Content-Encoding"] == "gzip"
+        assert metrics["wireBytes"] == req["wireBytes"] < metrics["bytes"] == len(req["body"])
+        assert len(json.loads(req["body"])["batch"]) == 5
+
+    def test_small_body_is_sent_plain(self, spool_dir, stub_server):
+        metrics = telemetry._send_batch([_big_event(0, size=10)])
+
+        assert metrics["ok"] and not metrics["gzip"]
+        assert "Content-Encoding" not in stub_server.requests[0]["headers"]
+        assert metrics["wireBytes"] == metrics["bytes"]
+
+    def test_batches_split_by_bytes(self, monkeypatch):
+        monkeypatch.setattr(telemetry, "FLUSH_BATCH_MAX_BYTES", 5000)
+        batches = telemetry._split_batches([_big_event(n) for n in range(5)])
+
+        assert [len(b) for b in batches] == [2, 2, 1]
+        for batch in batches:
+            assert len(json.dumps({"batch": batch}, separators=(",", ":"))) <= 5000 + 16
+
+    def test_batches_split_by_items(self, monkeypatch):
+        monkeypatch.setattr(telemetry, "FLUSH_BATCH_ITEMS", 4)
+        batches = telemetry._split_batches([_big_event(n, size=1) for n in range(10)])
+        assert [len(b) for b in batches] == [4, 4, 2]
+
+    def test_oversized_item_goes_alone(self, monkeypatch):
+        monkeypatch.setattr(telemetry, "FLUSH_BATCH_MAX_BYTES", 1000)
+        batches = telemetry._split_batches([_big_event(0, 10), _big_event(1), _big_event(2, 10)])
+        assert [[i["id"] for i in b] for b in batches] == [["e0"], ["e1"], ["e2"]]
+
+    def test_drain_reports_and_logs_batch_metrics(self, spool_dir, stub_server, tmp_path, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_DEBUG", "1")
+        monkeypatch.setattr(_debug, "DEBUG_DIR", str(tmp_path / "debug"))
+        monkeypatch.setattr(_debug, "_BUFFER", {})
+        monkeypatch.setattr(telemetry, "FLUSH_BATCH_MAX_BYTES", 5000)
+        telemetry._spool_append([_big_event(n) for n in range(5)], spool_dir)
+
+        stats = telemetry.drain_spool(spool_dir)
+        _debug.flush()
+
+        assert sorted(m["items"] for m in stats["batchMetrics"]) == [1, 2, 2]
+        assert all(m["ok"] and m["attempts"] == 1 and m["latencyMs"] >= 0 for m in stats["batchMetrics"])
+        assert sorted(len(json.loads(r["body"])["batch"]) for r in stub_server.requests) == [1, 2, 2]
+        with open(tmp_path / "debug" / "telemetry.jsonl", encoding="utf-8") as f:
+            logged = [json.loads(line) for line in f if '"flush_batch"' in line]
+        assert len(logged) == 3
+        assert {"items", "bytes", "wireBytes", "gzip", "latencyMs"} <= set(logged[0])
+
+
+# ---- exporter tests ----------------------------------------------------------
+
+
+class _RecordingExporter(telemetry.Exporter):
+    """Two requests per batch; "b" is refused on its first delivery."""
+
+    name = "recording"
+    calls = []
+
+    def configured(self):
+        return True
+
+    def encode(self, items):
+        return [("a", b"{}", 2, False), ("b", b"{}", 2, False)]
+
+    def deliver(self, target, data, gzipped):
+        self.calls.append(target)
+        return target != "b" or self.calls.count("b") > 1
+
+
+def _otlp_request(server, path):
+    return next(json.loads(req["body"]) for req in server.requests if req["path"] == path)
+
+
+class TestTelemetryExporters:
+    """The spool is exported by the exporter AGENT_KIT_TELEMETRY_EXPORTER selects."""
+
+    def test_exporter_must_implement_the_interface(self):
+        class Partial(telemetry.Exporter):
+            name = "partial"
+
+            def configured(self):
+                return True
+
+        with pytest.raises(TypeError):
+            Partial()
+        assert all(not getattr(cls, "__abstractmethods__", None) for cls in telemetry.EXPORTERS.values())
+
+    def test_unknown_or_unconfigured_exporter_disables_telemetry(self, spool_dir, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_EXPORTER", "carrier-pigeon")
+        assert telemetry.get_exporter() is None
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_EXPORTER", "jsonl")
+        monkeypatch.delenv("AGENT_KIT_TELEMETRY_JSONL", raising=False)
+        assert telemetry.get_exporter() is None
+
+        _emit_events("hook.stop")
+        assert not os.path.exists(spool_dir)
+
+    def test_jsonl_exporter_appends_spooled_items(self, spool_dir, stub_server, tmp_path, monkeypatch):
+        for key in ("LANGFUSE_BASE_URL", "LANGFUSE_PUBLIC_KEY", "LANGFUSE_SECRET_KEY"):
+            monkeypatch.delenv(key)
+        out = tmp_path / "export" / "telemetry.jsonl"
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_EXPORTER", "jsonl")
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_JSONL", str(out))
+        telemetry.emit_event("trace-1", "hook.stop", {"decision": "allow"})
+        telemetry.emit_score("trace-1", "hook.latency_ms", 3)
+        telemetry.flush()
+        spooled = _spooled(spool_dir)
+
+        stats = telemetry.drain_spool(spool_dir)
+
+        with open(out, encoding="utf-8") as f:
+            assert [json.loads(line) for line in f] == spooled
+        assert stats["sentItems"] == 2
+        assert stats["batchMetrics"][0]["exporter"] == "jsonl"
+        assert stub_server.requests == []
+
+    def test_otlp_exporter_sends_spans_and_gauges(self, spool_dir, stub_server, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_EXPORTER", "otlp")
+        monkeypatch.setenv("OTEL_EXPORTER_OTLP_ENDPOINT", f"http://127.0.0.1:{stub_server.server_port}")
+        monkeypatch.setenv("OTEL_EXPORTER_OTLP_HEADERS", "x-collector-token=a%20b")
+        with telemetry.span("guard.destructive_bash", tool="Bash"):
+            pass
+        telemetry.emit_event("session-1", "hook.pretool", {"decision": "allow", "count": 2})
+        telemetry.emit_score("session-1", "hook.latency_ms", 4)
+        telemetry.flush()
+
+        assert telemetry.drain_spool(spool_dir)["sentItems"] == 3
+
+        assert sorted(req["path"] for req in stub_server.requests) == ["/v1/metrics", "/v1/traces"]
+        assert all(req["headers"]["x-collector-token"] == "a b" for req in stub_server.requests)
+        traces = _otlp_request(stub_server, "/v1/traces")["resourceSpans"][0]
+        assert traces["resource"]["attributes"] == [
+            {"key": "service.name", "value": {"stringValue": telemetry.OTLP_SERVICE_NAME}}]
+        event, child = sorted(traces["scopeSpans"][0]["spans"], key=lambda s: "parentSpanId" in s)
+        assert event["name"] == "hook.pretool" and child["name"] == "guard.destructive_bash"
+        assert child["parentSpanId"] == event["spanId"] and len(event["spanId"]) == 16
+        assert child["traceId"] == event["traceId"] and len(event["traceId"]) == 32
+        assert int(child["endTimeUnixNano"]) >= int(child["startTimeUnixNano"]) > 0
+        attrs = {a["key"]: a["value"] for a in event["attributes"]}
+        assert attrs["decision"] == {"stringValue": "allow"}
+        assert attrs["count"] == {"intValue": "2"}
+        assert attrs["agent_kit.trace_id"] == {"stringValue": "session-1"}
+        metric = _otlp_request(stub_server, "/v1/metrics")["resourceMetrics"][0]["scopeMetrics"][0]["metrics"][0]
+        assert metric["name"] == "hook.latency_ms"
+        assert metric["gauge"]["dataPoints"][0]["asDouble"] == 4.0
+
+    def test_retry_resends_only_refused_requests(self, spool_dir, monkeypatch):
+        monkeypatch.setitem(telemetry.EXPORTERS, "recording", _RecordingExporter)
+        monkeypatch.setattr(_RecordingExporter, "calls", [])
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_EXPORTER", "recording")
+
+        metrics = telemetry._send_batch([_big_event(0, size=1)])
+
+        assert metrics["ok"] and metrics["attempts"] == 2
+        assert _RecordingExporter.calls == ["a", "b", "b"]
+
+
+# ---- circuit breaker tests ---------------------------------------------------
+
+
+def _force_breaker(spool_dir, **state):
+    os.makedirs(spool_dir, exist_ok=True)
+    with open(os.path.join(spool_dir, telemetry.BREAKER_FILE), "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+
+class TestTelemetryCircuitBreaker:
+    """Failed drains open a persistent breaker; half-open probes close it."""
+
+    def test_opens_after_consecutive_failures(self, spool_dir, stub_server, monkeypatch):
+        monkeypatch.setattr(telemetry, "FLUSH_RETRIES", 1)
+        stub_server.status = 503
+        _emit_events("hook.stop")
+
+        for expected in ("closed", "closed", "open"):
+            assert telemetry.drain_spool(spool_dir)["breaker"] == expected
+
+        breaker = telemetry.load_breaker(spool_dir)
+        assert breaker["failures"] == telemetry.BREAKER_FAILURE_THRESHOLD
+        assert breaker["backoffSeconds"] == telemetry.BREAKER_BASE_SECONDS
+        assert len(stub_server.requests) == 3
+
+        # Open: no request at all, items stay spooled
+        assert telemetry.drain_spool(spool_dir)["breaker"] == "open"
+        assert len(stub_server.requests) == 3
+        assert len(_spooled(spool_dir)) == 1
+
+    def test_success_resets_failure_count(self, spool_dir, stub_server, monkeypatch):
+        monkeypatch.setattr(telemetry, "FLUSH_RETRIES", 1)
+        stub_server.status = 503
+        _emit_events("hook.stop")
+        telemetry.drain_spool(spool_dir)
+        stub_server.status = 200
+
+        assert telemetry.drain_spool(spool_dir)["breaker"] == "closed"
+        assert telemetry.load_breaker(spool_dir)["failures"] == 0
+
+    def test_half_open_probe_sends_one_batch_then_closes(self, spool_dir, stub_server, monkeypatch):
+        monkeypatch.setattr(telemetry, "FLUSH_BATCH_ITEMS", 2)
+        _force_breaker(spool_dir, state="open", failures=3, retryAt=0, backoffSeconds=30)
+        _emit_events(*(f"hook.e{n}" for n in range(5)))
+
+        stats = telemetry.drain_spool(spool_dir)
+
+        assert stats["breaker"] == "closed"
+        assert stats["sentItems"] == 5
+        # The probe went alone before the remaining batches
+        assert len(json.loads(stub_server.requests[0]["body"])["batch"]) == 2
+        assert telemetry.load_breaker(spool_dir)["state"] == "closed"
+
+    def test_failed_probe_doubles_backoff(self, spool_dir, stub_server):
+        stub_server.status = 500
+        _force_breaker(spool_dir, state="open", failures=3, retryAt=0, backoffSeconds=30)
+        _emit_events("hook.a", "hook.b")
+
+        stats = telemetry.drain_spool(spool_dir)
+
+        breaker = telemetry.load_breaker(spool_dir)
+        assert stats["breaker"] == "open"
+        assert len(stub_server.requests) == 1
+        assert breaker["backoffSeconds"] == 60
+        assert breaker["retryAt"] > time.time() + 50
+        assert len(_spooled(spool_dir)) == 2
+
+    def test_backoff_is_capped(self, spool_dir, stub_server):
+        stub_server.status = 500
+        _force_breaker(spool_dir, state="open", failures=9, retryAt=0,
+                       backoffSeconds=telemetry.BREAKER_MAX_SECONDS)
+        _emit_events("hook.a")
+        telemetry.drain_spool(spool_dir)
+        assert telemetry.load_breaker(spool_dir)["backoffSeconds"] == telemetry.BREAKER_MAX_SECONDS
+
+    def test_open_breaker_skips_flusher_spawn(self, spool_dir, monkeypatch):
+        spawned = []
+        monkeypatch.setattr(telemetry.subprocess, "Popen", lambda *a, **k: spawned.append(a))
+        _force_breaker(spool_dir, state="open", failures=3, retryAt=time.time() + 60)
+
+        _START_FLUSHER(spool_dir)
+        assert spawned == []
+
+        _force_breaker(spool_dir, state="closed", failures=0)
+        _START_FLUSHER(spool_dir)
+        assert len(spawned) == 1
+
+    def test_spool_cap_drops_new_items(self, spool_dir, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_SPOOL_MAX_MB", "0.001")
+        _emit_events("hook.a")
+        for _ in range(20):
+            _emit_events("hook.b")
+
+        size = os.path.getsize(os.path.join(spool_dir, telemetry.SPOOL_FILE))
+        assert size <= 1024 * 1024 * 0.001
+        assert telemetry.spool_dropped(spool_dir) > 0
+        # Hooks never touch breaker.json; only the flusher writes it, under the flush lock.
+        assert not os.path.exists(os.path.join(spool_dir, telemetry.BREAKER_FILE))
+
+    def test_concurrent_drops_are_all_counted(self, spool_dir, monkeypatch):
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_SPOOL_MAX_MB", "0.00001")
+        item = {"id": "x", "type": "event-create", "body": {}}
+
+        def emit():
+            for _ in range(50):
+                telemetry._spool_append([item, item], spool_dir, capped=True)
+
+        threads = [threading.Thread(target=emit) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert telemetry.spool_dropped(spool_dir) == 8 * 50 * 2
+
+
+# ---- flusher tests -----------------------------------------------------------
+
+
+class TestTelemetryFlusher:
+    """drain_spool delivers in batches, keeps failures, runs single-instance."""
+
+    def test_drain_sends_batches_and_empties_spool(self, spool_dir, stub_server, monkeypatch):
+        monkeypatch.setattr(telemetry, "FLUSH_BATCH_ITEMS", 3)
+        _emit_events(*(f"hook.e{n}" for n in range(7)))
+
+        stats = telemetry.drain_spool(spool_dir)
+
+        assert stats["batches"] == 3
+        assert len(stub_server.requests) == 3
+        assert sorted(i["body"]["name"] for i in _sent_items(stub_server)) == [f"hook.e{n}" for n in range(7)]
+        assert stub_server.requests[0]["path"] == "/api/public/ingestion"
+        assert stub_server.requests[0]["headers"]["Authorization"].startswith("Basic ")
+        assert os.listdir(spool_dir) == []
+
+    def test_failed_batches_stay_spooled(self, spool_dir, stub_server):
+        stub_server.status = 500
+        telemetry.emit_event("trace-1", "hook.stop", {})
+        telemetry.emit_score("trace-1", "hook.latency_ms", 5)
+        telemetry.flush()
+
+        stats = telemetry.drain_spool(spool_dir)
+
+        assert stats["failedItems"] == 2
+        assert len(stub_server.requests) == telemetry.FLUSH_RETRIES
+        assert [i["type"] for i in _spooled(spool_dir)] == ["event-create", "score-create"]
+
+        stub_server.status = 200
+        assert telemetry.drain_spool(spool_dir)["sentItems"] == 2
+        assert _spooled(spool_dir) == []
+
+    def test_held_lock_skips_drain(self, spool_dir, stub_server):
+        _emit_events("hook.stop")
+        os.mkdir(os.path.join(spool_dir, telemetry.FLUSH_LOCK))
+
+        stats = telemetry.drain_spool(spool_dir)
+
+        assert stats["locked"] is True
+        assert stub_server.requests == []
+        assert len(_spooled(spool_dir)) == 1
+
+    def test_stale_lock_is_broken(self, spool_dir, stub_server):
+        _emit_events("hook.stop")
+        lock = os.path.join(spool_dir, telemetry.FLUSH_LOCK)
+        os.mkdir(lock)
+        old = os.stat(lock).st_mtime - telemetry.FLUSH_LOCK_STALE_SECONDS - 1
+        os.utime(lock, (old, old))
+
+        assert telemetry.drain_spool(spool_dir)["sentItems"] == 1
+        assert not os.path.exists(lock)
+
+    def test_slow_drain_keeps_its_lock(self, spool_dir, monkeypatch):
+        monkeypatch.setattr(telemetry, "FLUSH_LOCK_STALE_SECONDS", 0.2)
+        monkeypatch.setattr(telemetry, "FLUSH_LOCK_HEARTBEAT_SECONDS", 0.02)
+        contenders = []
+
+        class SlowExporter(telemetry.Exporter):
+            name = "slow"
+
+            def configured(self):
+                return True
+
+            def encode(self, items):
+                return [("x", b"{}", 2, False)]
+
+            def deliver(self, target, data, gzipped):
+                time.sleep(0.5)
+                contenders.append(telemetry._acquire_flush_lock(spool_dir))
+                return True
+
+        monkeypatch.setitem(telemetry.EXPORTERS, "slow", SlowExporter)
+        monkeypatch.setenv("AGENT_KIT_TELEMETRY_EXPORTER", "slow")
+        _emit_events("hook.slow")
+
+        assert telemetry.drain_spool(spool_dir)["sentItems"] == 1
+        assert contenders == [None]
+        assert not os.path.exists(os.path.join(spool_dir, telemetry.FLUSH_LOCK))
+
+    def test_inflight_file_from_killed_flusher_is_resent(self, spool_dir, stub_server):
+        _emit_events("hook.orphan")
+        os.rename(
+            os.path.join(spool_dir, telemetry.SPOOL_FILE),
+            os.path.join(spool_dir, "inflight-1-99.jsonl"),
+        )
+        _emit_events("hook.fresh")
+
+        telemetry.drain_spool(spool_dir)
+
+        assert [i["body"]["name"] for i in _sent_items(stub_server)] == ["hook.orphan", "hook.fresh"]
+        assert os.listdir(spool_dir) == []
+
+    def test_inflight_file_alone_is_drained(self, spool_dir, stub_server):
+        _emit_events("hook.orphan")
+        os.rename(
+            os.path.join(spool_dir, telemetry.SPOOL_FILE),
+            os.path.join(spool_dir, "inflight-1-99.jsonl"),
+        )
+
+        assert telemetry.drain_spool(spool_dir)["sentItems"] == 1
+        assert os.listdir(spool_dir) == []
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -1,28 +1,271 @@
 """Shared debug/logging utilities for agent-kit scripts.
 
 Writes diagnostic logs to .agent-kit/evidence/debug/ when AGENT_KIT_DEBUG=1.
+
+FORMAT (<source>.jsonl, one object per line):
+  {"ts": <epoch seconds, ms precision>, "us": <µs since process start>,
+   "pid": ..., "source": ..., "event": ..., "session": ..., "phase": ...,
+   "msg": ..., <extra fields>}
+  - Records are buffered in memory and appended with one write per source
+    at interpreter exit (atexit), followed by a final "exit" record.
+  - set_context(event=..., session=...) stamps every later record.
+  - Disabled: debug() is a single environment lookup.
+
+ROTATION:
+  - <source>.jsonl is rotated to <source>.<YYYYmmddTHHMMSS>.<pid>[-n].jsonl[.gz] once it
+    exceeds AGENT_KIT_DEBUG_MAX_BYTES or its first entry is older than
+    AGENT_KIT_DEBUG_MAX_AGE_DAYS. Rotated segments are gzipped unless
+    AGENT_KIT_DEBUG_GZIP=0.
+  - cleanup_evidence() keeps .agent-kit/evidence/ under
+    AGENT_KIT_EVIDENCE_BUDGET_MB: expired rotated segments go first, then the
+    oldest files (rotated segments before other evidence). Live debug
+    logs are never deleted. It runs after every rotation and, via
+    maybe_cleanup_evidence(), at most once per CLEANUP_INTERVAL_SECONDS.
+
 Import-only utility — no standalone CLI.
 """
 
+import atexit
+import gzip
+import json
 import os
+import re
+import shutil
+import time
 from datetime import datetime
 
 DEBUG_DIR = ".agent-kit/evidence/debug"
+EVIDENCE_DIR = ".agent-kit/evidence"
+CLEANUP_STAMP = ".cleanup-stamp"
+CLEANUP_INTERVAL_SECONDS = 3600
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_MAX_AGE_DAYS = 7
+DEFAULT_EVIDENCE_BUDGET_MB = 100
+
+_TS_FORMAT = "%Y%m%dT%H%M%S"
+_ROTATED_PATTERN = re.compile(r"\.\d{8}T\d{6}\.\d+(?:-\d+)?\.jsonl(\.gz)?$")
+LOG_SUFFIX = ".jsonl"
+
+# Paths whose first-entry age was already checked by this process
+_AGE_CHECKED = set()
+
+# Per-invocation buffer: {source: [record, ...]}
+_START_NS = time.perf_counter_ns()
+_BUFFER = {}
+_CONTEXT = {}
+_ATEXIT_REGISTERED = False
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        value = float(os.environ.get(name, ""))
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def max_log_bytes() -> int:
+    return int(_env_number("AGENT_KIT_DEBUG_MAX_BYTES", DEFAULT_MAX_BYTES))
+
+
+def max_age_seconds() -> float:
+    return _env_number("AGENT_KIT_DEBUG_MAX_AGE_DAYS", DEFAULT_MAX_AGE_DAYS) * 86400
+
 
+def evidence_budget_bytes() -> int:
+    return int(_env_number("AGENT_KIT_EVIDENCE_BUDGET_MB", DEFAULT_EVIDENCE_BUDGET_MB) * 1024 * 1024)
+
+
+def _first_entry_epoch(log_path: str) -> float | None:
+    """`ts` of the first record of a log."""
+    try:
+        with open(log_path, "rb") as f:
+            first = json.loads(f.readline(64 * 1024))
+        return float(first["ts"])
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+
+
+def _is_rotated(path: str) -> bool:
+    return bool(_ROTATED_PATTERN.search(os.path.basename(path)))
+
+
+def _is_live_log(path: str) -> bool:
+    """An active <source>.jsonl in the debug directory (never deleted by cleanup)."""
+    return (
+        os.path.basename(os.path.dirname(path)) == os.path.basename(DEBUG_DIR)
+        and path.endswith(LOG_SUFFIX)
+        and not _is_rotated(path)
+    )
+
+
+def _gzip_segment(path: str) -> None:
+    temp_path = f"{path}.gz.tmp"
+    try:
+        with open(path, "rb") as src, gzip.open(temp_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(temp_path, f"{path}.gz")
+        os.unlink(path)
+    except OSError:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+
+
+def rotate_if_needed(log_path: str, now: float | None = None) -> bool:
+    """Rotate log_path if it is too large or too old. Returns True if rotated."""
+    try:
+        size = os.stat(log_path).st_size
+    except OSError:
+        return False
 
-def debug(message: str, source: str = "hook-router") -> None:
-    """Write a debug message to the debug log file.
+    due = size >= max_log_bytes()
+    if not due and log_path not in _AGE_CHECKED:
+        _AGE_CHECKED.add(log_path)
+        first = _first_entry_epoch(log_path)
+        now = time.time() if now is None else now
+        due = first is not None and now - first > max_age_seconds()
+    if not due:
+        return False
 
-    Only writes when AGENT_KIT_DEBUG=1. Never writes to stdout.
+    stem = log_path[:-len(LOG_SUFFIX)] if log_path.endswith(LOG_SUFFIX) else log_path
+    base = f"{stem}.{datetime.now().strftime(_TS_FORMAT)}.{os.getpid()}"
+    rotated = f"{base}{LOG_SUFFIX}"
+    seq = 0
+    while os.path.exists(rotated) or os.path.exists(f"{rotated}.gz"):
+        # Same process rotating twice within a second: never overwrite
+        seq += 1
+        rotated = f"{base}-{seq}{LOG_SUFFIX}"
+    try:
+        os.rename(log_path, rotated)
+    except OSError:
+        return False  # another process rotated it first
+    _AGE_CHECKED.discard(log_path)
+
+    if os.environ.get("AGENT_KIT_DEBUG_GZIP", "1") != "0":
+        _gzip_segment(rotated)
+    # <evidence>/debug/<source>.jsonl -> enforce the budget on <evidence>
+    cleanup_evidence(os.path.dirname(os.path.dirname(log_path)) or EVIDENCE_DIR)
+    return True
+
+
+def cleanup_evidence(root: str = EVIDENCE_DIR, budget: int | None = None,
+                     now: float | None = None) -> dict:
+    """Enforce the evidence budget. Returns {"bytesBefore", "bytesAfter", "removed"}."""
+    budget = evidence_budget_bytes() if budget is None else budget
+    now = time.time() if now is None else now
+    max_age = max_age_seconds()
+
+    files = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((path, st.st_size, st.st_mtime))
+
+    total = sum(size for _, size, _ in files)
+    report = {"bytesBefore": total, "bytesAfter": total, "removed": []}
+
+    # Expired rotated segments first, then oldest rotated, then oldest other evidence
+    candidates = sorted(
+        (f for f in files
+         if os.path.basename(f[0]) != CLEANUP_STAMP and not _is_live_log(f[0])),
+        key=lambda f: (not (_is_rotated(f[0]) and now - f[2] > max_age), not _is_rotated(f[0]), f[2]),
+    )
+    for path, size, mtime in candidates:
+        expired = _is_rotated(path) and now - mtime > max_age
+        if total <= budget and not expired:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+        report["removed"].append(path)
+
+    report["bytesAfter"] = total
+    return report
+
+
+def maybe_cleanup_evidence(root: str = EVIDENCE_DIR,
+                           interval_seconds: float = CLEANUP_INTERVAL_SECONDS) -> dict | None:
+    """Run cleanup_evidence at most once per interval (tracked by a stamp file)."""
+    if not os.path.isdir(root):
+        return None
+    stamp = os.path.join(root, CLEANUP_STAMP)
+    try:
+        if time.time() - os.stat(stamp).st_mtime < interval_seconds:
+            return None
+    except OSError:
+        pass
+    try:
+        with open(stamp, "w", encoding="utf-8"):
+            pass
+    except OSError:
+        return None
+    return cleanup_evidence(root)
+
+
+def set_context(**fields) -> None:
+    """Attach fields (e.g. event, session) to every later record."""
+    _CONTEXT.update({k: v for k, v in fields.items() if v is not None})
+
+
+def _record(message: str, source: str, fields: dict) -> dict:
+    return {
+        "ts": int(time.time() * 1000) / 1000,
+        "us": (time.perf_counter_ns() - _START_NS) // 1000,
+        "pid": os.getpid(),
+        "source": source,
+        **_CONTEXT,
+        "msg": message,
+        **fields,
+    }
+
+
+def debug(message: str, source: str = "hook-router", **fields) -> None:
+    """Buffer a structured debug record; written once at exit.
+
+    Only records when AGENT_KIT_DEBUG=1. Never writes to stdout.
     """
     if os.environ.get("AGENT_KIT_DEBUG") != "1":
         return
 
+    global _ATEXIT_REGISTERED
+    _BUFFER.setdefault(source, []).append(_record(message, source, fields))
+    if not _ATEXIT_REGISTERED:
+        atexit.register(flush)
+        _ATEXIT_REGISTERED = True
+
+
+def flush() -> None:
+    """Append buffered records, one write per source file."""
+    if not _BUFFER:
+        return
+    pending = {source: records for source, records in _BUFFER.items() if records}
+    _BUFFER.clear()
     try:
         os.makedirs(DEBUG_DIR, exist_ok=True)
-        ts = datetime.now().strftime("%Y%m%dT%H%M%S")
-        log_path = os.path.join(DEBUG_DIR, f"{source}.log")
-        with open(log_path, "a", encoding="utf-8") as f:
-            f.write(f"{ts} {message}\n")
     except OSError:
-        pass
+        return
+
+    for source, records in pending.items():
+        records.append(_record("exit", source, {"phase": "exit"}))
+        payload = "".join(
+            json.dumps(r, separators=(",", ":"), default=str) + "\n" for r in records
+        ).encode("utf-8")
+        log_path = os.path.join(DEBUG_DIR, f"{source}{LOG_SUFFIX}")
+        try:
+            rotate_if_needed(log_path)
+            fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, payload)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""Boulder registry: one active plan per session in the same checkout.
+
+LAYOUT (next to the legacy .agent-kit/boulder.json):
+  .agent-kit/boulders/<slug>.json   boulder for one plan (same schema as
+                                    boulder.json, plus "slug")
+  .agent-kit/boulders/index.json    {"version": 1,
+                                     "plans": {slug: {"planPath", "active",
+                                                      "status", "updatedAt"}},
+                                     "sessions": {session_key: slug}}
+
+CONTRACT:
+  plan_slug(plan_path, boulder_file) -> str:
+    - Plans directly in the plans directory next to boulder_file
+      (.agent-kit/plans): the file name without extension.
+    - Anywhere else (subdirectories too): that name plus "-" and 8 hex chars
+      of a hash of the normalized path, so plans/a/x.md and plans/b/x.md
+      get separate boulders.
+
+  resolve_boulder_path(boulder_file, session_key) -> str:
+    - O(1): the session's binding in index.json, else the legacy
+      boulder_file (previous single-boulder behaviour). An unbound session
+      never picks up another session's registered plan on its own; it is
+      bound explicitly with bind_session (start-work does this).
+
+  active_plans(boulder_file) -> dict:
+    - {slug: index entry} of the registered plans still active, for the
+      SessionStart hint shown to unbound sessions.
+
+  start_boulder(boulder_file, plan_path, session_key, task) -> str | None:
+    - Writes boulders/<slug>.json, registers the plan and binds the session.
+
+  bind_session(boulder_file, plan_path, session_key) -> str | None:
+    - Binds session_key to an already registered, still active plan (e.g. a
+      new session resuming after a handoff). None if there is no such plan.
+
+  save_boulder(boulder_file, path, boulder) -> bool:
+    - Writes a resolved boulder and keeps its index entry in sync.
+
+CLI (KEY defaults to "global", the key of hooks without a session id):
+  python3 boulder.py start <plan_path> [--session KEY] [--task N --label TEXT]
+  python3 boulder.py bind <plan_path> [--session KEY]   # prints the boulder path
+  python3 boulder.py resolve [--session KEY]   # prints the boulder path
+  python3 boulder.py list                      # prints the index as JSON
+"""
+
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+# Ensure plugin root is on sys.path so `from scripts.*` imports resolve
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+_PLUGIN_ROOT = os.path.dirname(_SCRIPT_DIR)
+if _PLUGIN_ROOT not in sys.path:
+    sys.path.insert(0, _PLUGIN_ROOT)
+
+from scripts.state import DURABILITY_FILE_DIR, read_json_view, update_json, write_json
+
+BOULDER_FILE = ".agent-kit/boulder.json"
+PLANS_DIRNAME = "plans"
+REGISTRY_DIRNAME = "boulders"
+INDEX_FILENAME = "index.json"
+INDEX_LOCK_WAIT_SECONDS = 1.0
+SESSION_KEY_DEFAULT = "global"
+
+
+def registry_dir(boulder_file: str) -> str:
+    return os.path.join(os.path.dirname(boulder_file), REGISTRY_DIRNAME)
+
+
+def plans_dir(boulder_file: str) -> str:
+    return os.path.join(os.path.dirname(boulder_file), PLANS_DIRNAME)
+
+
+def index_path(boulder_file: str) -> str:
+    return os.path.join(registry_dir(boulder_file), INDEX_FILENAME)
+
+
+def _rel_norm(path: str) -> str:
+    return os.path.normpath(os.path.relpath(os.path.abspath(path)))
+
+
+def plan_slug(plan_path: str, boulder_file: str = BOULDER_FILE) -> str:
+    """Registry key for a plan, unique per plan path (see CONTRACT)."""
+    stem = os.path.splitext(os.path.basename(plan_path))[0] or "plan"
+    normalized = _rel_norm(plan_path)
+    if os.path.dirname(normalized) == _rel_norm(plans_dir(boulder_file)):
+        return stem
+    digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:8]
+    return f"{stem}-{digest}"
+
+
+def boulder_slug(path: str) -> str:
+    """Registry key of a registered boulder file (boulders/<slug>.json)."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _is_active(entry) -> bool:
+    return isinstance(entry, dict) and entry.get("active") is True and entry.get("status") != "done"
+
+
+def resolve_boulder_path(boulder_file: str, session_key: str = "") -> str:
+    """Return the boulder file that applies to session_key."""
+    index = read_json_view(index_path(boulder_file))
+    if not index:
+        return boulder_file
+
+    plans = index.get("plans", {})
+    sessions = index.get("sessions", {})
+    if not isinstance(plans, dict) or not isinstance(sessions, dict):
+        return boulder_file
+
+    slug = sessions.get(session_key) if session_key else None
+    if not slug or not isinstance(slug, str):
+        return boulder_file
+    return os.path.join(registry_dir(boulder_file), f"{slug}.json")
+
+
+def active_plans(boulder_file: str) -> dict:
+    """Registered plans that are still active, keyed by slug."""
+    plans = read_json_view(index_path(boulder_file)).get("plans", {})
+    if not isinstance(plans, dict):
+        return {}
+    return {slug: entry for slug, entry in plans.items() if _is_active(entry)}
+
+
+def is_registry_boulder(boulder_file: str, path: str) -> bool:
+    """True for boulders/<slug>.json files (as opposed to the legacy boulder)."""
+    return os.path.abspath(os.path.dirname(path)) == os.path.abspath(registry_dir(boulder_file))
+
+
+def apply_index_entry(index: dict, slug: str, boulder: dict, session_key: str = "") -> dict:
+    """Update a loaded index in place for one boulder's current state."""
+    index["version"] = 1
+    plans = index.setdefault("plans", {})
+    plans[slug] = {
+        "planPath": boulder.get("planPath", ""),
+        "active": boulder.get("active", False),
+        "status": boulder.get("status", ""),
+        "updatedAt": boulder.get("updatedAt"),
+    }
+    sessions = index.setdefault("sessions", {})
+    if session_key:
+        sessions[session_key] = slug
+    if not _is_active(plans[slug]):
+        # Finished plans release their sessions
+        for key in [k for k, v in sessions.items() if v == slug]:
+            del sessions[key]
+    return index
+
+
+def _sync_index(boulder_file: str, slug: str, boulder: dict, session_key: str = "") -> bool:
+    return update_json(
+        index_path(boulder_file),
+        lambda index: apply_index_entry(index, slug, boulder, session_key),
+        wait_seconds=INDEX_LOCK_WAIT_SECONDS,
+    ) is not None
+
+
+def save_boulder(boulder_file: str, path: str, boulder: dict) -> bool:
+    """Write a boulder (legacy or registry) and sync the index entry."""
+    if not write_json(path, boulder, durability=DURABILITY_FILE_DIR):
+        return False
+    if is_registry_boulder(boulder_file, path):
+        return _sync_index(boulder_file, boulder_slug(path), boulder)
+    return True
+
+
+def start_boulder(boulder_file: str, plan_path: str, session_key: str = "",
+                  task: dict | None = None, now: str = "") -> str | None:
+    """Create/overwrite the registry boulder for plan_path and bind the session."""
+    slug = plan_slug(plan_path, boulder_file)
+    path = os.path.join(registry_dir(boulder_file), f"{slug}.json")
+    boulder = {
+        "version": 1,
+        "slug": slug,
+        "active": True,
+        "planPath": plan_path,
+        "status": "in_progress",
+        "currentTask": task or {},
+        "updatedAt": now,
+    }
+    if not write_json(path, boulder, durability=DURABILITY_FILE_DIR):
+        return None
+    if not _sync_index(boulder_file, slug, boulder, session_key):
+        return None
+    return path
+
+
+def bind_session(boulder_file: str, plan_path: str, session_key: str) -> str | None:
+    """Bind session_key to the registered boulder of plan_path if it is active."""
+    slug = plan_slug(plan_path, boulder_file)
+    path = os.path.join(registry_dir(boulder_file), f"{slug}.json")
+    if not session_key or not _is_active(read_json_view(path)):
+        return None
+    bound = []
+
+    def mutate(index):
+        plans = index.get("plans")
+        if not isinstance(plans, dict) or not _is_active(plans.get(slug)):
+            return
+        index.setdefault("sessions", {})[session_key] = slug
+        bound.append(slug)
+
+    if update_json(index_path(boulder_file), mutate, wait_seconds=INDEX_LOCK_WAIT_SECONDS) is None:
+        return None
+    return path if bound else None
+
+
+def _arg(args: list, flag: str, default: str = "") -> str:
+    if flag in args:
+        idx = args.index(flag)
+        if idx + 1 < len(args):
+            return args[idx + 1]
+    return default
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: boulder.py start <plan_path> [--session KEY] [--task N --label TEXT] "
+              "| boulder.py bind <plan_path> [--session KEY] "
+              "| boulder.py resolve [--session KEY] | boulder.py list", file=sys.stderr)
+        sys.exit(1)
+
+    command = sys.argv[1]
+    args = sys.argv[2:]
+    session_key = _arg(args, "--session") or SESSION_KEY_DEFAULT
+
+    if command == "start":
+        if not args or args[0].startswith("--"):
+            print("boulder-start: missing plan path", file=sys.stderr)
+            sys.exit(1)
+        task = {}
+        if "--task" in args:
+            try:
+                task["number"] = int(_arg(args, "--task"))
+            except ValueError:
+                print("boulder-start: --task requires a number", file=sys.stderr)
+                sys.exit(1)
+            task["label"] = _arg(args, "--label")
+
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        path = start_boulder(BOULDER_FILE, args[0], session_key, task, now)
+        if path is None:
+            sys.exit(1)
+        print(path)
+
+    elif command == "bind":
+        if not args or args[0].startswith("--"):
+            print("boulder-bind: missing plan path", file=sys.stderr)
+            sys.exit(1)
+        path = bind_session(BOULDER_FILE, args[0], session_key)
+        if path is None:
+            print(f"boulder-bind: no active registered plan for {args[0]}", file=sys.stderr)
+            sys.exit(1)
+        print(path)
+
+    elif command == "resolve":
+        print(resolve_boulder_path(BOULDER_FILE, session_key))
+
+    elif command == "list":
+        print(json.dumps(read_json_view(index_path(BOULDER_FILE)), separators=(",", ":")))
+
+    else:
+        print(f"Unknown command: {command}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Deterministic handoff file for continuing work in a new session.
+
+CONTRACT:
+  build_handoff(session_key, ...) -> str:
+    - Markdown assembled only from local state: the session's boulder, the plan
+      checklist index, the runtime session entry and the session's most recent
+      records in the shared hook debug log (matched on their "session" field;
+      other sessions' records and unparseable lines are skipped). Nothing is
+      read from the conversation.
+    - Values pass through the scripts/sanitize.py redaction (sensitive keys and
+      `name=value` pairs) and are truncated; raw hook payloads are never copied.
+    - Missing or corrupt state yields "none" lines, never an error (fail-open).
+
+  write_handoff(content, out_path) -> bool:
+    - Writes the markdown atomically to .agent-kit/handoff/last.md.
+
+CLI:
+  python3 handoff.py [--session KEY] [--out PATH]
+    # writes the file, prints its path and a one-line summary
+"""
+
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+# Ensure plugin root is on sys.path so `from scripts.*` imports resolve
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+_PLUGIN_ROOT = os.path.dirname(_SCRIPT_DIR)
+if _PLUGIN_ROOT not in sys.path:
+    sys.path.insert(0, _PLUGIN_ROOT)
+
+from scripts._debug import DEBUG_DIR
+from scripts.boulder import BOULDER_FILE, resolve_boulder_path
+from scripts.plan import load_index, next_task
+from scripts.sanitize import _redact_sensitive, _truncate, redact_text
+from scripts.state import acquire_lock, read_json_view, release_lock, write_text_locked
+
+HANDOFF_FILE = ".agent-kit/handoff/last.md"
+RUNTIME_FILE = ".agent-kit/state/runtime.local.json"
+SESSION_KEY_DEFAULT = "global"
+EVENT_LOG = os.path.join(DEBUG_DIR, "hook-router.jsonl")
+MAX_EVENTS = 20
+EVENT_TAIL_BYTES = 16 * 1024
+EVENT_SCAN_BYTES = 256 * 1024
+MAX_VALUE_LENGTH = 200
+
+
+def _clean(value) -> str:
+    return _truncate(redact_text(str(value)), MAX_VALUE_LENGTH)
+
+
+def _parse_event(line: str) -> dict | None:
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def _format_event(line: str, record: dict | None = None) -> str:
+    """One debug record as `HH:MM:SS event phase msg key=value ...`."""
+    record = _parse_event(line) if record is None else record
+    if record is None:
+        return line
+    record = _redact_sensitive(record)
+    stamp = ""
+    if isinstance(record.get("ts"), (int, float)):
+        stamp = datetime.fromtimestamp(record["ts"], timezone.utc).strftime("%H:%M:%S")
+    head = [stamp] + [str(record.get(k, "")) for k in ("event", "phase", "msg")]
+    extra = [f"{k}={v}" for k, v in record.items()
+             if k not in ("ts", "us", "pid", "source", "session", "event", "phase", "msg")]
+    return " ".join(part for part in head + extra if part)
+
+
+def _lines_from_end(log_path: str):
+    """Complete lines of a file, newest first, from at most its last EVENT_SCAN_BYTES."""
+    try:
+        with open(log_path, "rb") as f:
+            pos = f.seek(0, os.SEEK_END)
+            floor = max(0, pos - EVENT_SCAN_BYTES)
+            carry = b""
+            while pos > floor:
+                step = min(EVENT_TAIL_BYTES, pos - floor)
+                pos -= step
+                f.seek(pos)
+                lines = (f.read(step) + carry).split(b"\n")
+                carry = lines.pop(0)  # may continue in the previous chunk
+                yield from reversed(lines)
+            if pos == 0 and carry:
+                yield carry
+    except OSError:
+        return
+
+
+def tail_events(log_path: str = EVENT_LOG, limit: int = MAX_EVENTS,
+                session_key: str | None = None) -> list:
+    """Last `limit` records of the hook debug log, read from the end of the file.
+
+    With session_key, only records stamped with that session are kept.
+    """
+    events = []
+    for raw in _lines_from_end(log_path):
+        line = raw.decode("utf-8", errors="replace")
+        if not line.strip():
+            continue
+        record = _parse_event(line)
+        if session_key is not None and (record is None or record.get("session") != session_key):
+            continue
+        events.append(_clean(_format_event(line, record)))
+        if len(events) >= limit:
+            break
+    return events[::-1]
+
+
+def _plan_lines(boulder: dict) -> list:
+    plan_path = boulder.get("planPath", "")
+    if not plan_path:
+        return ["- Active plan: none"]
+
+    lines = [f"- Active plan: {_clean(plan_path)}"]
+    lines.append(f"- Status: {_clean(boulder.get('status', 'unknown'))}"
+                 f" (active: {str(boulder.get('active') is True).lower()})")
+    task = boulder.get("currentTask")
+    if isinstance(task, dict) and (task.get("number") or task.get("label")):
+        lines.append(f"- Current task: {_clean(task.get('number', ''))}. {_clean(task.get('label', ''))}")
+
+    index = load_index(str(plan_path))
+    if index and index.get("total"):
+        lines.append(f"- Progress: {index['done']}/{index['total']} tasks done")
+        upcoming = next_task(index)
+        lines.append(
+            f"- Next unchecked task: {upcoming['number']}. {_clean(upcoming['label'])}"
+            if upcoming else "- Next unchecked task: none (plan complete)"
+        )
+    elif index is None:
+        lines.append("- Plan file: missing")
+    return lines
+
+
+def _session_lines(session: dict) -> list:
+    if not session:
+        return ["- Runtime state: none"]
+
+    lines = [f"- Persona: {_clean(session.get('activePersona', 'sisyphus'))}"]
+    ulw = session.get("ulw")
+    if isinstance(ulw, dict):
+        lines.append(f"- ulw: {'enabled' if ulw.get('enabled') else 'disabled'}"
+                     f" (stop blocks: {_clean(ulw.get('stopBlocks', 0))})")
+    stop = session.get("stopContinuation")
+    if isinstance(stop, dict) and stop.get("disabled"):
+        reason = stop.get("disabledReason") or "no reason given"
+        lines.append(f"- Stop continuation: disabled ({_clean(reason)})")
+    return lines
+
+
+def build_handoff(session_key: str = "", boulder_file: str = BOULDER_FILE,
+                  runtime_file: str = RUNTIME_FILE, log_path: str = EVENT_LOG,
+                  now: str = "") -> str:
+    """Render the handoff markdown from local state."""
+    key = session_key or SESSION_KEY_DEFAULT
+    now = now or datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    boulder = _redact_sensitive(read_json_view(resolve_boulder_path(boulder_file, session_key)))
+    sessions = read_json_view(runtime_file).get("sessions", {})
+    session = sessions.get(key) if isinstance(sessions, dict) else None
+    session = _redact_sensitive(session) if isinstance(session, dict) else {}
+    events = tail_events(log_path, session_key=key)
+
+    lines = [
+        "# Handoff",
+        "",
+        f"- Generated: {now}",
+        f"- Session: {_clean(key)}",
+        "",
+        "## Plan",
+        *_plan_lines(boulder if isinstance(boulder, dict) else {}),
+        "",
+        "## Session",
+        *_session_lines(session),
+        "",
+        "## Recent hook events",
+    ]
+    if events:
+        lines += ["```text", *events, "```"]
+    else:
+        lines.append("- none recorded (enable with AGENT_KIT_DEBUG=1)")
+    lines += [
+        "",
+        "## Next steps",
+        "- Resume: /claude-agent-kit:start-work",
+        "- Escape hatch: /claude-agent-kit:stop-continuation",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def write_handoff(content: str, out_path: str = HANDOFF_FILE) -> bool:
+    """Atomically write the handoff file under its lock."""
+    lock_dir = acquire_lock(out_path)
+    if lock_dir is None:
+        return False
+    try:
+        return write_text_locked(out_path, content)
+    finally:
+        release_lock(lock_dir)
+
+
+def _arg(args: list, flag: str, default: str = "") -> str:
+    if flag in args:
+        idx = args.index(flag)
+        if idx + 1 < len(args):
+            return args[idx + 1]
+    return default
+
+
+def main():
+    args = sys.argv[1:]
+    session_key = _arg(args, "--session")
+    out_path = _arg(args, "--out", HANDOFF_FILE)
+
+    content = build_handoff(session_key)
+    if not write_handoff(content, out_path):
+        print(f"handoff: cannot write {out_path}", file=sys.stderr)
+        sys.exit(1)
+
+    summary = [line[2:] for line in content.splitlines()
+               if line.startswith(("- Active plan:", "- Progress:", "- Next unchecked task:"))]
+    print(out_path)
+    print("; ".join(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,9 +10,15 @@ CONTRACT:
       SessionStart / UserPromptSubmit -> plain text only (or empty)
       PreToolUse / Stop               -> valid JSON only (or empty)
   - On ANY error: log to stderr, exit 0, print nothing to stdout (fail-open).
+  - Every invocation appends its latency and outcome (ok/block/error) to the
+    local histogram (`telemetry.py stats`).
 
 ENV:
-  AGENT_KIT_DEBUG=1 -> write diagnostics to .agent-kit/evidence/debug/
+  AGENT_KIT_DEBUG=1 -> buffered JSONL diagnostics in .agent-kit/evidence/debug/
+  AGENT_KIT_DEBUG_MAX_BYTES / AGENT_KIT_DEBUG_MAX_AGE_DAYS / AGENT_KIT_DEBUG_GZIP
+  / AGENT_KIT_EVIDENCE_BUDGET_MB -> log rotation and evidence budget (see _debug.py)
+  AGENT_KIT_RECORD=1 -> keep the last AGENT_KIT_RECORD_MAX redacted inputs per
+                        session for replay (see recorder.py)
 """
 
 import json
@@ -29,11 +35,15 @@ if _PLUGIN_ROOT not in sys.path:
     sys.path.insert(0, _PLUGIN_ROOT)
 
 # --- Module imports (all Wave 1-2) ---
-from scripts._debug import debug
-from scripts.state import read_json, write_json
+from scripts._debug import debug, maybe_cleanup_evidence, set_context
+from scripts.state import maybe_gc_runtime, read_json, read_json_view, write_json
+from scripts.boulder import active_plans, resolve_boulder_path, save_boulder
 from scripts.detect import detect_ulw, detect_persona_switch
+from scripts.plan import load_index as load_plan_index, next_task, plan_excerpt
+from scripts.ralph import load_ralph, save_ralph
+from scripts import recorder
 from scripts.sanitize import parse_hook_input
-from scripts.telemetry import emit_event, emit_score
+from scripts.telemetry import emit_event, emit_score, flush as flush_telemetry, record_latency, session_trace_id, span
 from scripts.build_sections import compose_sections, discover_agents, discover_skills
 
 # --- Constants ---
@@ -47,6 +57,9 @@ STOP_COOLDOWN_SECONDS = 3
 # Resolve plugin root (parent of scripts/)
 PLUGIN_ROOT = _PLUGIN_ROOT
 
+# Handler outcome of the current invocation, for the latency histogram
+_outcome = "ok"
+
 
 # --- Utility helpers ---
 
@@ -57,8 +70,11 @@ def _json_escape(s: str) -> str:
 
 def _emit_block_json(reason: str):
     """Emit a block decision as JSON to stdout."""
+    global _outcome
+    _outcome = "block"
     escaped = _json_escape(reason)
-    sys.stdout.write(f'{{"decision":"block","reason":{escaped}}}\n')
+    with span("output", kind="block"):
+        sys.stdout.write(f'{{"decision":"block","reason":{escaped}}}\n')
 
 
 def _now_ms() -> int:
@@ -84,17 +100,15 @@ def _session_key(hook_input) -> str:
 
 
 def _get_trace_id(hook_input) -> str:
-    """Get trace ID for telemetry."""
-    if hook_input.session_id:
-        return hook_input.session_id
-    return str(int(time.time() * 1000000))
+    """Get trace ID for telemetry (stable for the default session too)."""
+    return session_trace_id(hook_input.session_id, SESSION_KEY_DEFAULT)
 
 
 # --- Runtime state helpers ---
 
 def _runtime_get(key_path: str) -> str:
     """Get a value from runtime state using a simple dot-path."""
-    runtime = read_json(RUNTIME_FILE)
+    runtime = read_json_view(RUNTIME_FILE)
     parts = key_path.strip(".").split(".")
     current = runtime
     for part in parts:
@@ -110,7 +124,7 @@ def _runtime_get(key_path: str) -> str:
 def _active_persona(hook_input) -> str:
     """Get current active persona from runtime state."""
     sk = _session_key(hook_input)
-    runtime = read_json(RUNTIME_FILE)
+    runtime = read_json_view(RUNTIME_FILE)
 
     version = runtime.get("version", 1)
     if version != 1:
@@ -137,14 +151,15 @@ def _runtime_set_ulw_enabled(hook_input):
     runtime["sessions"][sk]["ulw"]["enabled"] = True
     runtime["sessions"][sk]["ulw"]["updatedAt"] = _now_iso()
     runtime["sessions"][sk]["ulw"].setdefault("stopBlocks", 0)
+    runtime["sessions"][sk]["updatedAt"] = _now_iso()
 
-    write_json(RUNTIME_FILE, runtime)
+    write_json(RUNTIME_FILE, runtime, session=sk)
 
 
 def _stop_continuation_disabled(hook_input) -> bool:
     """Check if stop continuation is disabled."""
     sk = _session_key(hook_input)
-    runtime = read_json(RUNTIME_FILE)
+    runtime = read_json_view(RUNTIME_FILE)
 
     version = runtime.get("version", 1)
     if version != 1:
@@ -156,9 +171,15 @@ def _stop_continuation_disabled(hook_input) -> bool:
     return stop_cont.get("disabled", False) is True
 
 
-def _boulder_active() -> bool:
+def _boulder_path(hook_input) -> str:
+    """Resolve the caller's boulder file (registry binding or legacy file)."""
+    return resolve_boulder_path(BOULDER_FILE, _session_key(hook_input))
+
+
+def _boulder_active(hook_input) -> bool:
     """Check if an active boulder (plan) is running."""
-    boulder = read_json(BOULDER_FILE)
+    boulder_path = _boulder_path(hook_input)
+    boulder = read_json_view(boulder_path)
 
     version = boulder.get("version", 1)
     if version != 1:
@@ -176,9 +197,10 @@ def _boulder_active() -> bool:
             updated = datetime.fromisoformat(updated_at.replace("Z", "+00:00"))
             age_hours = (datetime.now(timezone.utc) - updated).total_seconds() / 3600
             if age_hours > 4:
+                boulder = dict(boulder)
                 boulder["active"] = False
                 boulder["status"] = "stale_auto_cleared"
-                write_json(BOULDER_FILE, boulder)
+                save_boulder(BOULDER_FILE, boulder_path, boulder)
                 return False
         except Exception:
             pass
@@ -186,98 +208,27 @@ def _boulder_active() -> bool:
     return True
 
 
-def _ralph_active(hook_input) -> bool:
-    """Check if ralph-loop is active."""
-    if not os.path.isfile(RALPH_FILE):
-        return False
-
-    try:
-        with open(RALPH_FILE, "r", encoding="utf-8") as f:
-            content = f.read()
-    except OSError:
-        return False
+def _ralph_evaluate(hook_input):
+    """Load ralph-loop state once and apply Stop-time transitions in memory.
 
-    # Check status: active
-    if not re.search(r"^status:\s*active", content, re.MULTILINE | re.IGNORECASE):
-        return False
+    An active loop is marked done when its done_marker appears in the
+    assistant text or prompt, or when iterations reach max_iterations.
+    Returns the RalphState, or None if there is no loop file.
+    """
+    ralph = load_ralph(RALPH_FILE)
+    if ralph is None or not ralph.active:
+        return ralph
 
-    # Check for RALPH_DONE in assistant text or prompt
     combined = (hook_input.assistant_text or "") + " " + (hook_input.prompt or "")
-    if "RALPH_DONE" in combined:
-        # Mark as done
-        try:
-            new_content = re.sub(
-                r"^status:\s*active",
-                "status: done",
-                content,
-                flags=re.MULTILINE | re.IGNORECASE,
-            )
-            with open(RALPH_FILE, "w", encoding="utf-8") as f:
-                f.write(new_content)
-        except OSError:
-            pass
-        return False
-
-    # Check iteration limits
-    iter_match = re.search(r"^iterations:\s*(\d+)", content, re.MULTILINE)
-    max_match = re.search(r"^max_iterations:\s*(\d+)", content, re.MULTILINE)
-
-    if iter_match and max_match:
-        iterations = int(iter_match.group(1))
-        max_iterations = int(max_match.group(1))
-        if iterations >= max_iterations:
-            # Mark as done
-            try:
-                new_content = re.sub(
-                    r"^status:\s*active",
-                    "status: done",
-                    content,
-                    flags=re.MULTILINE | re.IGNORECASE,
-                )
-                with open(RALPH_FILE, "w", encoding="utf-8") as f:
-                    f.write(new_content)
-            except OSError:
-                pass
-            return False
-
-    return True
-
-
-def _increment_ralph_iteration():
-    """Increment the iteration counter in ralph-loop file."""
-    if not os.path.isfile(RALPH_FILE):
-        return
-
-    try:
-        with open(RALPH_FILE, "r", encoding="utf-8") as f:
-            content = f.read()
-    except OSError:
-        return
-
-    iter_match = re.search(r"^iterations:\s*(\d+)", content, re.MULTILINE)
-    if iter_match:
-        iterations = int(iter_match.group(1))
-        next_val = iterations + 1
-        new_content = re.sub(
-            r"^iterations:\s*\d+",
-            f"iterations: {next_val}",
-            content,
-            flags=re.MULTILINE,
-        )
-    else:
-        new_content = content + f"\niterations: 1\n"
-
-    try:
-        with open(RALPH_FILE, "w", encoding="utf-8") as f:
-            f.write(new_content)
-    except OSError:
-        pass
+    if ralph.done_marker in combined or ralph.exhausted:
+        ralph.mark_done()
+    return ralph
 
 
 def _ulw_enabled(hook_input) -> bool:
     """Check if ultrawork mode is enabled."""
     sk = _session_key(hook_input)
-    runtime = read_json(RUNTIME_FILE)
+    runtime = read_json_view(RUNTIME_FILE)
 
     version = runtime.get("version", 1)
     if version != 1:
@@ -289,9 +240,9 @@ def _ulw_enabled(hook_input) -> bool:
     return ulw.get("enabled", False) is True
 
 
-def _resume_block() -> str:
+def _resume_block(hook_input) -> str:
     """Generate resume context for active boulder."""
-    boulder = read_json(BOULDER_FILE)
+    boulder = read_json_view(_boulder_path(hook_input))
     plan_path = boulder.get("planPath", "")
     if not plan_path:
         return ""
@@ -307,22 +258,75 @@ def _resume_block() -> str:
     lines.append(f"- Active plan: {plan_path}")
     if task_num or task_label:
         lines.append(f"- Current task: {task_num} {task_label}")
+
+    index = load_plan_index(plan_path)
+    if index and index.get("total"):
+        lines.append(f"- Progress: {index['done']}/{index['total']} tasks done")
+        upcoming = next_task(index)
+        if upcoming:
+            lines.append(f"- Next unchecked task: {upcoming['number']}. {upcoming['label']}")
+    excerpt = plan_excerpt(plan_path, index, int(task_num) if task_num.isdigit() else None)
+    if excerpt:
+        lines.append("- Plan excerpt:")
+        lines.extend(f"    {line}" if line else "" for line in excerpt)
     lines.append("- Continue with /claude-agent-kit:start-work")
     lines.append("- Escape hatch: /claude-agent-kit:stop-continuation")
     return "\n".join(lines)
 
 
+def _unbound_plans_block(hook_input) -> str:
+    """Point an unbound session at the registered plans it can resume."""
+    plans = [entry.get("planPath", "") for entry in active_plans(BOULDER_FILE).values()]
+    plans = sorted(p for p in plans if isinstance(p, str) and p)
+    if not plans:
+        return ""
+    lines = ["Registered plans (not bound to this session):"]
+    lines.extend(f"- {plan_path}" for plan_path in plans)
+    lines.append(f"- Resume one with /claude-agent-kit:start-work (binds it with "
+                 f"`boulder.py bind <planPath> --session {_session_key(hook_input)}`)")
+    return "\n".join(lines)
+
+
+def _gc_runtime_sessions(hook_input):
+    """Opportunistically prune expired runtime sessions (rate-limited)."""
+    try:
+        report = maybe_gc_runtime(RUNTIME_FILE, keep=(_session_key(hook_input),))
+    except Exception:
+        return
+    if report and report.get("sessionsRemoved"):
+        debug(
+            "runtime_gc", phase="gc",
+            removed=report["sessionsRemoved"], reclaimed=report["bytesReclaimed"],
+        )
+
+
+def _cleanup_evidence():
+    """Opportunistically enforce the evidence budget (rate-limited)."""
+    try:
+        report = maybe_cleanup_evidence()
+    except Exception:
+        return
+    if report and report.get("removed"):
+        debug(
+            "evidence_cleanup", phase="cleanup",
+            removed=len(report["removed"]), reclaimed=report["bytesBefore"] - report["bytesAfter"],
+        )
+
+
 def _build_dynamic_sections(persona: str) -> str:
     """Build dynamic prompt sections for the given persona."""
     agents_dir = os.path.join(PLUGIN_ROOT, "agents")
     skills_dir = os.path.join(PLUGIN_ROOT, "skills")
 
-    try:
-        agents = discover_agents(agents_dir)
-        skills = discover_skills(skills_dir)
-        return compose_sections(persona, agents, skills)
-    except Exception:
-        return ""
+    with span("sections.build", persona=persona) as phase:
+        try:
+            agents = discover_agents(agents_dir)
+            skills = discover_skills(skills_dir)
+            sections = compose_sections(persona, agents, skills)
+        except Exception:
+            sections = ""
+        phase.set(bytes=len(sections))
+    return sections
 
 
 # --- Handler functions ---
@@ -330,30 +334,42 @@ def _build_dynamic_sections(persona: str) -> str:
 def handle_session_start(hook_input):
     """Handle SessionStart event."""
     start_ms = _now_ms()
-    debug("handler=SessionStart")
+    debug("handler", phase="SessionStart")
+
+    with span("state.maintenance"):
+        _gc_runtime_sessions(hook_input)
+        _cleanup_evidence()
 
-    persona = _active_persona(hook_input)
+    with span("state.snapshot"):
+        persona = _active_persona(hook_input)
+        boulder_active = _boulder_active(hook_input)
 
     # Build and output dynamic sections
     sections = _build_dynamic_sections(persona)
-    if sections:
-        sys.stdout.write(sections)
+    debug("sections_built", phase="SessionStart", persona=persona, bytes=len(sections))
 
     # Boulder resume context
-    has_resume = False
-    if _boulder_active():
-        sys.stdout.write("\n")
-        resume = _resume_block()
+    resume = ""
+    with span("resume.build"):
+        resume = _resume_block(hook_input) if boulder_active else _unbound_plans_block(hook_input)
+
+    with span("output", kind="context"):
+        if sections:
+            sys.stdout.write(sections)
+
+        # Session key lets skills bind plans to this session (boulder registry)
+        if hook_input.session_id:
+            sys.stdout.write(f"\nAgent-kit session key: {hook_input.session_id}\n")
+
         if resume:
-            sys.stdout.write(resume + "\n")
-        has_resume = True
+            sys.stdout.write("\n" + resume + "\n")
 
     end_ms = _now_ms()
     trace_id = _get_trace_id(hook_input)
     emit_event(trace_id, "hook.session_start", {
         "persona": persona,
-        "boulder_active": has_resume,
-        "has_resume": has_resume,
+        "boulder_active": boulder_active,
+        "has_resume": bool(resume),
     })
     emit_score(trace_id, "hook.latency_ms", end_ms - start_ms)
 
@@ -361,27 +377,30 @@ def handle_session_start(hook_input):
 def handle_user_prompt_submit(hook_input):
     """Handle UserPromptSubmit event."""
     start_ms = _now_ms()
-    debug("handler=UserPromptSubmit")
+    debug("handler", phase="UserPromptSubmit")
 
-    persona = _active_persona(hook_input)
+    with span("state.snapshot"):
+        persona = _active_persona(hook_input)
 
     # Detect persona skill invocation — override target persona for dynamic sections
     text = hook_input.prompt or ""
-    target_persona = detect_persona_switch(text)
+    with span("detect"):
+        target_persona = detect_persona_switch(text)
+        ulw_triggered = detect_ulw(text)
     if target_persona:
         persona = target_persona
-        debug(f"persona_switch_detected target={persona}")
+        debug("persona_switch_detected", phase="UserPromptSubmit", target=persona)
 
     # Build and output dynamic sections
     sections = _build_dynamic_sections(persona)
     if sections:
-        sys.stdout.write(sections)
+        with span("output", kind="context"):
+            sys.stdout.write(sections)
 
     # ULW detection
-    ulw_triggered = False
-    if detect_ulw(text):
-        _runtime_set_ulw_enabled(hook_input)
-        ulw_triggered = True
+    if ulw_triggered:
+        with span("state.commit"):
+            _runtime_set_ulw_enabled(hook_input)
         sys.stdout.write("\n")
         sys.stdout.write(
             "Ultrawork mode is active.\n"
@@ -405,7 +424,7 @@ def handle_user_prompt_submit(hook_input):
 def handle_pre_tool_use(hook_input):
     """Handle PreToolUse event."""
     start_ms = _now_ms()
-    debug("handler=PreToolUse")
+    debug("handler", phase="PreToolUse")
 
     tool_name = hook_input.tool_name or ""
     cmd = hook_input.tool_command or hook_input.tool_args or hook_input.prompt or ""
@@ -415,30 +434,32 @@ def handle_pre_tool_use(hook_input):
 
     # Check for destructive bash commands
     if tool_name.lower() == "bash":
-        if re.search(
-            r"(^|[\s;|&])(rm\s+-rf|mkfs(\s|$)|dd\s+if=)",
-            cmd,
-            re.IGNORECASE,
-        ):
-            decision = "block"
-            block_reason = "destructive_bash"
-            _emit_block_json("Blocked destructive Bash pattern by safety guardrails")
+        with span("guard.destructive_bash"):
+            if re.search(
+                r"(^|[\s;|&])(rm\s+-rf|mkfs(\s|$)|dd\s+if=)",
+                cmd,
+                re.IGNORECASE,
+            ):
+                decision = "block"
+                block_reason = "destructive_bash"
+                _emit_block_json("Blocked destructive Bash pattern by safety guardrails")
 
     # Prometheus write guard
     if decision == "allow":
-        persona = _active_persona(hook_input)
-        if persona == "prometheus":
-            if tool_name in ("Write", "Edit", "MultiEdit"):
-                if re.search(
-                    r"[^\s]+\.(ts|tsx|js|jsx|json|yaml|yml|sh|py|go|rs|java|rb|php|c|cpp)",
-                    cmd,
-                    re.IGNORECASE,
-                ):
-                    decision = "block"
-                    block_reason = "prometheus_write_guard"
-                    _emit_block_json(
-                        "Prometheus persona is planning-only: write markdown artifacts under .agent-kit/"
-                    )
+        with span("guard.prometheus_write"):
+            persona = _active_persona(hook_input)
+            if persona == "prometheus":
+                if tool_name in ("Write", "Edit", "MultiEdit"):
+                    if re.search(
+                        r"[^\s]+\.(ts|tsx|js|jsx|json|yaml|yml|sh|py|go|rs|java|rb|php|c|cpp)",
+                        cmd,
+                        re.IGNORECASE,
+                    ):
+                        decision = "block"
+                        block_reason = "prometheus_write_guard"
+                        _emit_block_json(
+                            "Prometheus persona is planning-only: write markdown artifacts under .agent-kit/"
+                        )
 
     end_ms = _now_ms()
     trace_id = _get_trace_id(hook_input)
@@ -453,7 +474,7 @@ def handle_pre_tool_use(hook_input):
 def handle_stop(hook_input):
     """Handle Stop event."""
     start_ms = _now_ms()
-    debug("handler=Stop")
+    debug("handler", phase="Stop")
 
     decision = "allow"
     ulw_is_active = False
@@ -463,7 +484,9 @@ def handle_stop(hook_input):
     stop_blocks = 0
 
     # Check if continuation is disabled
-    if _stop_continuation_disabled(hook_input):
+    with span("state.snapshot", stage="continuation"):
+        continuation_disabled = _stop_continuation_disabled(hook_input)
+    if continuation_disabled:
         end_ms = _now_ms()
         trace_id = _get_trace_id(hook_input)
         emit_event(trace_id, "hook.stop", {
@@ -478,27 +501,29 @@ def handle_stop(hook_input):
         emit_score(trace_id, "hook.latency_ms", end_ms - start_ms)
         return
 
-    # Check active states
-    if _ralph_active(hook_input):
-        ralph_is_active = True
-        # Read current iteration count
-        try:
-            with open(RALPH_FILE, "r", encoding="utf-8") as f:
-                content = f.read()
-            iter_match = re.search(r"^iterations:\s*(\d+)", content, re.MULTILINE)
-            if iter_match:
-                ralph_iteration = int(iter_match.group(1))
-        except OSError:
-            pass
+    # Check active states (ralph file is parsed once; at most one write per Stop)
+    with span("state.snapshot", stage="active"):
+        ralph = _ralph_evaluate(hook_input)
+        if ralph is not None:
+            if ralph.active:
+                ralph_is_active = True
+                ralph_iteration = ralph.iterations
+            elif ralph.dirty:
+                with span("state.commit", target="ralph"):
+                    save_ralph(ralph)
 
-    if _boulder_active():
-        boulder_is_active = True
+        if _boulder_active(hook_input):
+            boulder_is_active = True
 
-    if _ulw_enabled(hook_input):
-        ulw_is_active = True
+        if _ulw_enabled(hook_input):
+            ulw_is_active = True
 
     # If nothing is active, allow stop
     needs_block = boulder_is_active or ralph_is_active or ulw_is_active
+    debug(
+        "state_checked", phase="Stop",
+        boulder=boulder_is_active, ralph=ralph_is_active, ulw=ulw_is_active,
+    )
     if not needs_block:
         end_ms = _now_ms()
         trace_id = _get_trace_id(hook_input)
@@ -515,7 +540,8 @@ def handle_stop(hook_input):
 
     # Read current stop state
     sk = _session_key(hook_input)
-    runtime = read_json(RUNTIME_FILE)
+    with span("state.snapshot", stage="counters"):
+        runtime = read_json(RUNTIME_FILE)
     sessions = runtime.get("sessions", {})
     session = sessions.get(sk, {})
     ulw_state = session.get("ulw", {})
@@ -552,7 +578,9 @@ def handle_stop(hook_input):
         runtime["sessions"][sk]["stopContinuation"]["disabled"] = True
         runtime["sessions"][sk]["stopContinuation"]["disabledReason"] = "auto-disabled after max stop blocks"
         runtime["sessions"][sk]["stopContinuation"]["disabledAt"] = _now_iso()
-        write_json(RUNTIME_FILE, runtime)
+        runtime["sessions"][sk]["updatedAt"] = _now_iso()
+        with span("state.commit", target="runtime"):
+            write_json(RUNTIME_FILE, runtime, session=sk)
 
         end_ms = _now_ms()
         trace_id = _get_trace_id(hook_input)
@@ -579,11 +607,15 @@ def handle_stop(hook_input):
     runtime["sessions"][sk]["ulw"]["stopBlocks"] = blocks + 1
     runtime["sessions"][sk]["ulw"]["lastStopEpoch"] = now_epoch
     runtime["sessions"][sk]["ulw"]["lastStopAt"] = _now_iso()
-    write_json(RUNTIME_FILE, runtime)
+    runtime["sessions"][sk]["updatedAt"] = _now_iso()
+    with span("state.commit", target="runtime"):
+        write_json(RUNTIME_FILE, runtime, session=sk)
 
     # Increment ralph iteration if active
     if ralph_is_active:
-        _increment_ralph_iteration()
+        ralph.increment()
+        with span("state.commit", target="ralph"):
+            save_ralph(ralph)
 
     _emit_block_json("Continuation active: finish work or use /claude-agent-kit:stop-continuation")
 
@@ -603,6 +635,10 @@ def handle_stop(hook_input):
 # --- Main entry point ---
 
 def main():
+    global _outcome
+    start_ns = time.perf_counter_ns()
+    _outcome = "ok"
+
     # Read stdin (may be empty)
     stdin_json = ""
     if not sys.stdin.isatty():
@@ -618,19 +654,34 @@ def main():
     if not event_type:
         event_type = hook_input.event or "unknown"
 
-    debug(f"event={event_type}")
+    set_context(event=event_type, session=_session_key(hook_input))
+    debug("dispatch", phase="router")
 
     # Dispatch
-    if event_type == "SessionStart":
-        handle_session_start(hook_input)
-    elif event_type == "UserPromptSubmit":
-        handle_user_prompt_submit(hook_input)
-    elif event_type == "PreToolUse":
-        handle_pre_tool_use(hook_input)
-    elif event_type == "Stop":
-        handle_stop(hook_input)
-    else:
-        debug(f"unknown event: {event_type}")
+    try:
+        if event_type == "SessionStart":
+            handle_session_start(hook_input)
+        elif event_type == "UserPromptSubmit":
+            handle_user_prompt_submit(hook_input)
+        elif event_type == "PreToolUse":
+            handle_pre_tool_use(hook_input)
+        elif event_type == "Stop":
+            handle_stop(hook_input)
+        else:
+            debug("unknown_event", phase="router")
+    except BaseException:
+        _outcome = "error"
+        raise
+    finally:
+        # All events/scores of this invocation go to the spool in one write
+        flush_telemetry()
+        duration_us = (time.perf_counter_ns() - start_ns) // 1000
+        record_latency(event_type, _outcome, duration_us)
+        # Opt-in replay buffer; also captures inputs whose handler failed
+        if recorder.is_enabled():
+            recorder.record(
+                event_type, sys.argv[1:], stdin_json, hook_input.session_id, duration_us,
+            )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,289 @@
+"""Append-only journal of state mutations with snapshot compaction.
+
+Opt-in debugging aid: when AGENT_KIT_STATE_JOURNAL=1, every successful
+scripts.state.write_json appends one compact JSONL record to the current
+journal segment:
+
+  {"ts": <epoch seconds, ms precision>, "session": "<key>", "path": "<file>",
+   "patch": <RFC 7386 JSON merge patch from the previous content>}
+
+A merge patch uses null to delete a key, so it cannot set a value to null.
+When the patch would not reproduce the new content (it stores a null), the
+record carries the full content instead: {..., "data": <content>}.
+
+LAYOUT (under JOURNAL_DIR):
+  journal.jsonl              current segment (O_APPEND, lock-free writers)
+  snapshot-<ms>.json         {"ts": ..., "files": {path: content}} after all
+                             records up to <ms>
+  segment-<ms>.jsonl         archived records that produced snapshot-<ms>
+
+CONTRACT:
+  - record() never raises and never blocks on a lock.
+  - When the current segment exceeds SEGMENT_MAX_BYTES, it is compacted into a
+    new snapshot; only the newest KEEP_SNAPSHOTS snapshots are retained.
+  - replay(until) rebuilds every journaled file as of `until` from the newest
+    snapshot at or before it plus the following segment, so reads stay
+    O(snapshot + one segment).
+  - A record appended concurrently with compaction lands in the archived
+    segment; it is still replayable but may be missing from that snapshot.
+
+Import-only module — replay is exposed as `python3 state.py replay`.
+"""
+
+import glob
+import json
+import os
+import tempfile
+import time
+
+JOURNAL_DIR = ".agent-kit/state/journal"
+CURRENT_SEGMENT = "journal.jsonl"
+SEGMENT_MAX_BYTES = 256 * 1024
+KEEP_SNAPSHOTS = 8
+
+
+def is_enabled() -> bool:
+    """Journaling is opt-in via AGENT_KIT_STATE_JOURNAL=1."""
+    return os.environ.get("AGENT_KIT_STATE_JOURNAL") == "1"
+
+
+# --- JSON merge patch (RFC 7386) ---
+
+def merge_patch(before, after):
+    """Compute a merge patch that turns `before` into `after`."""
+    if not isinstance(before, dict) or not isinstance(after, dict):
+        return after
+    patch = {}
+    for key in before:
+        if key not in after:
+            patch[key] = None
+    for key, value in after.items():
+        if key not in before:
+            patch[key] = value
+        elif before[key] != value:
+            if isinstance(before[key], dict) and isinstance(value, dict):
+                patch[key] = merge_patch(before[key], value)
+            else:
+                patch[key] = value
+    return patch
+
+
+def apply_merge_patch(target, patch):
+    """Apply a merge patch, returning the patched value (target is not mutated)."""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+# --- Writing ---
+
+def _snapshot_ts(filepath: str) -> int:
+    """Extract the <ms> suffix from snapshot-<ms>.json / segment-<ms>.jsonl."""
+    name = os.path.basename(filepath)
+    stem = name.split("-", 1)[1].split(".", 1)[0]
+    return int(stem)
+
+
+def _snapshots(journal_dir: str) -> list:
+    """Snapshot paths sorted oldest first."""
+    return sorted(glob.glob(os.path.join(journal_dir, "snapshot-*.json")), key=_snapshot_ts)
+
+
+def _segments(journal_dir: str) -> list:
+    """Archived segment paths sorted oldest first."""
+    return sorted(glob.glob(os.path.join(journal_dir, "segment-*.jsonl")), key=_snapshot_ts)
+
+
+def record(path: str, before, after, session: str = "", journal_dir: str | None = None) -> bool:
+    """Append one mutation record. Returns False (silently) on any failure."""
+    journal_dir = journal_dir or JOURNAL_DIR
+    before = before if before is not None else {}
+    patch = merge_patch(before, after)
+    if patch == {}:
+        return True
+
+    entry = {"ts": int(time.time() * 1000) / 1000, "session": session, "path": path}
+    if apply_merge_patch(before, patch) == after:
+        entry["patch"] = patch
+    else:
+        entry["data"] = after  # explicit nulls: a patch would delete them
+    line = json.dumps(entry, separators=(",", ":")) + "\n"
+
+    try:
+        os.makedirs(journal_dir, exist_ok=True)
+        fd = os.open(
+            os.path.join(journal_dir, CURRENT_SEGMENT),
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+            0o644,
+        )
+        try:
+            os.write(fd, line.encode("utf-8"))
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+    except OSError:
+        return False
+
+    if size > SEGMENT_MAX_BYTES:
+        compact(journal_dir)
+    return True
+
+
+def _read_records(segment_path: str) -> list:
+    """Parse a segment, skipping torn or corrupt lines."""
+    records = []
+    try:
+        with open(segment_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except (json.JSONDecodeError, ValueError):
+                    continue
+                if isinstance(rec, dict) and "path" in rec and "ts" in rec:
+                    records.append(rec)
+    except OSError:
+        pass
+    return records
+
+
+def _load_snapshot(snapshot_path: str) -> dict:
+    try:
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        files = data.get("files", {})
+        return files if isinstance(files, dict) else {}
+    except (OSError, json.JSONDecodeError, ValueError, AttributeError):
+        return {}
+
+
+def _apply_records(files: dict, records: list, until: float | None = None) -> dict:
+    for rec in records:
+        if until is not None and rec["ts"] > until:
+            continue
+        if "data" in rec:
+            files[rec["path"]] = rec["data"]
+        else:
+            files[rec["path"]] = apply_merge_patch(files.get(rec["path"]), rec.get("patch"))
+    return files
+
+
+def compact(journal_dir: str | None = None) -> str | None:
+    """Fold the current segment into a new snapshot. Returns the snapshot path."""
+    journal_dir = journal_dir or JOURNAL_DIR
+    current = os.path.join(journal_dir, CURRENT_SEGMENT)
+
+    # Single compactor: losers simply skip, the winner covers their records.
+    lock_dir = os.path.join(journal_dir, ".compact.lock")
+    try:
+        os.mkdir(lock_dir)
+    except OSError:
+        return None
+
+    try:
+        snapshots = _snapshots(journal_dir)
+        files = _load_snapshot(snapshots[-1]) if snapshots else {}
+
+        staging = os.path.join(journal_dir, f".compacting.{os.getpid()}.jsonl")
+        try:
+            os.rename(current, staging)
+        except OSError:
+            return None
+
+        records = _read_records(staging)
+        last_ts = max((rec["ts"] for rec in records), default=time.time())
+        ts_ms = int(last_ts * 1000)
+        if snapshots:
+            ts_ms = max(ts_ms, _snapshot_ts(snapshots[-1]) + 1)
+
+        files = _apply_records(files, records)
+        snapshot_path = os.path.join(journal_dir, f"snapshot-{ts_ms}.json")
+        fd, temp_path = tempfile.mkstemp(prefix=".snapshot.", dir=journal_dir)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"ts": ts_ms / 1000, "files": files}, f, separators=(",", ":"))
+            os.replace(temp_path, snapshot_path)
+            os.replace(staging, os.path.join(journal_dir, f"segment-{ts_ms}.jsonl"))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            _restore(staging, current)
+            return None
+
+        try:
+            _prune(journal_dir)
+        except OSError:
+            pass
+        return snapshot_path
+    finally:
+        try:
+            os.rmdir(lock_dir)
+        except OSError:
+            pass
+
+
+def _restore(staging: str, current: str) -> None:
+    """Put the records of a failed compaction back into the current segment."""
+    try:
+        with open(staging, "rb") as f:
+            data = f.read()
+        fd = os.open(current, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        os.unlink(staging)
+    except OSError:
+        pass
+
+
+def _prune(journal_dir: str) -> None:
+    """Keep the newest KEEP_SNAPSHOTS snapshots and the segments they need."""
+    snapshots = _snapshots(journal_dir)
+    if len(snapshots) <= KEEP_SNAPSHOTS:
+        return
+    for old in snapshots[:-KEEP_SNAPSHOTS]:
+        os.unlink(old)
+    oldest_kept = _snapshot_ts(snapshots[-KEEP_SNAPSHOTS])
+    for segment in _segments(journal_dir):
+        if _snapshot_ts(segment) <= oldest_kept:
+            os.unlink(segment)
+
+
+# --- Replay ---
+
+def replay(until: float | None = None, journal_dir: str | None = None) -> dict | None:
+    """Reconstruct {path: content} as of `until` (epoch seconds; None = now).
+
+    Returns None when `until` predates the retained history.
+    """
+    journal_dir = journal_dir or JOURNAL_DIR
+    snapshots = _snapshots(journal_dir)
+    segments = _segments(journal_dir)
+    current = os.path.join(journal_dir, CURRENT_SEGMENT)
+
+    base_ms = None
+    for snap in snapshots:
+        if until is None or _snapshot_ts(snap) / 1000 <= until:
+            base_ms = _snapshot_ts(snap)
+
+    if base_ms is None:
+        if not snapshots:
+            return _apply_records({}, _read_records(current), until)
+        # Before the first snapshot: only the never-pruned genesis segment
+        # (archived under the first snapshot's timestamp) starts from {}
+        first_ms = _snapshot_ts(snapshots[0])
+        genesis = [seg for seg in segments if _snapshot_ts(seg) == first_ms]
+        if not genesis:
+            return None
+        return _apply_records({}, _read_records(genesis[0]), until)
+
+    files = _load_snapshot(os.path.join(journal_dir, f"snapshot-{base_ms}.json"))
+    following = [s for s in segments if _snapshot_ts(s) > base_ms]
+    source = following[0] if following else current
+    return _apply_records(files, _read_records(source), until)
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""Checklist index for boulder plans.
+
+CONTRACT:
+  load_index(plan_path) -> dict | None:
+    - Parses `- [ ] N. label` / `- [x] N. label` items of a plan once into:
+        {"version", "planPath", "mtimeNs", "size",
+         "tasks": [{"number", "label", "offset", "line", "done"}],
+         "verification": {"offset", "line", "level"} | None,
+         "done", "total"}
+      `offset` is the byte offset of the task line, `line` is 1-based.
+      `verification` locates the first `## Verification` heading (any level).
+    - Cached as .agent-kit/state/plan-index/<plan slug>.json (the slug the
+      boulder registry uses, so never next to the plan itself) and reused
+      while the plan's (mtime_ns, size) are unchanged; otherwise rebuilt.
+      plan_excerpt and tick_task read their offsets from the same cache.
+    - Returns None if the plan is missing (fail-open).
+
+  next_task(index) -> dict | None:
+    - First unchecked task, or None when all are done.
+
+  plan_excerpt(plan_path, index, number, context, budget) -> list[str]:
+    - Task `number` with `context` checklist tasks on each side (and the lines
+      between them), then the Verification section.
+    - Streamed from the indexed byte offsets; never reads the whole plan and
+      never returns more than `budget` bytes of plan text.
+
+  tick_task(plan_path, number, boulder_file) -> dict:
+    - Flips task N's `[ ]` to `[x]` at its indexed byte offset and updates the
+      plan's boulder (currentTask, updatedAt, and status=done/active=false
+      when nothing is left) plus its registry index entry in one
+      all-or-nothing state.write_files_locked commit. Locks are taken first,
+      each with PLAN_LOCK_WAIT_SECONDS, always in the order plan, boulder,
+      registry index; if one is busy nothing is written. The plan keeps its
+      permission bits.
+    - A stale index (plan edited since indexing) is rebuilt once before giving up.
+
+CLI:
+  python3 plan.py index <plan_path>   # prints the index as JSON
+  python3 plan.py next <plan_path>    # prints "N. label" or nothing, exit 0/1
+  python3 plan.py tick <N> [--plan <plan_path>] [--session KEY]
+    # plan defaults to the session's boulder planPath (KEY defaults to
+    # "global", like boulder.py); prints one summary line
+"""
+
+import json
+import os
+import re
+import sys
+from datetime import datetime, timezone
+
+# Ensure plugin root is on sys.path so `from scripts.*` imports resolve
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+_PLUGIN_ROOT = os.path.dirname(_SCRIPT_DIR)
+if _PLUGIN_ROOT not in sys.path:
+    sys.path.insert(0, _PLUGIN_ROOT)
+
+from scripts.boulder import (
+    BOULDER_FILE, SESSION_KEY_DEFAULT, apply_index_entry, boulder_slug, index_path, is_registry_boulder, plan_slug,
+    registry_dir, resolve_boulder_path,
+)
+from scripts.state import (
+    DURABILITY_FILE_DIR, acquire_lock, read_json, read_json_view, release_lock, write_files_locked,
+    write_json,
+)
+
+INDEX_VERSION = 2
+PLAN_INDEX_DIR = ".agent-kit/state/plan-index"
+PLAN_LOCK_WAIT_SECONDS = 1.0
+EXCERPT_CONTEXT_TASKS = 2
+EXCERPT_BUDGET_BYTES = 2048
+EXCERPT_TRUNCATED = "[... truncated]"
+
+# Checklist task: "- [ ] 3. Label" (any indent, * or - bullet, x/X when done)
+_TASK_PATTERN = re.compile(rb"^([ \t]*[-*] \[)([ xX])\] (\d+)\.[ \t]*(.*?)[ \t]*\r?$")
+_HEADING_PATTERN = re.compile(rb"^(#{1,6})[ \t]+(.*?)[ \t#]*\r?$")
+
+
+def index_cache_path(plan_path: str) -> str:
+    """Location of the cached index for a plan (keyed by its registry slug)."""
+    return os.path.join(PLAN_INDEX_DIR, f"{plan_slug(plan_path)}.json")
+
+
+def build_index(plan_path: str, st: os.stat_result | None = None) -> dict | None:
+    """Parse the plan checklist into an index (no caching)."""
+    try:
+        if st is None:
+            st = os.stat(plan_path)
+        with open(plan_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    return _index_bytes(plan_path, data, st)
+
+
+def _index_bytes(plan_path: str, data: bytes, st: os.stat_result) -> dict:
+    tasks = []
+    verification = None
+    offset = 0
+    for line_no, raw in enumerate(data.split(b"\n"), start=1):
+        if verification is None and raw.startswith(b"#"):
+            heading = _HEADING_PATTERN.match(raw)
+            if heading and heading.group(2).strip().lower() == b"verification":
+                verification = {"offset": offset, "line": line_no, "level": len(heading.group(1))}
+        match = _TASK_PATTERN.match(raw)
+        if match:
+            tasks.append({
+                "number": int(match.group(3)),
+                "label": match.group(4).decode("utf-8", errors="replace"),
+                "offset": offset,
+                "line": line_no,
+                "done": match.group(2) != b" ",
+            })
+        offset += len(raw) + 1
+
+    done = sum(1 for task in tasks if task["done"])
+    return {
+        "version": INDEX_VERSION,
+        "planPath": plan_path,
+        "mtimeNs": st.st_mtime_ns,
+        "size": st.st_size,
+        "tasks": tasks,
+        "verification": verification,
+        "done": done,
+        "total": len(tasks),
+    }
+
+
+def load_index(plan_path: str) -> dict | None:
+    """Return the plan index, rebuilding the cache if the plan changed."""
+    if not plan_path:
+        return None
+    try:
+        st = os.stat(plan_path)
+    except OSError:
+        return None
+
+    cache_path = index_cache_path(plan_path)
+    cached = read_json_view(cache_path)
+    if (
+        isinstance(cached, dict)
+        and cached.get("version") == INDEX_VERSION
+        and cached.get("mtimeNs") == st.st_mtime_ns
+        and cached.get("size") == st.st_size
+    ):
+        return cached
+
+    index = build_index(plan_path, st)
+    if index is not None:
+        write_json(cache_path, index, journaled=False)
+    return index
+
+
+def next_task(index: dict | None) -> dict | None:
+    """First unchecked task in plan order."""
+    if not index:
+        return None
+    for task in index.get("tasks", []):
+        if not task.get("done"):
+            return task
+    return None
+
+
+def _stream_lines(f, offset: int, keep, budget: int) -> tuple:
+    """Read lines from `offset` while keep(line_bytes, n) is true, within budget.
+
+    Returns (lines, bytes_used, truncated).
+    """
+    f.seek(offset)
+    lines = []
+    used = 0
+    for n, raw in enumerate(f):
+        if not keep(raw, n):
+            break
+        if used + len(raw) > budget:
+            return lines, used, True
+        used += len(raw)
+        lines.append(raw.rstrip(b"\r\n").decode("utf-8", errors="replace"))
+    return lines, used, False
+
+
+def plan_excerpt(plan_path: str, index: dict | None, number: int | None = None,
+                 context: int = EXCERPT_CONTEXT_TASKS,
+                 budget: int = EXCERPT_BUDGET_BYTES) -> list:
+    """Bounded excerpt around task `number` (default: next unchecked) plus Verification."""
+    tasks = (index or {}).get("tasks", [])
+    position = next((i for i, t in enumerate(tasks) if t["number"] == number), None)
+    if position is None:
+        upcoming = next_task(index)
+        position = tasks.index(upcoming) if upcoming in tasks else None
+    verification = (index or {}).get("verification")
+    if position is None and not verification:
+        return []
+
+    excerpt = []
+    try:
+        with open(plan_path, "rb") as f:
+            if position is not None:
+                first = tasks[max(0, position - context)]
+                last = tasks[min(len(tasks) - 1, position + context)]
+                span = last["line"] - first["line"]
+                lines, used, truncated = _stream_lines(
+                    f, first["offset"], lambda raw, n: n <= span, budget,
+                )
+                excerpt += lines
+                budget -= used
+                if truncated:
+                    return excerpt + [EXCERPT_TRUNCATED]
+
+            if verification:
+                level = verification["level"]
+
+                def in_section(raw, n):
+                    heading = _HEADING_PATTERN.match(raw) if raw.startswith(b"#") else None
+                    return n == 0 or not heading or len(heading.group(1)) > level
+
+                if excerpt:
+                    excerpt.append("")
+                lines, _, truncated = _stream_lines(f, verification["offset"], in_section, budget)
+                while lines and not lines[-1].strip():
+                    lines.pop()
+                excerpt += lines
+                if truncated:
+                    excerpt.append(EXCERPT_TRUNCATED)
+    except OSError:
+        return excerpt
+    return excerpt
+
+
+def _checkbox_offset(data: bytes, task: dict) -> int | None:
+    """Byte offset of the checkbox mark for task, if the index still matches."""
+    start = task["offset"]
+    end = data.find(b"\n", start)
+    line = data[start:] if end == -1 else data[start:end]
+    match = _TASK_PATTERN.match(line)
+    if not match or int(match.group(3)) != task["number"]:
+        return None
+    return start + len(match.group(1))
+
+
+def _find_task(index: dict | None, number: int) -> dict | None:
+    for task in (index or {}).get("tasks", []):
+        if task["number"] == number:
+            return task
+    return None
+
+
+def _plan_boulder_path(plan_path: str, boulder_file: str) -> str | None:
+    """The boulder tracking plan_path: its registry entry, else a matching legacy file."""
+    registered = os.path.join(registry_dir(boulder_file), f"{plan_slug(plan_path, boulder_file)}.json")
+    if os.path.isfile(registered):
+        return registered
+    legacy = read_json_view(boulder_file)
+    if legacy and os.path.normpath(str(legacy.get("planPath", ""))) == os.path.normpath(plan_path):
+        return boulder_file
+    return None
+
+
+def tick_task(plan_path: str, number: int, boulder_file: str = BOULDER_FILE) -> dict:
+    """Check off task `number` and advance the boulder in one all-or-nothing commit.
+
+    Returns {"ok", "task", "next", "done", "total", "boulder", "error"}.
+    """
+    result = {"ok": False, "task": None, "next": None, "done": 0, "total": 0,
+              "boulder": None, "error": ""}
+
+    plan_lock = acquire_lock(plan_path, wait_seconds=PLAN_LOCK_WAIT_SECONDS)
+    if plan_lock is None:
+        result["error"] = f"plan busy: {plan_path}"
+        return result
+    held = [plan_lock]
+    try:
+        try:
+            st = os.stat(plan_path)
+            with open(plan_path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            result["error"] = f"cannot read plan: {e}"
+            return result
+
+        index = load_index(plan_path)
+        task = _find_task(index, number)
+        mark = _checkbox_offset(data, task) if task else None
+        if mark is None:
+            # Index out of date relative to the bytes we hold: rebuild once
+            index = _index_bytes(plan_path, data, st)
+            task = _find_task(index, number)
+            mark = _checkbox_offset(data, task) if task else None
+        if mark is None:
+            result["error"] = f"task {number} not found in {plan_path}"
+            return result
+
+        files = []
+        if data[mark:mark + 1] == b" ":
+            data = data[:mark] + b"x" + data[mark + 1:]
+            files.append((plan_path, data))
+        index = _index_bytes(plan_path, data, st)
+        upcoming = next_task(index)
+
+        boulder_path = _plan_boulder_path(plan_path, boulder_file)
+        if boulder_path:
+            lock_paths = [boulder_path]
+            if is_registry_boulder(boulder_file, boulder_path):
+                lock_paths.append(index_path(boulder_file))
+            for path in lock_paths:
+                lock_dir = acquire_lock(path, wait_seconds=PLAN_LOCK_WAIT_SECONDS)
+                if lock_dir is None:
+                    result["error"] = f"boulder busy: {path}"
+                    return result
+                held.append(lock_dir)
+
+            boulder = read_json(boulder_path)
+            boulder["updatedAt"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            if upcoming:
+                boulder["currentTask"] = {"number": upcoming["number"], "label": upcoming["label"]}
+            else:
+                boulder["status"] = "done"
+                boulder["active"] = False
+            files.append((boulder_path, boulder, DURABILITY_FILE_DIR))
+            if len(lock_paths) > 1:
+                registry_index = apply_index_entry(
+                    read_json(lock_paths[1]), boulder_slug(boulder_path), boulder)
+                files.append((lock_paths[1], registry_index))
+
+        failure = write_files_locked(files)
+        if failure is not None:
+            result["error"] = f"{failure[1]}: {failure[0]}"
+            return result
+        if files and files[0][0] == plan_path:
+            index = _index_bytes(plan_path, data, os.stat(plan_path))
+        write_json(index_cache_path(plan_path), index, journaled=False)
+
+        result.update({
+            "ok": True,
+            "task": _find_task(index, number),
+            "next": upcoming,
+            "done": index["done"],
+            "total": index["total"],
+            "boulder": boulder_path,
+        })
+        return result
+    finally:
+        for lock_dir in reversed(held):
+            release_lock(lock_dir)
+
+
+def format_tick(result: dict) -> str:
+    """One-line summary of a tick_task result."""
+    if not result["ok"]:
+        return f"plan tick failed: {result['error']}"
+    task = result["task"]
+    line = f"Ticked {task['number']}. {task['label']} ({result['done']}/{result['total']} done)"
+    if result["next"]:
+        line += f"; next: {result['next']['number']}. {result['next']['label']}"
+    else:
+        line += "; plan complete"
+        if result["boulder"]:
+            line += ", boulder done"
+    return line
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: plan.py index <plan_path> | plan.py next <plan_path> | "
+              "plan.py tick <N> [--plan <plan_path>] [--session KEY]", file=sys.stderr)
+        sys.exit(1)
+
+    command = sys.argv[1]
+    plan_path = sys.argv[2]
+
+    if command == "tick":
+        args = sys.argv[3:]
+        try:
+            number = int(sys.argv[2])
+        except ValueError:
+            print("plan-tick: task number must be an integer", file=sys.stderr)
+            sys.exit(1)
+
+        plan_path = ""
+        if "--plan" in args:
+            idx = args.index("--plan")
+            plan_path = args[idx + 1] if idx + 1 < len(args) else ""
+        if not plan_path:
+            session = SESSION_KEY_DEFAULT
+            if "--session" in args:
+                idx = args.index("--session")
+                session = (args[idx + 1] if idx + 1 < len(args) else "") or SESSION_KEY_DEFAULT
+            boulder = read_json_view(resolve_boulder_path(BOULDER_FILE, session))
+            plan_path = str(boulder.get("planPath", ""))
+        if not plan_path:
+            print("plan-tick: no --plan given and no active boulder", file=sys.stderr)
+            sys.exit(1)
+
+        result = tick_task(plan_path, number)
+        print(format_tick(result))
+        sys.exit(0 if result["ok"] else 1)
+
+    elif command == "index":
+        index = load_index(plan_path)
+        if index is None:
+            print(f"plan: cannot read {plan_path}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(index, separators=(",", ":")))
+
+    elif command == "next":
+        task = next_task(load_index(plan_path))
+        if task is None:
+            sys.exit(1)
+        print(f"{task['number']}. {task['label']}")
+
+    else:
+        print(f"Unknown command: {command}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Structured state for the ralph-loop file.
+
+CONTRACT:
+  load_ralph(path) -> RalphState | None:
+    - Parses the `key: value` fields of .agent-kit/ralph-loop.local.md once.
+    - Returns None if the file is missing or unreadable (fail-open).
+
+  RalphState:
+    - Typed fields: status, iterations, max_iterations, done_marker.
+    - Transitions (mark_done, increment) only change memory.
+
+  save_ralph(state) -> bool:
+    - One atomic, locked write of the changed fields.
+    - Compare-and-swap: if the file changed since load_ralph (e.g. a
+      concurrent Stop or /cancel-ralph), the write is skipped.
+
+Import-only module — no standalone CLI.
+"""
+
+import os
+from dataclasses import dataclass
+
+from scripts.state import (
+    acquire_lock,
+    parse_md_fields,
+    release_lock,
+    set_md_fields,
+    write_text_locked,
+)
+
+DEFAULT_DONE_MARKER = "RALPH_DONE"
+
+
+def _to_int(value: str | None) -> int | None:
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _unquote(value: str) -> str:
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in ("'", '"'):
+        return value[1:-1]
+    return value
+
+
+@dataclass
+class RalphState:
+    """Parsed ralph-loop fields plus the raw text they came from."""
+    path: str = ""
+    text: str = ""
+    status: str = ""
+    iterations: int = 0
+    max_iterations: int | None = None
+    done_marker: str = DEFAULT_DONE_MARKER
+    has_iterations: bool = False
+    dirty: bool = False
+
+    @property
+    def active(self) -> bool:
+        return self.status.lower() == "active"
+
+    @property
+    def exhausted(self) -> bool:
+        return (
+            self.has_iterations
+            and self.max_iterations is not None
+            and self.iterations >= self.max_iterations
+        )
+
+    def mark_done(self) -> None:
+        self.status = "done"
+        self.dirty = True
+
+    def increment(self) -> None:
+        self.iterations += 1
+        self.has_iterations = True
+        self.dirty = True
+
+    def render(self) -> str:
+        """Return the file text with updated status (and iterations, if tracked)."""
+        updates = {"status": self.status}
+        if self.has_iterations:
+            updates["iterations"] = self.iterations
+        return set_md_fields(self.text, updates)
+
+
+def parse_ralph(text: str, path: str = "") -> RalphState:
+    """Parse ralph-loop text into a RalphState (single pass over the fields)."""
+    fields = parse_md_fields(text)
+    iterations = _to_int(fields.get("iterations"))
+    return RalphState(
+        path=path,
+        text=text,
+        status=fields.get("status", "").strip(),
+        iterations=iterations or 0,
+        max_iterations=_to_int(fields.get("max_iterations")),
+        done_marker=_unquote(fields.get("done_marker", "")) or DEFAULT_DONE_MARKER,
+        has_iterations=iterations is not None,
+    )
+
+
+def load_ralph(path: str) -> RalphState | None:
+    """Read and parse the ralph-loop file, or None if it is missing."""
+    if not path or not os.path.isfile(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    except OSError:
+        return None
+    return parse_ralph(text, path)
+
+
+def save_ralph(state: RalphState) -> bool:
+    """Write pending transitions atomically under the file lock."""
+    if not state.dirty:
+        return True
+
+    lock_dir = acquire_lock(state.path)
+    if lock_dir is None:
+        return False
+    try:
+        try:
+            with open(state.path, "r", encoding="utf-8") as f:
+                current = f.read()
+        except OSError:
+            return False
+        if current != state.text:
+            # Someone else rewrote the loop since we parsed it; theirs wins.
+            return False
+        new_text = state.render()
+        if not write_text_locked(state.path, new_text):
+            return False
+        state.text = new_text
+        state.dirty = False
+        return True
+    finally:
+        release_lock(lock_dir)
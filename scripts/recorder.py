@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""Opt-in ring buffer of redacted hook inputs, exportable for offline replay.
+
+Enabled with AGENT_KIT_RECORD=1. Each hook invocation appends one compact
+JSONL record to its session's newest segment:
+
+  {"ts": <epoch seconds, ms precision>, "event": "Stop", "argv": ["Stop"],
+   "session": "<session id>", "durationUs": <handler time>, "input": {...}}
+
+`input` is the hook stdin JSON after scripts/sanitize.py redaction, with
+string values truncated to MAX_PROMPT_LENGTH.
+
+LAYOUT:
+  .agent-kit/evidence/hook-input/sessions/<session>/seg-<n>.jsonl
+  - A segment holds RECORDS_PER_SEGMENT records; older segments are dropped
+    so at least the last AGENT_KIT_RECORD_MAX (default 256) inputs are kept.
+  - The evidence budget in scripts/_debug.py also applies here.
+
+CONTRACT:
+  - record() never raises and never writes to stdout (fail-open).
+  - export_dataset() returns records in time order, newest `limit` only.
+
+CLI:
+  python3 recorder.py export [--session KEY] [--limit N] [--out PATH]
+    # writes a replay dataset (see evals/hook_replay.py) and prints its path
+"""
+
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+
+# Ensure plugin root is on sys.path so `from scripts.*` imports resolve
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+_PLUGIN_ROOT = os.path.dirname(_SCRIPT_DIR)
+if _PLUGIN_ROOT not in sys.path:
+    sys.path.insert(0, _PLUGIN_ROOT)
+
+from scripts.sanitize import HOOK_INPUT_DEBUG_DIR, MAX_PROMPT_LENGTH, _redact_sensitive, _truncate
+
+RECORD_DIR = os.path.join(HOOK_INPUT_DEBUG_DIR, "sessions")
+DEFAULT_RING_SIZE = 256
+RECORDS_PER_SEGMENT = 32
+DATASET_FILE = os.path.join(HOOK_INPUT_DEBUG_DIR, "replay-dataset.json")
+SESSION_KEY_DEFAULT = "global"
+
+_SEGMENT_PATTERN = re.compile(r"^seg-(\d+)\.jsonl$")
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9._-]")
+
+
+def is_enabled() -> bool:
+    """Recording is opt-in via AGENT_KIT_RECORD=1."""
+    return os.environ.get("AGENT_KIT_RECORD") == "1"
+
+
+def ring_size() -> int:
+    try:
+        value = int(os.environ.get("AGENT_KIT_RECORD_MAX", ""))
+    except ValueError:
+        return DEFAULT_RING_SIZE
+    return value if value > 0 else DEFAULT_RING_SIZE
+
+
+def session_dir(session_key: str, record_dir: str | None = None) -> str:
+    """Per-session directory (session ids are made filesystem-safe)."""
+    safe = _UNSAFE_CHARS.sub("_", session_key or SESSION_KEY_DEFAULT)[:128] or SESSION_KEY_DEFAULT
+    return os.path.join(record_dir or RECORD_DIR, safe)
+
+
+def _segments(directory: str) -> list:
+    """[(n, path)] sorted oldest first."""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    found = []
+    for name in names:
+        match = _SEGMENT_PATTERN.match(name)
+        if match:
+            found.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(found)
+
+
+def _truncate_values(data):
+    if isinstance(data, dict):
+        return {k: _truncate_values(v) for k, v in data.items()}
+    if isinstance(data, list):
+        return [_truncate_values(item) for item in data]
+    if isinstance(data, str):
+        return _truncate(data, MAX_PROMPT_LENGTH)
+    return data
+
+
+def _count_lines(path: str) -> int:
+    try:
+        with open(path, "rb") as f:
+            return f.read().count(b"\n")
+    except OSError:
+        return 0
+
+
+def record(event: str, argv: list, raw_json: str, session_key: str = "",
+           duration_us: int | None = None, record_dir: str | None = None) -> bool:
+    """Append one redacted hook input to the session's ring buffer."""
+    try:
+        data = json.loads(raw_json) if raw_json and raw_json.strip() else {}
+    except (json.JSONDecodeError, ValueError):
+        data = {"unparsed": _truncate(raw_json, MAX_PROMPT_LENGTH)}
+    if not isinstance(data, dict):
+        data = {"value": data}
+
+    line = json.dumps({
+        "ts": int(time.time() * 1000) / 1000,
+        "event": event,
+        "argv": list(argv),
+        "session": session_key,
+        "durationUs": duration_us,
+        "input": _truncate_values(_redact_sensitive(data)),
+    }, separators=(",", ":")) + "\n"
+
+    directory = session_dir(session_key, record_dir)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        segments = _segments(directory)
+        n = segments[-1][0] if segments else 0
+        if segments and _count_lines(segments[-1][1]) >= RECORDS_PER_SEGMENT:
+            n += 1
+            segments.append((n, None))
+        fd = os.open(
+            os.path.join(directory, f"seg-{n}.jsonl"),
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+            0o644,
+        )
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+    except OSError:
+        return False
+
+    # Keep enough whole segments to always cover the last ring_size() records
+    keep = -(-ring_size() // RECORDS_PER_SEGMENT) + 1
+    for _, old in segments[:-keep]:
+        try:
+            os.unlink(old)
+        except OSError:
+            pass
+    return True
+
+
+def _read_segment(path: str) -> list:
+    records = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except (json.JSONDecodeError, ValueError):
+                    continue  # torn line from a concurrent append
+                if isinstance(rec, dict) and "event" in rec:
+                    records.append(rec)
+    except OSError:
+        pass
+    return records
+
+
+def load_session(session_key: str, record_dir: str | None = None) -> list:
+    """All retained records for one session, oldest first."""
+    records = []
+    for _, path in _segments(session_dir(session_key, record_dir)):
+        records.extend(_read_segment(path))
+    return records
+
+
+def export_dataset(session_key: str = "", limit: int | None = None,
+                   record_dir: str | None = None) -> dict:
+    """Build a replay dataset from one session (or all sessions if empty)."""
+    record_dir = record_dir or RECORD_DIR
+    if session_key:
+        records = load_session(session_key, record_dir)
+    else:
+        try:
+            sessions = sorted(os.listdir(record_dir))
+        except OSError:
+            sessions = []
+        records = []
+        for name in sessions:
+            for _, path in _segments(os.path.join(record_dir, name)):
+                records.extend(_read_segment(path))
+
+    records.sort(key=lambda rec: rec.get("ts", 0))
+    limit = ring_size() if limit is None else limit
+    if limit > 0:
+        records = records[-limit:]
+
+    return {
+        "description": "Recorded hook inputs for offline replay (evals/hook_replay.py)",
+        "exportedAt": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "session": session_key or None,
+        "events": records,
+    }
+
+
+def _arg(args: list, flag: str, default: str = "") -> str:
+    if flag in args:
+        idx = args.index(flag)
+        if idx + 1 < len(args):
+            return args[idx + 1]
+    return default
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != "export":
+        print("Usage: recorder.py export [--session KEY] [--limit N] [--out PATH]", file=sys.stderr)
+        sys.exit(1)
+
+    args = sys.argv[2:]
+    try:
+        limit = int(_arg(args, "--limit", "0")) or None
+    except ValueError:
+        print("recorder-export: --limit requires a number", file=sys.stderr)
+        sys.exit(1)
+    out_path = _arg(args, "--out", DATASET_FILE)
+
+    dataset = export_dataset(_arg(args, "--session"), limit)
+    try:
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(dataset, f, indent=2)
+            f.write("\n")
+    except OSError as e:
+        print(f"recorder-export: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"{out_path} ({len(dataset['events'])} events)")
+
+
+if __name__ == "__main__":
+    main()
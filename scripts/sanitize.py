@@ -5,6 +5,7 @@ Replaces sanitize-hook-input.sh.
 CONTRACT:
   - Parse raw JSON from hook events.
   - Redact fields matching: token, key, secret, password.
+  - redact_text() applies the same rule to `name=value` / `name: value` text.
   - Truncate long fields to max length.
   - Return a structured HookInput dataclass.
 
@@ -23,6 +24,11 @@ HOOK_INPUT_DEBUG_DIR = ".agent-kit/evidence/hook-input"
 # Pattern for sensitive field names
 _SENSITIVE_PATTERN = re.compile(r"(?i)token|key|secret|password")
 
+# Sensitive `name=value` / `name: value` / `"name": "value"` pairs in free text
+_SENSITIVE_PAIR_PATTERN = re.compile(
+    r'(?i)(["\']?[\w.-]*(?:token|key|secret|password)[\w.-]*["\']?\s*[=:]\s*)("[^"]*"|\'[^\']*\'|[^\s,;}]+)'
+)
+
 
 @dataclass
 class HookInput:
@@ -51,6 +57,11 @@ def _redact_sensitive(data):
     return data
 
 
+def redact_text(text: str) -> str:
+    """Redact values of sensitive name/value pairs in a line of text."""
+    return _SENSITIVE_PAIR_PATTERN.sub(lambda m: m.group(1) + REDACTED, text)
+
+
 def _truncate(s: str, max_len: int = MAX_PROMPT_LENGTH) -> str:
     """Truncate a string to max length."""
     if len(s) > max_len:
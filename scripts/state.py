@@ -7,63 +7,287 @@ CONTRACT:
   read_json(path) -> dict:
     - If file exists and contains valid JSON: return parsed dict.
     - If file is missing or corrupt: return {} (fail-open).
-    - Create parent directory if missing.
+    - Never creates directories.
+    - Served from an in-process cache revalidated by one os.stat
+      (inode, mtime_ns, size); the returned object is a private copy.
+
+  read_json_view(path) -> dict:
+    - Same cache, but returns the shared parsed object (read-only).
 
-  write_json(path, data) -> bool:
+  write_json(path, data, durability=None) -> bool:
     - Atomic write via tempfile + os.rename.
+    - durability: "none" | "file" | "file+dir" (fsync file, then directory).
+      Defaults come from DURABILITY_BY_FILE (boulder.json is "file+dir"),
+      then AGENT_KIT_STATE_DURABILITY, then "none".
+    - Compact separators (no whitespace) to keep state files small.
     - Create parent directory if missing.
     - Returns True on success, False on failure.
 
+  update_json(path, mutate, wait_seconds) -> dict | None:
+    - Locked read-modify-write; mutate(doc) edits the object in place
+      (returning False skips the write).
+
+  write_files_locked(files, session) -> tuple | None:
+    - Replaces several files all-or-nothing ([(path, bytes | JSON object)]);
+      the caller holds every lock. Existing files keep their permission
+      bits. Returns None, or (path, error) after rolling back.
+
+  write_json(..., session=key) also appends a merge-patch record to the
+  state journal when AGENT_KIT_STATE_JOURNAL=1 (see journal.py);
+  journaled=False opts derived cache files out.
+
+  gc_runtime(path, ttl_seconds, keep) -> dict:
+    - Drop runtime sessions whose last update is older than ttl_seconds,
+      inside update_json so a concurrent runtime write is never lost (a
+      busy lock skips this pass).
+    - The "global" session and sessions listed in keep are never dropped.
+    - Sessions without any timestamp are stamped now and expire one TTL later.
+    - Returns a report with session counts and bytes reclaimed.
+
+  maybe_gc_runtime(path, keep) -> dict | None:
+    - Runs gc_runtime at most once per GC_INTERVAL_SECONDS (tracked in the
+      runtime file as "gcEpoch"). Returns None when not due.
+
 CLI:
   python3 state.py read <path>
-  python3 state.py write <path> [json|-]
+  python3 state.py write <path> [json|-] [--durability none|file|file+dir]
+  python3 state.py gc <path> [--ttl-days N]
+  python3 state.py batch [--session KEY] < ops.jsonl
+    One op per line: {"op": "read"|"write"|"update", "path": ..., ...}
+      read:   returns {"data": <json>} (markdown files: their `key: value` fields)
+      write:  "data": full replacement (object/array; string for .md)
+      update: "set": {"dotted.key": value} (markdown: {"field": value};
+              a literal dot in a key is written "\\."),
+              "unset": ["dotted.key", ...] (JSON only; missing keys are fine);
+              "ifExists": true skips the op when the file is missing
+    "$now" anywhere in data/set expands to the current UTC ISO time.
+    Each mutated file is locked once (sorted order) and written once, and
+    nothing is written unless every op succeeds; a failed write rolls back
+    the files already replaced. One JSON result per line.
+  python3 state.py replay [--until <epoch|iso>] [--path <file>]
+    Rebuild journaled state files as of a point in time (see journal.py;
+    requires AGENT_KIT_STATE_JOURNAL=1 while the writes happened).
 """
 
 import json
+import marshal
 import os
+import re
 import sys
 import tempfile
+import time
+from datetime import datetime, timezone
+
+# Ensure plugin root is on sys.path so `from scripts.*` imports resolve
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+_PLUGIN_ROOT = os.path.dirname(_SCRIPT_DIR)
+if _PLUGIN_ROOT not in sys.path:
+    sys.path.insert(0, _PLUGIN_ROOT)
+
+from scripts import journal
+
+SESSION_TTL_SECONDS = 7 * 24 * 3600
+GC_INTERVAL_SECONDS = 3600
+PINNED_SESSIONS = ("global",)
+
+# Durability levels for write_json:
+#   none      rename only (atomic, not crash-safe)
+#   file      fsync the temp file before rename
+#   file+dir  additionally fsync the parent directory after rename
+DURABILITY_NONE = "none"
+DURABILITY_FILE = "file"
+DURABILITY_FILE_DIR = "file+dir"
+DURABILITY_MODES = (DURABILITY_NONE, DURABILITY_FILE, DURABILITY_FILE_DIR)
+
+# Per-file defaults by basename: plans are expensive to lose, counters are not.
+DURABILITY_BY_FILE = {
+    "boulder.json": DURABILITY_FILE_DIR,
+}
+
+LOCK_POLL_SECONDS = 0.01
+BATCH_LOCK_WAIT_SECONDS = 2.0
+BATCH_NOW = "$now"
+
+# abspath -> ((st_ino, st_mtime_ns, st_size), parsed object, marshal snapshot)
+_READ_CACHE: dict[str, tuple] = {}
+_READ_CACHE_MAX_ENTRIES = 64
+
+
+def _load_cached(path: str):
+    """Return the cache entry for path, revalidated with a single os.stat.
+
+    Entries are (stat_key, parsed, snapshot); parsed is {} for empty or
+    invalid JSON and snapshot is its marshal encoding.
+    Returns None when the file is missing or unreadable. Never creates
+    directories.
+    """
+    key = os.path.abspath(path)
+    try:
+        st = os.stat(key)
+    except OSError:
+        _READ_CACHE.pop(key, None)
+        return None
+
+    stat_key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    entry = _READ_CACHE.get(key)
+    if entry is not None and entry[0] == stat_key:
+        return entry
+
+    try:
+        with open(key, "r", encoding="utf-8") as f:
+            content = f.read()
+    except OSError:
+        _READ_CACHE.pop(key, None)
+        return None
+
+    parsed = {}
+    if content.strip():
+        try:
+            data = json.loads(content)
+            if isinstance(data, (dict, list)):
+                parsed = data
+        except (json.JSONDecodeError, ValueError):
+            pass
+
+    if len(_READ_CACHE) >= _READ_CACHE_MAX_ENTRIES:
+        _READ_CACHE.clear()
+    entry = (stat_key, parsed, marshal.dumps(parsed))
+    _READ_CACHE[key] = entry
+    return entry
 
 
 def read_json(path: str) -> dict:
-    """Read a JSON file, returning {} on any error (fail-open)."""
+    """Read a JSON file, returning {} on any error (fail-open).
+
+    The result is a fresh copy the caller may mutate, decoded from the
+    cached marshal snapshot: a cache hit costs one os.stat and a
+    marshal.loads (about 2.5x cheaper than json.loads, 10x than deepcopy),
+    with no file read or JSON parse.
+    """
     if not path:
         return {}
+    entry = _load_cached(path)
+    if entry is None:
+        return {}
+    return marshal.loads(entry[2])
 
-    # Ensure parent directory exists
-    parent = os.path.dirname(path)
-    if parent and parent != ".":
-        try:
-            os.makedirs(parent, exist_ok=True)
-        except OSError:
-            pass
 
-    if not os.path.isfile(path):
+def read_json_view(path: str) -> dict:
+    """Read a JSON file through the in-process cache without copying.
+
+    Returns the shared cached object: callers must treat it as read-only.
+    Use read_json() for read-modify-write sequences.
+    """
+    if not path:
         return {}
+    entry = _load_cached(path)
+    if entry is None:
+        return {}
+    return entry[1]
+
+
+def invalidate_read_cache(path: str | None = None) -> None:
+    """Drop one cached path, or the whole read cache when path is None."""
+    if path is None:
+        _READ_CACHE.clear()
+    else:
+        _READ_CACHE.pop(os.path.abspath(path), None)
+
+
+def resolve_durability(path: str, durability: str | None = None) -> str:
+    """Pick the durability mode for a write.
 
+    Order: explicit argument, per-file default (DURABILITY_BY_FILE, matched
+    on basename), AGENT_KIT_STATE_DURABILITY, then "none".
+    """
+    if durability in DURABILITY_MODES:
+        return durability
+    by_file = DURABILITY_BY_FILE.get(os.path.basename(path or ""))
+    if by_file:
+        return by_file
+    env_mode = os.environ.get("AGENT_KIT_STATE_DURABILITY", "")
+    if env_mode in DURABILITY_MODES:
+        return env_mode
+    return DURABILITY_NONE
+
+
+def _fsync_dir(directory: str) -> None:
+    """fsync a directory so a rename inside it survives a crash."""
+    flags = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0)
+    dir_fd = os.open(directory, flags)
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            content = f.read()
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _parent_dir(path: str) -> str:
+    parent = os.path.dirname(path)
+    return parent if parent and parent != "." else "."
+
+
+def _discard_temp(temp_path: str) -> None:
+    try:
+        os.unlink(temp_path)
     except OSError:
-        return {}
+        pass
 
-    if not content.strip():
-        return {}
 
+def _file_mode(path: str) -> int | None:
+    """Permission bits of an existing file, None if it does not exist."""
     try:
-        data = json.loads(content)
-        if isinstance(data, (dict, list)):
-            return data
-        return {}
-    except (json.JSONDecodeError, ValueError):
-        return {}
+        return os.stat(path).st_mode & 0o7777
+    except OSError:
+        return None
+
+
+def _stage_temp(path: str, payload: bytes, durability: str, mode: int | None = None) -> str:
+    """Write payload to a temp file next to path (fsynced per durability).
+
+    mode sets the temp file's permission bits (mkstemp creates 0600).
+    Returns the temp path; raises OSError (leaving nothing behind) on failure.
+    """
+    fd, temp_path = tempfile.mkstemp(prefix=".state-write.", dir=_parent_dir(path))
+    try:
+        try:
+            if mode is not None:
+                os.fchmod(fd, mode)
+            os.write(fd, payload)
+            if durability in (DURABILITY_FILE, DURABILITY_FILE_DIR):
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        _discard_temp(temp_path)
+        raise
+    return temp_path
 
 
-def write_json(path: str, data) -> bool:
+def _atomic_replace(path: str, payload: bytes, durability: str, mode: int | None = None) -> None:
+    """Write payload to a temp file in path's directory and rename it over path.
+
+    Raises OSError on failure; the temp file is always cleaned up.
+    """
+    temp_path = _stage_temp(path, payload, durability, mode)
+    try:
+        # Atomic rename
+        os.rename(temp_path, path)
+    except OSError:
+        _discard_temp(temp_path)
+        raise
+    if durability == DURABILITY_FILE_DIR:
+        _fsync_dir(_parent_dir(path))
+
+
+def write_json(path: str, data, durability: str | None = None, session: str = "",
+               journaled: bool = True) -> bool:
     """Atomically write JSON data to a file.
 
-    Uses tempfile + os.rename for atomic write.
-    Creates parent directories as needed.
+    Uses tempfile + os.rename for atomic write, with optional fsync of the
+    file ("file") or the file and its directory ("file+dir").
+    Creates parent directories as needed. When journaling is enabled, the
+    change is appended to the state journal tagged with `session`;
+    journaled=False skips that for derived files (caches) that can be rebuilt.
     Returns True on success, False on failure.
     """
     if not path:
@@ -74,69 +298,549 @@ def write_json(path: str, data) -> bool:
     if isinstance(data, str):
         json_content = data
     else:
-        json_content = json.dumps(data)
+        json_content = json.dumps(data, separators=(",", ":"))
 
     if not json_content:
         print("state-write: no JSON content provided", file=sys.stderr)
         return False
 
+    lock_dir = acquire_lock(path)
+    if lock_dir is None:
+        return False
+    try:
+        return _write_json_locked(path, json_content, durability, session, journaled)
+    finally:
+        release_lock(lock_dir)
+
+
+def acquire_lock(path: str, wait_seconds: float = 0.0) -> str | None:
+    """Take the mkdir lock for path, creating its parent directory.
+
+    Retries for up to wait_seconds (0 = single attempt, the hook default).
+    Returns the lock directory to pass to release_lock, or None on failure.
+    """
     parent = os.path.dirname(path)
     if parent and parent != ".":
         try:
             os.makedirs(parent, exist_ok=True)
         except OSError as e:
             print(f"state-write: failed to create directory {parent}: {e}", file=sys.stderr)
-            return False
+            return None
 
     # Lock directory for mutual exclusion
     lock_dir = f"{path}.lock"
+    deadline = time.monotonic() + wait_seconds
+    while True:
+        try:
+            os.mkdir(lock_dir)
+            return lock_dir
+        except FileExistsError:
+            if time.monotonic() >= deadline:
+                print(f"state-write: lock busy for {path}", file=sys.stderr)
+                return None
+            time.sleep(LOCK_POLL_SECONDS)
+        except OSError as e:
+            print(f"state-write: lock failed for {path}: {e}", file=sys.stderr)
+            return None
+
+
+def release_lock(lock_dir: str) -> None:
+    """Release a lock taken with acquire_lock."""
     try:
-        os.mkdir(lock_dir)
-    except FileExistsError:
-        print(f"state-write: lock busy for {path}", file=sys.stderr)
-        return False
-    except OSError as e:
-        print(f"state-write: lock failed for {path}: {e}", file=sys.stderr)
-        return False
+        os.rmdir(lock_dir)
+    except OSError:
+        pass
 
-    temp_path = None
+
+def _write_json_locked(path: str, json_content: str, durability: str | None, session: str,
+                       journaled: bool = True) -> bool:
+    """Replace path with json_content. Caller must hold the lock for path."""
     try:
-        # Write to temp file in same directory
-        fd, temp_path = tempfile.mkstemp(
-            prefix=".state-write.",
-            dir=parent if parent and parent != "." else ".",
+        before = read_json_view(path) if journaled and journal.is_enabled() else None
+        _atomic_replace(
+            path,
+            (json_content + "\n").encode("utf-8"),
+            resolve_durability(path, durability),
         )
-        try:
-            os.write(fd, (json_content + "\n").encode("utf-8"))
-        finally:
-            os.close(fd)
-
-        # Atomic rename
-        os.rename(temp_path, path)
-        temp_path = None  # rename succeeded, don't clean up
+        invalidate_read_cache(path)
+        if before is not None:
+            _journal_write(path, before, json_content, session)
         return True
 
     except OSError as e:
         print(f"state-write: failed: {e}", file=sys.stderr)
         return False
 
+
+def update_json(path: str, mutate, wait_seconds: float = 0.0,
+                durability: str | None = None, session: str = "") -> dict | None:
+    """Locked read-modify-write of a JSON object file.
+
+    mutate(doc) edits the dict in place; returning False leaves the file
+    untouched. Returns the doc (written or not), or None if the lock or the
+    write failed.
+    """
+    lock_dir = acquire_lock(path, wait_seconds=wait_seconds)
+    if lock_dir is None:
+        return None
+    try:
+        doc = read_json(path)
+        if not isinstance(doc, dict):
+            doc = {}
+        if mutate(doc) is False:
+            return doc
+        content = json.dumps(doc, separators=(",", ":"))
+        if not _write_json_locked(path, content, durability, session):
+            return None
+        return doc
     finally:
-        # Cleanup temp file if still exists
-        if temp_path and os.path.exists(temp_path):
+        release_lock(lock_dir)
+
+
+def _journal_write(path: str, before, json_content: str, session: str) -> None:
+    """Append a write to the state journal (never fails the write)."""
+    try:
+        after = json.loads(json_content)
+    except (json.JSONDecodeError, ValueError):
+        return
+    journal.record(path, before, after, session=session)
+
+
+# --- Batch mode ---
+
+def _now_iso() -> str:
+    """Current UTC time in ISO format."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _batch_value(value):
+    """Expand batch placeholders ("$now") inside a value."""
+    if value == BATCH_NOW:
+        return _now_iso()
+    if isinstance(value, dict):
+        return {k: _batch_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_batch_value(v) for v in value]
+    return value
+
+
+_DOT_PATTERN = re.compile(r"(?<!\\)\.")
+
+
+def dotted_key(*parts: str) -> str:
+    """Join key parts into a batch "set"/"unset" key, escaping dots as "\\."."""
+    return ".".join(str(part).replace(".", "\\.") for part in parts)
+
+
+def _split_dotted(dotted: str) -> list:
+    return [part.replace("\\.", ".") for part in _DOT_PATTERN.split(dotted.strip("."))]
+
+
+def _set_dotted(doc: dict, dotted: str, value) -> None:
+    """Set doc[a][b][c] = value for "a.b.c", creating dicts as needed."""
+    parts = _split_dotted(dotted)
+    current = doc
+    for part in parts[:-1]:
+        nxt = current.get(part)
+        if not isinstance(nxt, dict):
+            nxt = {}
+            current[part] = nxt
+        current = nxt
+    current[parts[-1]] = value
+
+
+def _unset_dotted(doc: dict, dotted: str) -> None:
+    """Delete doc[a][b][c] for "a.b.c" if it exists."""
+    parts = _split_dotted(dotted)
+    current = doc
+    for part in parts[:-1]:
+        current = current.get(part)
+        if not isinstance(current, dict):
+            return
+    current.pop(parts[-1], None)
+
+
+def _is_markdown(path: str) -> bool:
+    return path.endswith(".md")
+
+
+_MD_FIELD_PATTERN = re.compile(r"^([A-Za-z_][A-Za-z0-9_]*):[ \t]*(.*)$")
+
+
+def parse_md_fields(text: str) -> dict:
+    """Top-level `key: value` fields of a markdown state file (e.g. ralph loop)."""
+    fields = {}
+    for line in text.splitlines():
+        match = _MD_FIELD_PATTERN.match(line)
+        if match and match.group(1) not in fields:
+            fields[match.group(1)] = match.group(2).strip()
+    return fields
+
+
+def set_md_fields(text: str, updates: dict) -> str:
+    """Replace (or append) top-level `key: value` lines in markdown state."""
+    lines = text.splitlines()
+    pending = dict(updates)
+    for i, line in enumerate(lines):
+        match = _MD_FIELD_PATTERN.match(line)
+        if match and match.group(1) in pending:
+            lines[i] = f"{match.group(1)}: {pending.pop(match.group(1))}"
+    for key, value in pending.items():
+        lines.append(f"{key}: {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _read_text(path: str) -> str:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def _apply_batch_op(op: dict, docs: dict) -> dict:
+    """Apply one batch operation against in-memory docs. Raises ValueError."""
+    kind = op.get("op")
+    path = op.get("path")
+    if kind not in ("read", "write", "update"):
+        raise ValueError(f"unknown op: {kind!r}")
+    if not isinstance(path, str) or not path:
+        raise ValueError("missing path")
+
+    if path not in docs:
+        docs[path] = {
+            "value": _read_text(path) if _is_markdown(path) else read_json(path),
+            "dirty": False,
+            "exists": os.path.isfile(path),
+        }
+    entry = docs[path]
+
+    if kind == "update" and op.get("ifExists") and not (entry["exists"] or entry["dirty"]):
+        return {"skipped": True}
+
+    if kind == "read":
+        value = entry["value"]
+        return {"data": parse_md_fields(value) if _is_markdown(path) else value}
+
+    if kind == "write":
+        if "data" not in op:
+            raise ValueError("write requires data")
+        data = _batch_value(op["data"])
+        if _is_markdown(path) and not isinstance(data, str):
+            raise ValueError("markdown write requires string data")
+        if not _is_markdown(path) and not isinstance(data, (dict, list)):
+            raise ValueError("write requires an object or array")
+        entry["value"] = data
+        entry["dirty"] = True
+        return {}
+
+    updates = op.get("set", {})
+    removals = op.get("unset", [])
+    if not isinstance(updates, dict) or not isinstance(removals, list) or not (updates or removals):
+        raise ValueError("update requires a non-empty set object or unset list")
+    if not all(isinstance(dotted, str) and dotted for dotted in removals):
+        raise ValueError("unset requires dotted key strings")
+    updates = _batch_value(updates)
+    if _is_markdown(path):
+        if removals:
+            raise ValueError("unset is not supported for markdown files")
+        if not entry["value"]:
+            raise ValueError(f"{path} does not exist")
+        entry["value"] = set_md_fields(entry["value"], updates)
+    else:
+        if not isinstance(entry["value"], dict):
+            raise ValueError(f"{path} is not a JSON object")
+        for dotted, value in updates.items():
+            _set_dotted(entry["value"], dotted, value)
+        for dotted in removals:
+            _unset_dotted(entry["value"], dotted)
+    entry["dirty"] = True
+    return {}
+
+
+def run_batch(ops: list, session: str = "") -> tuple:
+    """Execute read/write/update ops with one lock per mutated file.
+
+    All ops run against in-memory copies; files are written once each at
+    the end, and only if every op succeeded. The writes are staged as temp
+    files first and a failed rename restores the files already replaced
+    (all-or-nothing; see _commit_batch).
+    Returns (results, ok).
+    """
+    mutated = sorted({
+        op.get("path") for op in ops
+        if isinstance(op, dict) and op.get("op") in ("write", "update")
+        and isinstance(op.get("path"), str) and op.get("path")
+    })
+
+    # Fixed (sorted) lock order so concurrent batches cannot deadlock
+    held = []
+    for path in mutated:
+        lock_dir = acquire_lock(path, wait_seconds=BATCH_LOCK_WAIT_SECONDS)
+        if lock_dir is None:
+            for taken in held:
+                release_lock(taken)
+            error = f"lock busy for {path}"
+            return [_batch_result(op, {"ok": False, "error": error}) for op in ops], False
+        held.append(lock_dir)
+
+    try:
+        docs = {}
+        results = []
+        ok = True
+        for op in ops:
             try:
-                os.unlink(temp_path)
+                if not isinstance(op, dict):
+                    raise ValueError("operation must be a JSON object")
+                outcome = {"ok": True, **_apply_batch_op(op, docs)}
+            except ValueError as e:
+                outcome = {"ok": False, "error": str(e)}
+                ok = False
+            results.append(_batch_result(op, outcome))
+
+        if ok:
+            failure = _commit_batch(docs, session)
+            if failure is not None:
+                ok = False
+                results.append({"ok": False, "path": failure[0], "error": failure[1]})
+        return results, ok
+    finally:
+        for lock_dir in held:
+            release_lock(lock_dir)
+
+
+def _read_original(path: str) -> bytes | None:
+    """Current bytes of path, None if it does not exist (raises other OSErrors)."""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _commit_batch(docs: dict, session: str) -> tuple | None:
+    """Write every dirty doc, or leave all files as they were (see write_files_locked)."""
+    files = []
+    for path, entry in docs.items():
+        if entry["dirty"]:
+            value = entry["value"]
+            files.append((path, value.encode("utf-8") if _is_markdown(path) else value))
+    return write_files_locked(files, session)
+
+
+def write_files_locked(files: list, session: str = "") -> tuple | None:
+    """Replace several files at once, or leave all of them as they were.
+
+    files is [(path, data)] or [(path, data, durability)]: bytes are written
+    as-is, anything else as compact JSON (journaled like write_json). Every temp file is written
+    (and fsynced per durability) before the first rename. If a rename
+    fails, the files already renamed get their previous contents back (or
+    are removed if they did not exist). Existing files keep their
+    permission bits. Caller holds the lock for every path.
+    Returns None, or (path, error) on failure.
+    """
+    staged = []
+    try:
+        for path, data, *explicit in files:
+            if isinstance(data, bytes):
+                content, payload = None, data
+            else:
+                content = json.dumps(data, separators=(",", ":"))
+                payload = (content + "\n").encode("utf-8")
+            durability = resolve_durability(path, explicit[0] if explicit else None)
+            original = _read_original(path)
+            mode = _file_mode(path) if original is not None else None
+            staged.append((path, content, durability, original,
+                           _stage_temp(path, payload, durability, mode)))
+    except OSError as e:
+        for *_, temp_path in staged:
+            _discard_temp(temp_path)
+        print(f"state-write: failed: {e}", file=sys.stderr)
+        return path, "write failed"
+
+    before = {}
+    if journal.is_enabled():
+        before = {path: read_json_view(path) for path, content, *_ in staged if content is not None}
+
+    for index, (path, _, _, _, temp_path) in enumerate(staged):
+        try:
+            os.rename(temp_path, path)
+        except OSError as e:
+            print(f"state-write: failed: {e}; rolling back batch", file=sys.stderr)
+            for *_, pending in staged[index:]:
+                _discard_temp(pending)
+            for done_path, _, durability, original, _ in staged[:index]:
+                try:
+                    if original is None:
+                        os.unlink(done_path)
+                    else:
+                        _atomic_replace(done_path, original, durability, _file_mode(done_path))
+                except OSError:
+                    pass
+                invalidate_read_cache(done_path)
+            return path, "write failed (batch rolled back)"
+        invalidate_read_cache(path)
+
+    for path, content, durability, _, _ in staged:
+        if durability == DURABILITY_FILE_DIR:
+            try:
+                _fsync_dir(_parent_dir(path))
             except OSError:
                 pass
-        # Release lock
+        if path in before:
+            _journal_write(path, before[path], content, session)
+    return None
+
+
+def _batch_result(op, outcome: dict) -> dict:
+    result = {}
+    if isinstance(op, dict):
+        if "id" in op:
+            result["id"] = op["id"]
+        result["op"] = op.get("op")
+        result["path"] = op.get("path")
+    result.update(outcome)
+    return result
+
+
+def write_text_locked(path: str, content: str, durability: str | None = None) -> bool:
+    """Atomically replace a text state file. Caller must hold the lock for path."""
+    return write_bytes_locked(path, content.encode("utf-8"), durability)
+
+
+def write_bytes_locked(path: str, payload: bytes, durability: str | None = None) -> bool:
+    """Atomically replace a file with raw bytes, keeping its permission bits.
+
+    Caller must hold the lock for path.
+    """
+    try:
+        _atomic_replace(path, payload, resolve_durability(path, durability), _file_mode(path))
+        return True
+    except OSError as e:
+        print(f"state-write: failed: {e}", file=sys.stderr)
+        return False
+
+
+def _parse_epoch(value) -> float | None:
+    """Convert an ISO timestamp or epoch number to epoch seconds."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else None
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def _session_last_update(session: dict) -> float | None:
+    """Return the most recent timestamp recorded anywhere in a session entry."""
+    candidates = [session.get("updatedAt")]
+    ulw = session.get("ulw")
+    if isinstance(ulw, dict):
+        candidates += [ulw.get("updatedAt"), ulw.get("lastStopAt"), ulw.get("lastStopEpoch")]
+    stop_cont = session.get("stopContinuation")
+    if isinstance(stop_cont, dict):
+        candidates.append(stop_cont.get("disabledAt"))
+
+    epochs = [e for e in (_parse_epoch(c) for c in candidates) if e is not None]
+    return max(epochs) if epochs else None
+
+
+def prune_sessions(runtime: dict, ttl_seconds: float = SESSION_TTL_SECONDS,
+                   now: float | None = None, keep=()) -> int:
+    """Remove expired sessions from a runtime dict in place.
+
+    Returns the number of sessions removed.
+    """
+    sessions = runtime.get("sessions")
+    if not isinstance(sessions, dict):
+        return 0
+
+    if now is None:
+        now = time.time()
+    stamp = datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    removed = 0
+    for key in list(sessions):
+        if key in PINNED_SESSIONS or key in keep:
+            continue
+        session = sessions[key]
+        if not isinstance(session, dict):
+            del sessions[key]
+            removed += 1
+            continue
+        last = _session_last_update(session)
+        if last is None:
+            # Legacy entry with no timestamp: start its TTL clock now
+            session["updatedAt"] = stamp
+        elif now - last > ttl_seconds:
+            del sessions[key]
+            removed += 1
+    return removed
+
+
+def gc_runtime(path: str, ttl_seconds: float = SESSION_TTL_SECONDS, keep=()) -> dict:
+    """Prune expired sessions from a runtime state file and rewrite it compactly."""
+    report = {
+        "path": path,
+        "sessionsBefore": 0,
+        "sessionsRemoved": 0,
+        "bytesBefore": 0,
+        "bytesAfter": 0,
+        "bytesReclaimed": 0,
+    }
+    try:
+        report["bytesBefore"] = os.path.getsize(path)
+    except OSError:
+        return report
+
+    now = time.time()
+
+    def prune(runtime):
+        if not runtime or runtime.get("version", 1) != 1:
+            return False
+        sessions = runtime.get("sessions")
+        report["sessionsBefore"] = len(sessions) if isinstance(sessions, dict) else 0
+        report["sessionsRemoved"] = prune_sessions(runtime, ttl_seconds, now=now, keep=keep)
+        runtime["gcEpoch"] = int(now)
+
+    # Under the runtime lock, like every other runtime writer; busy = skip this pass
+    runtime = update_json(path, prune)
+    if runtime is not None and runtime.get("gcEpoch") == int(now):
         try:
-            os.rmdir(lock_dir)
+            report["bytesAfter"] = os.path.getsize(path)
         except OSError:
-            pass
+            report["bytesAfter"] = report["bytesBefore"]
+    else:
+        report["sessionsRemoved"] = 0
+        report["bytesAfter"] = report["bytesBefore"]
+    report["bytesReclaimed"] = report["bytesBefore"] - report["bytesAfter"]
+    return report
+
+
+def maybe_gc_runtime(path: str, keep=(), interval_seconds: float = GC_INTERVAL_SECONDS,
+                     ttl_seconds: float = SESSION_TTL_SECONDS) -> dict | None:
+    """Run gc_runtime if the last pass is older than interval_seconds."""
+    runtime = read_json_view(path)
+    if not runtime:
+        return None
+    last_gc = runtime.get("gcEpoch", 0)
+    if isinstance(last_gc, (int, float)) and time.time() - last_gc < interval_seconds:
+        return None
+    return gc_runtime(path, ttl_seconds=ttl_seconds, keep=keep)
 
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: state.py read <path> | state.py write <path> [json|-]", file=sys.stderr)
+        print(
+            "Usage: state.py read <path> | state.py write <path> [json|-] [--durability MODE] | "
+            "state.py gc <path> [--ttl-days N] | state.py batch [--session KEY] < ops.jsonl | "
+            "state.py replay [--until <ts>] [--path <file>]",
+            file=sys.stderr,
+        )
         sys.exit(1)
 
     command = sys.argv[1]
@@ -152,10 +856,19 @@ def main():
             sys.exit(1)
 
         path = sys.argv[2]
-        content = ""
+        args = sys.argv[3:]
+        durability = None
+        if "--durability" in args:
+            idx = args.index("--durability")
+            durability = args[idx + 1] if idx + 1 < len(args) else ""
+            if durability not in DURABILITY_MODES:
+                print(f"state-write: unknown durability mode: {durability}", file=sys.stderr)
+                sys.exit(1)
+            del args[idx:idx + 2]
 
-        if len(sys.argv) > 3 and sys.argv[3] != "-":
-            content = sys.argv[3]
+        content = ""
+        if args and args[0] != "-":
+            content = args[0]
         elif not sys.stdin.isatty():
             content = sys.stdin.read()
 
@@ -163,10 +876,84 @@ def main():
             print("state-write: no JSON content provided", file=sys.stderr)
             sys.exit(1)
 
-        if write_json(path, content):
+        if write_json(path, content, durability=durability):
             sys.exit(0)
         else:
             sys.exit(1)
+
+    elif command == "gc":
+        if len(sys.argv) < 3:
+            print("state-gc: missing file path argument", file=sys.stderr)
+            sys.exit(1)
+
+        path = sys.argv[2]
+        ttl_seconds = SESSION_TTL_SECONDS
+        args = sys.argv[3:]
+        if "--ttl-days" in args:
+            idx = args.index("--ttl-days")
+            try:
+                ttl_seconds = float(args[idx + 1]) * 24 * 3600
+            except (IndexError, ValueError):
+                print("state-gc: --ttl-days requires a number", file=sys.stderr)
+                sys.exit(1)
+
+        report = gc_runtime(path, ttl_seconds=ttl_seconds)
+        print(json.dumps(report, separators=(",", ":")))
+
+    elif command == "batch":
+        ops = []
+        parse_failed = False
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            try:
+                ops.append(json.loads(line))
+            except (json.JSONDecodeError, ValueError):
+                ops.append(None)
+                parse_failed = True
+
+        session = ""
+        if "--session" in sys.argv[2:]:
+            idx = sys.argv.index("--session")
+            session = sys.argv[idx + 1] if idx + 1 < len(sys.argv) else ""
+
+        if parse_failed:
+            for op in ops:
+                outcome = {"ok": op is not None}
+                if op is None:
+                    outcome["error"] = "invalid JSON line"
+                print(json.dumps(_batch_result(op, outcome), separators=(",", ":")))
+            sys.exit(1)
+
+        results, ok = run_batch(ops, session=session)
+        for result in results:
+            print(json.dumps(result, separators=(",", ":")))
+        sys.exit(0 if ok else 1)
+
+    elif command == "replay":
+        args = sys.argv[2:]
+        until = None
+        if "--until" in args:
+            idx = args.index("--until")
+            raw = args[idx + 1] if idx + 1 < len(args) else ""
+            try:
+                until = float(raw)
+            except ValueError:
+                until = _parse_epoch(raw)
+            if until is None:
+                print("state-replay: --until requires an epoch or ISO timestamp", file=sys.stderr)
+                sys.exit(1)
+
+        files = journal.replay(until)
+        if files is None:
+            print("state-replay: timestamp predates retained journal history", file=sys.stderr)
+            sys.exit(1)
+
+        if "--path" in args:
+            idx = args.index("--path")
+            target = args[idx + 1] if idx + 1 < len(args) else ""
+            files = files.get(target, {})
+        print(json.dumps(files, separators=(",", ":")))
     else:
         print(f"Unknown command: {command}", file=sys.stderr)
         sys.exit(1)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Escape hatch: stop every continuation mechanism in one transaction.
+
+CONTRACT:
+  stop_continuation(session_key, ...) -> dict:
+    - In a single scripts.state.run_batch (all-or-nothing, one lock per file,
+      taken in the batch's fixed sorted order):
+        runtime  sessions.<key>.stopContinuation.{disabled,disabledReason,disabledAt},
+                 sessions.<key>.ulw.enabled=false, sessions.<key>.updatedAt
+        ralph    status: cancelled                  (only if the file exists)
+        boulder  active=false, status=done, updatedAt (the session's resolved
+                 boulder and the legacy boulder.json, each only if it exists)
+        index    boulders/index.json: the registry boulder's plan entry gets
+                 the same fields and its session bindings are released
+                 (only if a registry boulder was resolved and the index exists)
+    - Emits one `skill.stop_continuation` telemetry event.
+    - Returns {"ok", "session", "ralph", "boulders", "results"}.
+
+CLI:
+  python3 stop_continuation.py [--session KEY] [--reason TEXT]
+    # prints a one-line summary; exit 1 if nothing was written
+"""
+
+import os
+import sys
+
+# Ensure plugin root is on sys.path so `from scripts.*` imports resolve
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+_PLUGIN_ROOT = os.path.dirname(_SCRIPT_DIR)
+if _PLUGIN_ROOT not in sys.path:
+    sys.path.insert(0, _PLUGIN_ROOT)
+
+from scripts.boulder import BOULDER_FILE, boulder_slug, index_path, is_registry_boulder, resolve_boulder_path
+from scripts.state import BATCH_NOW, dotted_key, read_json_view, run_batch
+from scripts.telemetry import emit_event, session_trace_id
+
+RUNTIME_FILE = ".agent-kit/state/runtime.local.json"
+RALPH_FILE = ".agent-kit/ralph-loop.local.md"
+SESSION_KEY_DEFAULT = "global"
+DEFAULT_REASON = "manual escape hatch"
+
+
+def build_ops(session_key: str, boulder_paths: list, reason: str = DEFAULT_REASON,
+              runtime_file: str = RUNTIME_FILE, ralph_file: str = RALPH_FILE,
+              boulder_file: str = BOULDER_FILE) -> list:
+    """Batch operations for one escape-hatch transaction."""
+    prefix = dotted_key("sessions", session_key)
+    ops = [
+        {"op": "update", "path": runtime_file, "set": {
+            "version": 1,
+            f"{prefix}.stopContinuation.disabled": True,
+            f"{prefix}.stopContinuation.disabledReason": reason,
+            f"{prefix}.stopContinuation.disabledAt": BATCH_NOW,
+            f"{prefix}.ulw.enabled": False,
+            f"{prefix}.updatedAt": BATCH_NOW,
+        }},
+        {"op": "update", "path": ralph_file, "set": {"status": "cancelled"}, "ifExists": True},
+    ]
+    for path in boulder_paths:
+        ops.append({"op": "update", "path": path, "ifExists": True, "set": {
+            "active": False, "status": "done", "updatedAt": BATCH_NOW,
+        }})
+        if is_registry_boulder(boulder_file, path):
+            ops.append(_index_op(boulder_file, boulder_slug(path)))
+    return ops
+
+
+def _index_op(boulder_file: str, slug: str) -> dict:
+    """Mark a registry plan done in index.json and release its sessions."""
+    sessions = read_json_view(index_path(boulder_file)).get("sessions", {})
+    bound = [key for key, value in sessions.items() if value == slug] if isinstance(sessions, dict) else []
+    entry = dotted_key("plans", slug)
+    return {"op": "update", "path": index_path(boulder_file), "ifExists": True, "set": {
+        f"{entry}.active": False, f"{entry}.status": "done", f"{entry}.updatedAt": BATCH_NOW,
+    }, "unset": [dotted_key("sessions", key) for key in bound]}
+
+
+def stop_continuation(session_key: str = "", reason: str = DEFAULT_REASON,
+                      runtime_file: str = RUNTIME_FILE, ralph_file: str = RALPH_FILE,
+                      boulder_file: str = BOULDER_FILE) -> dict:
+    """Disable continuation for a session and deactivate its loop states."""
+    key = session_key or SESSION_KEY_DEFAULT
+    boulder_paths = [boulder_file]
+    resolved = resolve_boulder_path(boulder_file, session_key)
+    if resolved != boulder_file:
+        boulder_paths.append(resolved)
+
+    results, ok = run_batch(
+        build_ops(key, boulder_paths, reason, runtime_file, ralph_file, boulder_file), session=key,
+    )
+
+    by_path = {r.get("path"): r for r in results if r.get("op") == "update"}
+    ralph_cancelled = ok and not by_path.get(ralph_file, {}).get("skipped")
+    deactivated = [p for p in boulder_paths if ok and not by_path.get(p, {}).get("skipped")]
+
+    emit_event(session_trace_id(session_key, SESSION_KEY_DEFAULT), "skill.stop_continuation", {
+        "sessionKey": key,
+        "ok": ok,
+        "ralphCancelled": ralph_cancelled,
+        "bouldersDeactivated": len(deactivated),
+    })
+
+    return {
+        "ok": ok,
+        "session": key,
+        "ralph": ralph_cancelled,
+        "boulders": deactivated,
+        "results": results,
+    }
+
+
+def format_summary(result: dict) -> str:
+    """One-line summary of a stop_continuation result."""
+    if not result["ok"]:
+        errors = [r.get("error", "") for r in result["results"] if not r.get("ok")]
+        return f"stop-continuation failed, nothing written: {'; '.join(e for e in errors if e)}"
+    boulders = ", ".join(result["boulders"]) or "none active"
+    ralph = "cancelled" if result["ralph"] else "not running"
+    return (f"Continuation disabled for session {result['session']}; "
+            f"ralph loop: {ralph}; boulder: {boulders}. Stop will no longer be blocked.")
+
+
+def _arg(args: list, flag: str, default: str = "") -> str:
+    if flag in args:
+        idx = args.index(flag)
+        if idx + 1 < len(args):
+            return args[idx + 1]
+    return default
+
+
+def main():
+    args = sys.argv[1:]
+    result = stop_continuation(_arg(args, "--session"), _arg(args, "--reason", DEFAULT_REASON))
+    print(format_summary(result))
+    sys.exit(0 if result["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,186 @@
 #!/usr/bin/env python3
-"""Fire-and-forget event/score emission to Langfuse.
+"""Spooled event/score emission to Langfuse or another exporter.
 
 Replaces langfuse-emit.sh.
 
 CONTRACT:
-  - Sends events or scores to Langfuse ingestion API.
-  - Fire-and-forget via daemon thread (never blocks hooks).
+  - emit_event / emit_score collect ingestion items in memory. flush() (run
+    at interpreter exit, or called explicitly) appends everything collected
+    by the invocation to a local JSONL spool (.agent-kit/telemetry/spool.jsonl)
+    in one O_APPEND write. There is no network I/O in the hook path.
+  - After appending, a detached flusher (`telemetry.py flush`, new session)
+    is started unless one is already running. The flusher holds a
+    single-instance lock (<spool dir>/flush.lock, its mtime refreshed every
+    FLUSH_LOCK_HEARTBEAT_SECONDS while held and treated as abandoned after
+    FLUSH_LOCK_STALE_SECONDS), drains the spool in batches of FLUSH_BATCH_ITEMS and
+    retries each batch with exponential backoff. Batches that still fail go
+    back to the spool for the next flush.
+  - Spool items are Langfuse ingestion items. The flusher hands each batch
+    to the exporter named by AGENT_KIT_TELEMETRY_EXPORTER (EXPORTERS):
+    "langfuse" (default) posts them to /api/public/ingestion, "jsonl" appends
+    them to a local file, "otlp" converts events and spans to OTLP spans and
+    scores to OTLP gauges (OTLP/HTTP, JSON encoding). Telemetry is enabled
+    iff the selected exporter is configured.
+  - Every item and its body get a UUIDv7 id (time-ordered, unique per
+    process even within one millisecond) at emit time. Ids are stored in the
+    spool, so retries and re-spooled batches resend the same ids and Langfuse
+    upserts them; a drain also skips ids it has already read.
+    session_trace_id() gives hooks without a session id one stable uuid5
+    trace per project.
+  - A circuit breaker (<spool dir>/breaker.json) opens after
+    BREAKER_FAILURE_THRESHOLD consecutive failed drains. While open, no
+    flusher is started and drains return at once. After the backoff
+    (BREAKER_BASE_SECONDS, doubling to BREAKER_MAX_SECONDS) the next drain is
+    half-open: it sends one batch with a single attempt, closing the breaker
+    on success and reopening it with a doubled backoff on failure.
+  - Emits keep spooling while the breaker is open, up to
+    AGENT_KIT_TELEMETRY_SPOOL_MAX_MB; beyond that new items are dropped and
+    counted with one O_APPEND line each in <spool dir>/dropped.count
+    (spool_dropped() sums it). breaker.json is only written by the
+    flusher, under the flush lock.
+  - record_latency() appends one fixed-size record (ts, µs, event, outcome,
+    log2 bucket with LATENCY_BUCKETS_PER_OCTAVE sub-buckets) to
+    .agent-kit/telemetry/latency.hist with a single O_APPEND write; no lock.
+    At LATENCY_MAX_RECORDS the file becomes latency.hist.1 (replacing the
+    previous generation), so the pair stays under ~200 KiB. Rotation runs
+    under a mkdir lock (latency.hist.lock) and re-checks the size, so two
+    hooks cannot both rotate. Recorded for
+    every hook invocation, with or without Langfuse.
+  - span(name, **attrs) times a phase with perf_counter_ns. Finished spans
+    are attached to the next emit_event as span-create child observations
+    (parent: the enclosing span, else the event), so they reach the spool
+    and the exporter together with their hook event, and are dropped with it if it
+    is sampled out. With telemetry off (or AGENT_KIT_TELEMETRY_SPANS=0,
+    checked once per process) span() returns a shared no-op context manager.
+  - Batches are split so none exceeds FLUSH_BATCH_ITEMS items or
+    FLUSH_BATCH_MAX_BYTES of JSON (an oversized single item goes alone).
+    Bodies of GZIP_MIN_BYTES or more are sent with Content-Encoding: gzip.
+    Each batch yields a metrics record (exporter, items, bytes, wireBytes,
+    gzip, attempts, latencyMs, ok): returned in drain_spool()["batchMetrics"] and
+    logged as "flush_batch" to the telemetry debug log (AGENT_KIT_DEBUG=1).
+  - Sampling happens before collection. Each event is kept with the rate of
+    the first AGENT_KIT_TELEMETRY_SAMPLE rule matching its name (default 1);
+    a score follows the decision of the last event on its trace in the same
+    process, else its own rule. Events whose metadata matches an
+    AGENT_KIT_TELEMETRY_KEEP rule are always kept. Kept items sampled below
+    1 carry metadata.sampleRate so aggregates can be re-weighted.
+  - AGENT_KIT_TELEMETRY_RATE enables a token bucket per trace (session),
+    persisted in <spool dir>/rate-buckets.json. Events over the limit are
+    dropped (with their scores); the next kept event carries
+    metadata.rateLimitedDropped. The bucket is best-effort across
+    concurrent hooks.
+  - HTTP goes through a shared ConnectionPool: keep-alive http.client
+    connections per host, at most POOL_MAX_CONNECTIONS requests in flight.
+    The flusher sends the batches of a spool segment concurrently through it.
   - On ANY failure: silently returns (fail-open).
-  - Never outputs to stdout.
+  - Never outputs to stdout (except the stats command).
 
 ENV:
   LANGFUSE_PUBLIC_KEY  — Langfuse public key
   LANGFUSE_SECRET_KEY  — Langfuse secret key
   LANGFUSE_BASE_URL    — Langfuse host URL
+  AGENT_KIT_TELEMETRY_EXPORTER — langfuse (default) | jsonl | otlp
+  AGENT_KIT_TELEMETRY_JSONL    — output file of the jsonl exporter
+  OTEL_EXPORTER_OTLP_ENDPOINT  — OTLP/HTTP base URL, e.g. http://localhost:4318
+  OTEL_EXPORTER_OTLP_HEADERS   — "key=value,..." extra OTLP request headers
+  OTEL_SERVICE_NAME            — OTLP service.name (default claude-agent-kit)
+  AGENT_KIT_TELEMETRY_SAMPLE — "name-glob=rate,..." e.g. "hook.pretool=0.1"
+  AGENT_KIT_TELEMETRY_KEEP   — "key=value,..." always-keep metadata rules
+                               (default "decision=block")
+  AGENT_KIT_TELEMETRY_RATE   — events per second per session (unset: no limit)
+  AGENT_KIT_TELEMETRY_BURST  — token bucket size (default 10 x rate, min 1)
+  AGENT_KIT_TELEMETRY_SPOOL_MAX_MB — spool size cap (default 20)
+  AGENT_KIT_TELEMETRY_SPANS  — 0 disables per-phase spans
 
 CLI:
   python3 telemetry.py event <trace_id> <event_name> <metadata_json>
   python3 telemetry.py score <trace_id> <score_name> <value> [data_type]
+  python3 telemetry.py flush [--spool DIR]   # drain the spool (used by the flusher)
+  python3 telemetry.py stats [--window 24h] [--json]
+    # hook latency p50/p90/p99/max and counts per event and outcome
 """
 
+import abc
+import atexit
 import base64
+import fnmatch
+import functools
+import glob
+import gzip
+import hashlib
+import http.client
 import json
 import os
+import math
+import random
+import struct
+import subprocess
 import sys
 import threading
 import time
-import urllib.request
-import urllib.error
-from datetime import datetime, timezone
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import unquote, urlsplit
+
+# Ensure plugin root is on sys.path so `from scripts.*` imports resolve
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+_PLUGIN_ROOT = os.path.dirname(_SCRIPT_DIR)
+if _PLUGIN_ROOT not in sys.path:
+    sys.path.insert(0, _PLUGIN_ROOT)
+
+from scripts._debug import debug
+
+SPOOL_DIR = ".agent-kit/telemetry"
+SPOOL_FILE = "spool.jsonl"
+FLUSH_LOCK = "flush.lock"
+FLUSH_LOCK_STALE_SECONDS = 120
+FLUSH_LOCK_HEARTBEAT_SECONDS = 30
+FLUSH_BATCH_ITEMS = 50
+FLUSH_BATCH_MAX_BYTES = 1024 * 1024
+GZIP_MIN_BYTES = 4096
+FLUSH_RETRIES = 3
+FLUSH_BACKOFF_SECONDS = 0.5
+POST_TIMEOUT_SECONDS = 5
+POOL_MAX_CONNECTIONS = 4
+BREAKER_FILE = "breaker.json"
+DROPPED_FILE = "dropped.count"
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_BASE_SECONDS = 30
+BREAKER_MAX_SECONDS = 1800
+DEFAULT_SPOOL_MAX_MB = 20
+RATE_BUCKETS_FILE = "rate-buckets.json"
+RATE_BUCKET_IDLE_SECONDS = 3600
+DEFAULT_KEEP_RULES = "decision=block"
+LATENCY_FILE = ".agent-kit/telemetry/latency.hist"
+LATENCY_MAX_RECORDS = 8192
+LATENCY_LOCK_STALE_SECONDS = 10
+LATENCY_BUCKETS_PER_OCTAVE = 4
+LATENCY_EVENTS = ("SessionStart", "UserPromptSubmit", "PreToolUse", "Stop", "unknown")
+LATENCY_OUTCOMES = ("ok", "block", "error")
+DEFAULT_STATS_WINDOW = "24h"
+DEFAULT_EXPORTER = "langfuse"
+OTLP_SERVICE_NAME = "claude-agent-kit"
+OTLP_SCOPE_NAME = "agent-kit.telemetry"
+
+# ts (epoch s), duration (µs, saturating), event, outcome, bucket, pad
+_LATENCY_RECORD = struct.Struct("<IIBBBx")
+_WINDOW_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Namespace for uuid5 trace ids of sessions without a session id
+_TRACE_NAMESPACE = uuid.UUID("6f1c3a52-9a4e-4f0b-8d57-2c1e7b9e4a10")
+
+# Per-invocation collector: ingestion items not yet spooled
+_BATCH = []
+_ATEXIT_REGISTERED = False
+
+# Sampling decision of the last event per trace: rate, or None if dropped
+_TRACE_DECISIONS = {}
+
+# Finished spans not yet attached to an event, and the open-span stack
+_SPANS = []
+_SPAN_STACK = []
+_SPANS_ENABLED = None
 
 
 def _get_config():
@@ -39,57 +192,1189 @@ def _get_config():
 
 
 def _is_enabled():
-    """Check if Langfuse telemetry is configured."""
-    base_url, public_key, secret_key = _get_config()
-    return bool(base_url and public_key and secret_key)
+    """Check if the selected telemetry exporter is configured."""
+    return get_exporter() is not None
 
 
-def _auth_header():
-    """Build HTTP Basic Auth header."""
-    _, public_key, secret_key = _get_config()
+@functools.lru_cache(maxsize=4)
+def _basic_auth(public_key: str, secret_key: str) -> str:
     creds = f"{public_key}:{secret_key}".encode("utf-8")
     encoded = base64.b64encode(creds).decode("utf-8")
     return f"Basic {encoded}"
 
 
+def _auth_header():
+    """Build HTTP Basic Auth header (cached per key pair)."""
+    _, public_key, secret_key = _get_config()
+    return _basic_auth(public_key, secret_key)
+
+
+@functools.lru_cache(maxsize=4)
+def _endpoint(base_url: str) -> tuple:
+    """(scheme, host, port, path prefix) of a Langfuse base URL."""
+    parts = urlsplit(base_url)
+    scheme = parts.scheme or "http"
+    port = parts.port or (443 if scheme == "https" else 80)
+    return scheme, parts.hostname or "", port, parts.path.rstrip("/")
+
+
 def _now_iso():
     """Current UTC time in ISO format."""
     return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
 
 
-def _generate_id(prefix: str):
-    """Generate a unique ID."""
-    return f"{prefix}-{int(time.time() * 1000000)}"
+def _iso_from_ns(epoch_ns: int) -> str:
+    """Epoch nanoseconds as ISO UTC with microseconds."""
+    return datetime.fromtimestamp(epoch_ns / 1e9, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+_UUID7_STATE = [0, 0]
+_UUID7_LOCK = threading.Lock()
+
+
+def _uuid7() -> str:
+    """Time-ordered UUIDv7 (RFC 9562): 48-bit ms timestamp, 12-bit counter, 62 random bits.
+
+    The counter starts at a random value each millisecond and increments
+    within it (borrowing the next millisecond on overflow), so ids from one
+    process are unique and sort in creation order.
+    """
+    ms = time.time_ns() // 1_000_000
+    with _UUID7_LOCK:
+        last_ms, counter = _UUID7_STATE
+        if ms > last_ms:
+            counter = random.getrandbits(11)
+        else:
+            ms, counter = last_ms, counter + 1
+            if counter > 0xFFF:
+                ms, counter = last_ms + 1, 0
+        _UUID7_STATE[:] = [ms, counter]
+    value = (ms << 80) | ((0x7000 | counter) << 64) | (0b10 << 62) | random.getrandbits(62)
+    h = f"{value:032x}"
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def session_trace_id(session_id: str, default_key: str = "global") -> str:
+    """Trace id of a session: its session id, else a UUID derived from the project.
+
+    Hooks without a session id share the project's default session
+    (default_key) in runtime state; their telemetry shares one stable trace.
+    """
+    if session_id:
+        return session_id
+    return str(uuid.uuid5(_TRACE_NAMESPACE, f"{os.path.realpath(os.getcwd())}\n{default_key}"))
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections per host with bounded concurrency.
+
+    At most `max_connections` requests are in flight at once; idle
+    connections are reused. A reused connection the server already closed
+    is retried once on a fresh one.
+    """
+
+    def __init__(self, max_connections: int = POOL_MAX_CONNECTIONS,
+                 timeout: float = POST_TIMEOUT_SECONDS):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _checkout(self, key: tuple):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = key
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=self.timeout), False
+
+    def _checkin(self, key: tuple, conn) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_connections:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, scheme: str, host: str, port: int, path: str,
+                body: bytes, headers: dict) -> int:
+        """Send one request and return its status code. Raises on I/O errors."""
+        key = (scheme, host, port)
+        with self._slots:
+            for attempt in range(2):
+                conn, reused = self._checkout(key)
+                try:
+                    conn.request("POST", path, body=body, headers=headers)
+                    resp = conn.getresponse()
+                    resp.read()
+                except (http.client.RemoteDisconnected, ConnectionError, http.client.BadStatusLine):
+                    conn.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                except Exception:
+                    conn.close()
+                    raise
+                if resp.will_close:
+                    conn.close()
+                else:
+                    self._checkin(key, conn)
+                return resp.status
+        return 0
+
+    def close(self) -> None:
+        with self._lock:
+            for idle in self._idle.values():
+                for conn in idle:
+                    conn.close()
+            self._idle.clear()
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """The process-wide connection pool (created on first use)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ConnectionPool()
+        return _POOL
+
+
+def _encode_body(body: dict) -> tuple:
+    """(wire bytes, JSON size, gzipped) for a request body."""
+    raw = json.dumps(body, separators=(",", ":")).encode("utf-8")
+    if len(raw) >= GZIP_MIN_BYTES:
+        return gzip.compress(raw, compresslevel=6), len(raw), True
+    return raw, len(raw), False
 
 
-def _post(endpoint: str, body: dict):
-    """POST to Langfuse API. Fire-and-forget, ignores all errors."""
+def _post_to(base_url: str, path: str, data: bytes, gzipped: bool, headers: dict) -> bool:
+    """POST an encoded JSON body through the pool. Returns True on a 2xx response."""
+    try:
+        scheme, host, port, prefix = _endpoint(base_url)
+        headers = {**headers, "Content-Type": "application/json"}
+        if gzipped:
+            headers["Content-Encoding"] = "gzip"
+        status = get_pool().request(scheme, host, port, f"{prefix}{path}", data, headers)
+        return 200 <= status < 300
+    except Exception:
+        return False
+
+
+def _post_encoded(endpoint: str, data: bytes, gzipped: bool) -> bool:
+    """POST an already encoded body to the Langfuse API. Returns True on a 2xx response."""
     try:
         base_url, _, _ = _get_config()
-        url = f"{base_url}/api/public{endpoint}"
-        data = json.dumps(body).encode("utf-8")
-        req = urllib.request.Request(
-            url,
-            data=data,
-            headers={
-                "Authorization": _auth_header(),
-                "Content-Type": "application/json",
-            },
-            method="POST",
-        )
-        urllib.request.urlopen(req, timeout=5)
+        headers = {"Authorization": _auth_header()}
     except Exception:
+        return False
+    return _post_to(base_url, f"/api/public{endpoint}", data, gzipped, headers)
+
+
+def _post(endpoint: str, body: dict) -> bool:
+    """POST to the Langfuse API. Returns True on a 2xx response."""
+    try:
+        data, _, gzipped = _encode_body(body)
+    except (TypeError, ValueError):
+        return False
+    return _post_encoded(endpoint, data, gzipped)
+
+
+# --- Exporters ---
+
+class Exporter(abc.ABC):
+    """Delivers batches of spooled ingestion items to one backend.
+
+    encode() turns a batch into requests, each a (target, data, JSON bytes,
+    gzipped) tuple; deliver() sends one request and returns True once it is
+    accepted. Both run in the flusher, never in a hook.
+    """
+
+    name = ""
+
+    @abc.abstractmethod
+    def configured(self) -> bool:
+        """True when the environment has everything this backend needs."""
+
+    @abc.abstractmethod
+    def encode(self, items: list) -> list:
+        """Requests for one batch: [(target, data, json_bytes, gzipped)]."""
+
+    @abc.abstractmethod
+    def deliver(self, target: str, data: bytes, gzipped: bool) -> bool:
+        """Send one request; True once the backend accepted it."""
+
+
+class LangfuseExporter(Exporter):
+    """Langfuse public ingestion API; spool items are already its batch items."""
+
+    name = "langfuse"
+
+    def configured(self) -> bool:
+        base_url, public_key, secret_key = _get_config()
+        return bool(base_url and public_key and secret_key)
+
+    def encode(self, items: list) -> list:
+        data, size, gzipped = _encode_body({"batch": items})
+        return [("/ingestion", data, size, gzipped)]
+
+    def deliver(self, target: str, data: bytes, gzipped: bool) -> bool:
+        return _post_encoded(target, data, gzipped)
+
+
+class JsonlExporter(Exporter):
+    """Appends items, one JSON object per line, to AGENT_KIT_TELEMETRY_JSONL."""
+
+    name = "jsonl"
+
+    def configured(self) -> bool:
+        return bool(os.environ.get("AGENT_KIT_TELEMETRY_JSONL"))
+
+    def encode(self, items: list) -> list:
+        data = "".join(json.dumps(item, separators=(",", ":")) + "\n" for item in items).encode("utf-8")
+        return [(os.environ.get("AGENT_KIT_TELEMETRY_JSONL", ""), data, len(data), False)]
+
+    def deliver(self, target: str, data: bytes, gzipped: bool) -> bool:
+        try:
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            fd = os.open(target, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            return True
+        except OSError:
+            return False
+
+
+@functools.lru_cache(maxsize=4)
+def _otlp_headers(spec: str) -> tuple:
+    """OTEL_EXPORTER_OTLP_HEADERS ("key=value,..." URL-encoded) -> ((key, value), ...)."""
+    headers = []
+    for part in spec.split(","):
+        key, sep, value = part.partition("=")
+        if sep and key.strip():
+            headers.append((unquote(key.strip()), unquote(value.strip())))
+    return tuple(headers)
+
+
+def _otlp_trace_id(value) -> str:
+    """32 hex chars: a UUID-shaped id as is, anything else hashed."""
+    compact = str(value).replace("-", "").lower()
+    if len(compact) == 32 and all(c in "0123456789abcdef" for c in compact):
+        return compact
+    return hashlib.sha256(str(value).encode("utf-8")).hexdigest()[:32]
+
+
+def _otlp_span_id(value) -> str:
+    return hashlib.sha256(str(value).encode("utf-8")).hexdigest()[:16]
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, str):
+        return {"stringValue": value}
+    return {"stringValue": json.dumps(value, separators=(",", ":"), default=str)}
+
+
+def _otlp_attributes(values: dict) -> list:
+    return [{"key": str(k), "value": _otlp_value(v)} for k, v in values.items() if v is not None]
+
+
+def _ns_from_iso(text) -> int:
+    """Epoch nanoseconds of an ISO UTC timestamp (now if it does not parse)."""
+    try:
+        parsed = datetime.strptime(str(text), "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return time.time_ns()
+    return (parsed - _EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def _otlp_span(item: dict) -> dict:
+    """An event-create (zero-length) or span-create item as an OTLP span."""
+    body = item["body"]
+    if item["type"] == "span-create":
+        start, end = _ns_from_iso(body.get("startTime")), _ns_from_iso(body.get("endTime"))
+    else:
+        start = end = _ns_from_iso(item.get("timestamp"))
+    metadata = body.get("metadata")
+    attrs = {"agent_kit.trace_id": body.get("traceId"),
+             **(metadata if isinstance(metadata, dict) else {})}
+    otlp_span = {
+        "traceId": _otlp_trace_id(body.get("traceId", "")),
+        "spanId": _otlp_span_id(body.get("id") or item.get("id")),
+        "name": str(body.get("name", "")),
+        "kind": 1,
+        "startTimeUnixNano": str(start),
+        "endTimeUnixNano": str(end),
+        "attributes": _otlp_attributes(attrs),
+    }
+    if body.get("parentObservationId"):
+        otlp_span["parentSpanId"] = _otlp_span_id(body["parentObservationId"])
+    return otlp_span
+
+
+class OtlpExporter(Exporter):
+    """OTLP/HTTP with JSON encoding: events and spans as spans, scores as gauges.
+
+    Posts to <OTEL_EXPORTER_OTLP_ENDPOINT>/v1/traces and /v1/metrics with
+    OTEL_EXPORTER_OTLP_HEADERS. Span and trace ids are derived from the
+    Langfuse ids, so a span's parent is its hook event.
+    """
+
+    name = "otlp"
+
+    def configured(self) -> bool:
+        return bool(os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT"))
+
+    def encode(self, items: list) -> list:
+        spans, gauges = [], {}
+        for item in items:
+            if item["type"] in ("event-create", "span-create"):
+                spans.append(_otlp_span(item))
+            elif item["type"] == "score-create":
+                body = item["body"]
+                try:
+                    value = float(body.get("value"))
+                except (TypeError, ValueError):
+                    continue
+                metadata = body.get("metadata")
+                attrs = {"agent_kit.trace_id": body.get("traceId"), "dataType": body.get("dataType"),
+                         **(metadata if isinstance(metadata, dict) else {})}
+                gauges.setdefault(str(body.get("name", "")), []).append({
+                    "timeUnixNano": str(_ns_from_iso(item.get("timestamp"))),
+                    "asDouble": value,
+                    "attributes": _otlp_attributes(attrs),
+                })
+
+        resource = {"attributes": _otlp_attributes(
+            {"service.name": os.environ.get("OTEL_SERVICE_NAME") or OTLP_SERVICE_NAME})}
+        scope = {"name": OTLP_SCOPE_NAME}
+        requests = []
+        if spans:
+            body = {"resourceSpans": [{"resource": resource,
+                                       "scopeSpans": [{"scope": scope, "spans": spans}]}]}
+            requests.append(("/v1/traces", *_encode_body(body)))
+        if gauges:
+            metrics = [{"name": name, "gauge": {"dataPoints": points}} for name, points in gauges.items()]
+            body = {"resourceMetrics": [{"resource": resource,
+                                         "scopeMetrics": [{"scope": scope, "metrics": metrics}]}]}
+            requests.append(("/v1/metrics", *_encode_body(body)))
+        return requests
+
+    def deliver(self, target: str, data: bytes, gzipped: bool) -> bool:
+        headers = dict(_otlp_headers(os.environ.get("OTEL_EXPORTER_OTLP_HEADERS", "")))
+        return _post_to(os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", ""), target, data, gzipped, headers)
+
+
+EXPORTERS = {
+    LangfuseExporter.name: LangfuseExporter,
+    JsonlExporter.name: JsonlExporter,
+    OtlpExporter.name: OtlpExporter,
+}
+
+
+def get_exporter() -> Exporter | None:
+    """The exporter named by AGENT_KIT_TELEMETRY_EXPORTER, or None if it is not configured."""
+    name = os.environ.get("AGENT_KIT_TELEMETRY_EXPORTER", "").strip().lower() or DEFAULT_EXPORTER
+    exporter_cls = EXPORTERS.get(name)
+    if exporter_cls is None:
+        return None
+    exporter = exporter_cls()
+    return exporter if exporter.configured() else None
+
+
+# --- Spool ---
+
+def _spool_path(spool_dir: str | None = None) -> str:
+    return os.path.join(spool_dir or SPOOL_DIR, SPOOL_FILE)
+
+
+def _spool_max_bytes() -> int:
+    try:
+        value = float(os.environ.get("AGENT_KIT_TELEMETRY_SPOOL_MAX_MB", ""))
+    except ValueError:
+        value = 0
+    return int((value if value > 0 else DEFAULT_SPOOL_MAX_MB) * 1024 * 1024)
+
+
+def _spool_append(items: list, spool_dir: str | None = None, capped: bool = False) -> bool:
+    """Append ingestion items to the spool in one write.
+
+    capped=True (new emits) drops the items instead if the spool is full.
+    """
+    if not items:
+        return True
+    payload = "".join(json.dumps(item, separators=(",", ":")) + "\n" for item in items)
+    if capped:
+        try:
+            size = os.stat(_spool_path(spool_dir)).st_size
+        except OSError:
+            size = 0
+        if size + len(payload) > _spool_max_bytes():
+            _count_dropped(spool_dir or SPOOL_DIR, len(items))
+            return False
+    try:
+        os.makedirs(spool_dir or SPOOL_DIR, exist_ok=True)
+        fd = os.open(_spool_path(spool_dir), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, payload.encode("utf-8"))
+        finally:
+            os.close(fd)
+        return True
+    except OSError:
+        return False
+
+
+def _read_json_file(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _write_json_file(path: str, data: dict) -> None:
+    """Atomic replace; last writer wins."""
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+
+def _count_dropped(spool_dir: str, count: int) -> None:
+    """Append a drop count; one small O_APPEND write, so concurrent hooks never lose counts."""
+    try:
+        os.makedirs(spool_dir, exist_ok=True)
+        fd = os.open(os.path.join(spool_dir, DROPPED_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, f"{count}\n".encode("ascii"))
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def spool_dropped(spool_dir: str | None = None) -> int:
+    """Total items dropped because the spool was full."""
+    total = 0
+    try:
+        with open(os.path.join(spool_dir or SPOOL_DIR, DROPPED_FILE), "r", encoding="ascii", errors="replace") as f:
+            for line in f:
+                try:
+                    total += int(line)
+                except ValueError:
+                    continue
+    except OSError:
+        return 0
+    return total
+
+
+# --- Circuit breaker ---
+
+def load_breaker(spool_dir: str | None = None) -> dict:
+    """Breaker state: {"state", "failures", "openedAt", "retryAt", "backoffSeconds"}."""
+    state = _read_json_file(os.path.join(spool_dir or SPOOL_DIR, BREAKER_FILE))
+    state.setdefault("state", "closed")
+    state.setdefault("failures", 0)
+    return state
+
+
+def _breaker_update(spool_dir: str, **changes) -> dict:
+    """Read-modify-write of breaker.json; callers hold the flush lock."""
+    state = load_breaker(spool_dir)
+    state.update(changes)
+    _write_json_file(os.path.join(spool_dir, BREAKER_FILE), state)
+    return state
+
+
+def _breaker_mode(spool_dir: str, now: float | None = None) -> str:
+    """"closed", "open" (skip sending) or "half-open" (send one probe)."""
+    state = load_breaker(spool_dir)
+    if state["state"] == "closed":
+        return "closed"
+    now = time.time() if now is None else now
+    return "half-open" if now >= float(state.get("retryAt", 0)) else "open"
+
+
+def _breaker_record(spool_dir: str, ok: bool, probe: bool = False,
+                    now: float | None = None) -> dict:
+    """Update the breaker after a drain pass."""
+    state = load_breaker(spool_dir)
+    if ok:
+        if state["state"] == "closed" and not state["failures"]:
+            return state
+        return _breaker_update(spool_dir, state="closed", failures=0,
+                               openedAt=None, retryAt=None, backoffSeconds=None)
+
+    now = time.time() if now is None else now
+    failures = int(state["failures"]) + 1
+    if not probe and failures < BREAKER_FAILURE_THRESHOLD:
+        return _breaker_update(spool_dir, failures=failures)
+    previous = state.get("backoffSeconds") if probe else None
+    backoff = min(BREAKER_MAX_SECONDS, previous * 2 if previous else BREAKER_BASE_SECONDS)
+    debug("breaker_open", source="telemetry", phase="flush", failures=failures, backoffSeconds=backoff)
+    return _breaker_update(spool_dir, state="open", failures=failures, openedAt=now,
+                           retryAt=now + backoff, backoffSeconds=backoff)
+
+
+def _read_items(path: str) -> list:
+    """Parse a spool file, skipping torn or corrupt lines."""
+    items = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except (json.JSONDecodeError, ValueError):
+                    continue
+                if isinstance(item, dict) and "type" in item and "body" in item:
+                    items.append(item)
+    except OSError:
+        pass
+    return items
+
+
+def _acquire_flush_lock(spool_dir: str) -> str | None:
+    lock_dir = os.path.join(spool_dir, FLUSH_LOCK)
+    try:
+        os.mkdir(lock_dir)
+        return lock_dir
+    except FileExistsError:
         pass
+    except OSError:
+        return None
+    # Break a lock left behind by a killed flusher
+    try:
+        if time.time() - os.stat(lock_dir).st_mtime < FLUSH_LOCK_STALE_SECONDS:
+            return None
+        os.rmdir(lock_dir)
+        os.mkdir(lock_dir)
+        return lock_dir
+    except OSError:
+        return None
+
+
+def _hold_flush_lock(lock_dir: str) -> threading.Event:
+    """Keep a held flush lock fresh until the returned event is set.
 
+    A slow drain (retries, backoff, a large spool) would otherwise look
+    abandoned after FLUSH_LOCK_STALE_SECONDS and a second flusher would
+    resend the same segments. A killed flusher stops refreshing.
+    """
+    released = threading.Event()
 
-def _post_background(endpoint: str, body: dict):
-    """Fire-and-forget POST in a daemon thread."""
-    t = threading.Thread(target=_post, args=(endpoint, body), daemon=True)
-    t.start()
+    def beat():
+        while not released.wait(FLUSH_LOCK_HEARTBEAT_SECONDS):
+            try:
+                os.utime(lock_dir)
+            except OSError:
+                return
+
+    threading.Thread(target=beat, name="agent-kit-flush-lock", daemon=True).start()
+    return released
+
+
+def _flusher_running(spool_dir: str) -> bool:
+    try:
+        age = time.time() - os.stat(os.path.join(spool_dir, FLUSH_LOCK)).st_mtime
+    except OSError:
+        return False
+    return age < FLUSH_LOCK_STALE_SECONDS
+
+
+def _start_flusher(spool_dir: str | None = None) -> None:
+    """Start a detached `telemetry.py flush` unless one is already running."""
+    spool_dir = os.path.abspath(spool_dir or SPOOL_DIR)
+    if _flusher_running(spool_dir) or _breaker_mode(spool_dir) == "open":
+        return
+    try:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "flush", "--spool", spool_dir],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+            close_fds=True,
+        )
+    except OSError:
+        pass
+
+
+def _split_batches(items: list) -> list:
+    """Group items into batches within FLUSH_BATCH_ITEMS and FLUSH_BATCH_MAX_BYTES."""
+    batches, current, size = [], [], 0
+    for item in items:
+        item_size = len(json.dumps(item, separators=(",", ":")).encode("utf-8")) + 1
+        if current and (len(current) >= FLUSH_BATCH_ITEMS or size + item_size > FLUSH_BATCH_MAX_BYTES):
+            batches.append(current)
+            current, size = [], 0
+        current.append(item)
+        size += item_size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _send_batch(items: list, retries: int | None = None,
+                exporter: Exporter | None = None) -> dict:
+    """Export one batch with retries and exponential backoff.
+
+    Returns the batch metrics record; "ok" tells whether it was delivered.
+    Requests the exporter already accepted are not repeated on retry.
+    """
+    retries = FLUSH_RETRIES if retries is None else retries
+    exporter = exporter or get_exporter()
+    metrics = {"exporter": exporter.name if exporter else "", "items": len(items), "bytes": 0,
+               "wireBytes": 0, "gzip": False, "attempts": 0, "latencyMs": 0.0, "ok": False}
+    if exporter is None:
+        return metrics
+    try:
+        pending = exporter.encode(items)
+    except (TypeError, ValueError, KeyError):
+        return metrics
+    metrics["bytes"] = sum(size for _, _, size, _ in pending)
+    metrics["wireBytes"] = sum(len(data) for _, data, _, _ in pending)
+    metrics["gzip"] = any(gzipped for _, _, _, gzipped in pending)
+
+    start_ns = time.perf_counter_ns()
+    for attempt in range(retries):
+        metrics["attempts"] = attempt + 1
+        pending = [req for req in pending if not exporter.deliver(req[0], req[1], req[3])]
+        if not pending:
+            metrics["ok"] = True
+            break
+        if attempt + 1 < retries:
+            time.sleep(FLUSH_BACKOFF_SECONDS * (2 ** attempt))
+    metrics["latencyMs"] = round((time.perf_counter_ns() - start_ns) / 1e6, 2)
+    debug("flush_batch", source="telemetry", phase="flush", **metrics)
+    return metrics
+
+
+def _inflight_files(spool_dir: str) -> list:
+    """Spool segments claimed by a flusher (possibly one that was killed)."""
+    return sorted(glob.glob(os.path.join(spool_dir, "inflight-*.jsonl")))
+
+
+def _has_pending(spool_dir: str) -> bool:
+    return os.path.exists(_spool_path(spool_dir)) or bool(_inflight_files(spool_dir))
+
+
+def _drain_once(spool_dir: str, stats: dict, probe: bool = False) -> bool:
+    """Claim the spool and send it. Returns False if delivery failed.
+
+    probe=True sends only the first batch, once; the rest is re-spooled.
+    """
+    spool = _spool_path(spool_dir)
+    claimed = _inflight_files(spool_dir)
+    if os.path.exists(spool):
+        inflight = os.path.join(spool_dir, f"inflight-{time.time_ns()}-{os.getpid()}.jsonl")
+        try:
+            os.rename(spool, inflight)
+            claimed.append(inflight)
+        except OSError:
+            pass
+
+    seen = set()
+    for path in claimed:
+        batches = _split_batches(_unseen_items(_read_items(path), seen))
+        if probe and batches:
+            # Half-open: one request decides; everything else waits for the next pass
+            result = _send_batch(batches[0], retries=1)
+            stats["batchMetrics"].append(result)
+            unsent = batches[1:] if result["ok"] else batches
+            _spool_append([item for batch in unsent for item in batch], spool_dir)
+            for rest in claimed[claimed.index(path) + 1:]:
+                _spool_append(_read_items(rest), spool_dir)
+                _unlink(rest)
+            _unlink(path)
+            if result["ok"]:
+                stats["batches"] += 1
+                stats["sentItems"] += len(batches[0])
+            else:
+                stats["failedItems"] += sum(len(b) for b in batches)
+            return result["ok"]
+        results = _send_batches(batches)
+        stats["batchMetrics"].extend(results)
+        failed = [batch for batch, m in zip(batches, results) if not m["ok"]]
+        stats["batches"] += len(batches) - len(failed)
+        stats["sentItems"] += sum(len(b) for b in batches) - sum(len(b) for b in failed)
+        if failed:
+            # Keep everything not yet delivered for the next flush
+            _spool_append([item for batch in failed for item in batch], spool_dir)
+            for rest in claimed[claimed.index(path) + 1:]:
+                _spool_append(_read_items(rest), spool_dir)
+                _unlink(rest)
+            _unlink(path)
+            stats["failedItems"] += sum(len(b) for b in failed)
+            return False
+        _unlink(path)
+    return True
+
+
+def _unseen_items(items: list, seen: set) -> list:
+    """Items whose id is not in seen (which is updated).
+
+    A flusher killed after re-spooling can leave an item in two segments;
+    it is sent once per drain. A copy in a later drain carries the same ids,
+    which Langfuse upserts instead of duplicating.
+    """
+    unseen = []
+    for item in items:
+        item_id = item.get("id")
+        if item_id is not None:
+            if item_id in seen:
+                continue
+            seen.add(item_id)
+        unseen.append(item)
+    return unseen
+
+
+def _send_batches(batches: list) -> list:
+    """Send batches concurrently (bounded by the pool). Returns one metrics record per batch."""
+    exporter = get_exporter()
+    if len(batches) <= 1:
+        return [_send_batch(batch, exporter=exporter) for batch in batches]
+    workers = min(len(batches), get_pool().max_connections)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(functools.partial(_send_batch, exporter=exporter), batches))
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def drain_spool(spool_dir: str | None = None) -> dict:
+    """Send everything in the spool. Single instance; returns delivery stats."""
+    spool_dir = spool_dir or SPOOL_DIR
+    stats = {"batches": 0, "sentItems": 0, "failedItems": 0, "locked": False,
+             "breaker": "closed", "batchMetrics": []}
+    if not _is_enabled():
+        return stats
+
+    while True:
+        lock_dir = _acquire_flush_lock(spool_dir)
+        if lock_dir is None:
+            stats["locked"] = True
+            return stats
+        heartbeat = _hold_flush_lock(lock_dir)
+        try:
+            delivered = True
+            while delivered and _has_pending(spool_dir):
+                stats["breaker"] = _breaker_mode(spool_dir)
+                if stats["breaker"] == "open":
+                    return stats
+                probe = stats["breaker"] == "half-open"
+                delivered = _drain_once(spool_dir, stats, probe=probe)
+                stats["breaker"] = _breaker_record(spool_dir, delivered, probe=probe)["state"]
+            if not delivered:
+                return stats
+        finally:
+            heartbeat.set()
+            try:
+                os.rmdir(lock_dir)
+            except OSError:
+                pass
+        # An emitter that saw our lock skipped starting a flusher: recheck
+        if not _has_pending(spool_dir):
+            return stats
+
+
+# --- Sampling and rate limiting ---
+
+@functools.lru_cache(maxsize=8)
+def _parse_sample_rules(spec: str) -> tuple:
+    """"glob=rate,..." -> ((glob, rate), ...); malformed entries are ignored."""
+    rules = []
+    for part in spec.split(","):
+        pattern, sep, value = part.strip().partition("=")
+        if not sep or not pattern.strip():
+            continue
+        try:
+            rate = float(value)
+        except ValueError:
+            continue
+        rules.append((pattern.strip(), min(1.0, max(0.0, rate))))
+    return tuple(rules)
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_keep_rules(spec: str) -> tuple:
+    """"key=value,..." -> ((key, value), ...)."""
+    rules = []
+    for part in spec.split(","):
+        key, sep, value = part.strip().partition("=")
+        if sep and key.strip():
+            rules.append((key.strip(), value.strip()))
+    return tuple(rules)
+
+
+def _sample_rate(name: str) -> float:
+    for pattern, rate in _parse_sample_rules(os.environ.get("AGENT_KIT_TELEMETRY_SAMPLE", "")):
+        if fnmatch.fnmatchcase(name, pattern):
+            return rate
+    return 1.0
+
+
+def _always_keep(metadata: dict) -> bool:
+    spec = os.environ.get("AGENT_KIT_TELEMETRY_KEEP", DEFAULT_KEEP_RULES)
+    for key, value in _parse_keep_rules(spec):
+        actual = metadata.get(key)
+        if actual is not None and str(actual).lower() == value.lower():
+            return True
+    return False
+
+
+def _rate_limit() -> tuple | None:
+    """(tokens per second, burst) from the environment, or None if unlimited."""
+    try:
+        rate = float(os.environ.get("AGENT_KIT_TELEMETRY_RATE", ""))
+    except ValueError:
+        return None
+    if rate <= 0:
+        return None
+    try:
+        burst = float(os.environ.get("AGENT_KIT_TELEMETRY_BURST", ""))
+    except ValueError:
+        burst = 0
+    return rate, burst if burst >= 1 else max(1.0, rate * 10)
+
+
+def _take_token(trace_id: str, keep: bool, now: float | None = None) -> tuple:
+    """Spend one token of the trace's bucket. Returns (allowed, dropped before).
+
+    keep=True always succeeds (it may overdraw to zero). Dropped events are
+    counted until the next allowed one, which reports and resets the count.
+    """
+    limit = _rate_limit()
+    if limit is None:
+        return True, 0
+    rate, burst = limit
+    now = time.time() if now is None else now
+    path = os.path.join(SPOOL_DIR, RATE_BUCKETS_FILE)
+    buckets = _read_json_file(path)
+
+    bucket = buckets.get(trace_id) or {"tokens": burst, "ts": now, "dropped": 0}
+    tokens = min(burst, bucket.get("tokens", burst) + max(0.0, now - bucket.get("ts", now)) * rate)
+    dropped = int(bucket.get("dropped", 0))
+    allowed = keep or tokens >= 1
+    if allowed:
+        buckets[trace_id] = {"tokens": max(0.0, tokens - 1), "ts": now, "dropped": 0}
+    else:
+        buckets[trace_id] = {"tokens": tokens, "ts": now, "dropped": dropped + 1}
+
+    buckets = {k: v for k, v in buckets.items()
+               if isinstance(v, dict) and now - v.get("ts", 0) < RATE_BUCKET_IDLE_SECONDS}
+    _write_json_file(path, buckets)
+    return allowed, dropped if allowed else 0
+
+
+def _admit_event(trace_id: str, name: str, metadata: dict) -> bool:
+    """Sampling + rate limiting for one event; annotates metadata if kept."""
+    keep = _always_keep(metadata)
+    rate = 1.0 if keep else _sample_rate(name)
+    if not keep and rate < 1.0 and random.random() >= rate:
+        _TRACE_DECISIONS[trace_id] = None
+        return False
+    allowed, dropped = _take_token(trace_id, keep)
+    if not allowed:
+        _TRACE_DECISIONS[trace_id] = None
+        return False
+    if rate < 1.0:
+        metadata["sampleRate"] = rate
+    if dropped:
+        metadata["rateLimitedDropped"] = dropped
+    _TRACE_DECISIONS[trace_id] = rate
+    return True
+
+
+def _admit_score(trace_id: str, name: str) -> tuple:
+    """(keep, sample rate) for a score: follows its trace's last event."""
+    if trace_id in _TRACE_DECISIONS:
+        rate = _TRACE_DECISIONS[trace_id]
+        return rate is not None, rate or 0.0
+    rate = _sample_rate(name)
+    if rate < 1.0 and random.random() >= rate:
+        return False, rate
+    return True, rate
+
+
+# --- Latency histograms ---
+
+def _latency_bucket(duration_us: int) -> int:
+    if duration_us <= 1:
+        return 0
+    return min(255, int(math.log2(duration_us) * LATENCY_BUCKETS_PER_OCTAVE))
+
+
+def _bucket_upper_us(bucket: int) -> float:
+    return 2 ** ((bucket + 1) / LATENCY_BUCKETS_PER_OCTAVE)
+
+
+def _rotate_latency(path: str) -> None:
+    """Move a full histogram to .1 under a mkdir lock.
+
+    The size is re-checked inside the lock, so a hook that saw the old file
+    full cannot rotate the fresh one over the generation just saved. If
+    another hook holds the lock this one skips rotating and just appends.
+    """
+    lock_dir = f"{path}.lock"
+    try:
+        os.mkdir(lock_dir)
+    except FileExistsError:
+        # Break a lock left behind by a killed hook; the next append rotates
+        try:
+            if time.time() - os.stat(lock_dir).st_mtime >= LATENCY_LOCK_STALE_SECONDS:
+                os.rmdir(lock_dir)
+        except OSError:
+            pass
+        return
+    try:
+        if os.stat(path).st_size >= LATENCY_MAX_RECORDS * _LATENCY_RECORD.size:
+            os.replace(path, f"{path}.1")
+    finally:
+        try:
+            os.rmdir(lock_dir)
+        except OSError:
+            pass
+
+
+def record_latency(event: str, outcome: str, duration_us: int, path: str | None = None,
+                   now: float | None = None) -> bool:
+    """Append one hook latency sample (single write; rotation takes a short lock)."""
+    path = path or LATENCY_FILE
+    event_code = LATENCY_EVENTS.index(event) if event in LATENCY_EVENTS else len(LATENCY_EVENTS) - 1
+    outcome_code = LATENCY_OUTCOMES.index(outcome) if outcome in LATENCY_OUTCOMES else 0
+    duration_us = max(0, min(int(duration_us), 0xFFFFFFFF))
+    record = _LATENCY_RECORD.pack(
+        int(time.time() if now is None else now), duration_us,
+        event_code, outcome_code, _latency_bucket(duration_us),
+    )
+    try:
+        try:
+            if os.stat(path).st_size >= LATENCY_MAX_RECORDS * _LATENCY_RECORD.size:
+                _rotate_latency(path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, record)
+        finally:
+            os.close(fd)
+        return True
+    except OSError:
+        return False
+
+
+def _read_latency(path: str):
+    for generation in (f"{path}.1", path):
+        try:
+            with open(generation, "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        usable = len(data) - len(data) % _LATENCY_RECORD.size
+        yield from _LATENCY_RECORD.iter_unpack(data[:usable])
+
+
+def latency_stats(window_seconds: float | None = None, path: str | None = None,
+                  now: float | None = None) -> list:
+    """Rows of {event, outcome, count, p50_ms, p90_ms, p99_ms, max_ms} over the window.
+
+    Percentiles are bucket upper bounds (capped at the exact max).
+    """
+    now = time.time() if now is None else now
+    since = now - window_seconds if window_seconds else 0
+    groups = {}
+    for ts, duration_us, event_code, outcome_code, bucket in _read_latency(path or LATENCY_FILE):
+        if ts < since or event_code >= len(LATENCY_EVENTS) or outcome_code >= len(LATENCY_OUTCOMES):
+            continue
+        group = groups.setdefault((event_code, outcome_code), {"buckets": {}, "count": 0, "max": 0})
+        group["buckets"][bucket] = group["buckets"].get(bucket, 0) + 1
+        group["count"] += 1
+        group["max"] = max(group["max"], duration_us)
+
+    rows = []
+    for (event_code, outcome_code), group in sorted(groups.items()):
+        row = {"event": LATENCY_EVENTS[event_code], "outcome": LATENCY_OUTCOMES[outcome_code],
+               "count": group["count"]}
+        for pct in (50, 90, 99):
+            rank = max(1, math.ceil(pct / 100 * group["count"]))
+            seen = 0
+            for bucket in sorted(group["buckets"]):
+                seen += group["buckets"][bucket]
+                if seen >= rank:
+                    row[f"p{pct}_ms"] = round(min(_bucket_upper_us(bucket), group["max"]) / 1000, 2)
+                    break
+        row["max_ms"] = round(group["max"] / 1000, 2)
+        rows.append(row)
+    return rows
+
+
+def parse_window(text: str) -> float | None:
+    """"90s" / "30m" / "24h" / "7d" -> seconds; "all" -> None."""
+    text = (text or "").strip().lower()
+    if text == "all":
+        return None
+    unit = _WINDOW_UNITS.get(text[-1:], None)
+    number = text[:-1] if unit else text
+    try:
+        value = float(number)
+    except ValueError:
+        raise ValueError(f"invalid window: {text!r}")
+    return value * (unit or 1)
+
+
+def format_stats(rows: list, window: str) -> str:
+    lines = [f"hook latency over {window} (ms)",
+             f"{'event':<18} {'outcome':<8} {'count':>7} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}"]
+    for row in rows:
+        lines.append(
+            f"{row['event']:<18} {row['outcome']:<8} {row['count']:>7} {row['p50_ms']:>9} "
+            f"{row['p90_ms']:>9} {row['p99_ms']:>9} {row['max_ms']:>9}"
+        )
+    if not rows:
+        lines.append("(no samples)")
+    return "\n".join(lines)
+
+
+# --- Spans ---
+
+class _NoopSpan:
+    """Returned by span() when spans are off: no clock reads, no allocation."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """One timed phase; use through span()."""
+
+    __slots__ = ("name", "attrs", "id", "parent_id", "wall_ns", "start_ns", "end_ns")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.id = ""
+        self.parent_id = None
+        self.wall_ns = self.start_ns = self.end_ns = 0
+
+    def __enter__(self):
+        self.id = _uuid7()
+        self.parent_id = _SPAN_STACK[-1].id if _SPAN_STACK else None
+        _SPAN_STACK.append(self)
+        self.wall_ns = time.time_ns()
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.perf_counter_ns()
+        if _SPAN_STACK and _SPAN_STACK[-1] is self:
+            _SPAN_STACK.pop()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _SPANS.append(self)
+        return False
+
+    def set(self, **attrs) -> None:
+        """Attach attributes (e.g. sizes) discovered inside the phase."""
+        self.attrs.update(attrs)
+
+
+def spans_enabled() -> bool:
+    """Decided once per process: environment lookups cost more than a span."""
+    global _SPANS_ENABLED
+    if _SPANS_ENABLED is None:
+        _SPANS_ENABLED = os.environ.get("AGENT_KIT_TELEMETRY_SPANS") != "0" and _is_enabled()
+    return _SPANS_ENABLED
+
+
+def span(name: str, **attrs):
+    """Context manager timing one phase of the current hook invocation."""
+    if not (_SPANS_ENABLED if _SPANS_ENABLED is not None else spans_enabled()):
+        return _NOOP_SPAN
+    return Span(name, attrs)
+
+
+def _span_items(trace_id: str, event_id: str) -> list:
+    """span-create items for finished spans, parented to event_id."""
+    items = []
+    for finished in _SPANS:
+        duration_ns = finished.end_ns - finished.start_ns
+        items.append({
+            "id": _uuid7(),
+            "type": "span-create",
+            "timestamp": _now_iso(),
+            "body": {
+                "id": finished.id,
+                "traceId": trace_id,
+                "parentObservationId": finished.parent_id or event_id,
+                "name": finished.name,
+                "startTime": _iso_from_ns(finished.wall_ns),
+                "endTime": _iso_from_ns(finished.wall_ns + duration_ns),
+                "metadata": {**finished.attrs, "durationUs": duration_ns // 1000},
+            },
+        })
+    _SPANS.clear()
+    return items
+
+
+# --- Emission ---
+
+def _enqueue(item: dict) -> None:
+    global _ATEXIT_REGISTERED
+    _BATCH.append(item)
+    if not _ATEXIT_REGISTERED:
+        atexit.register(flush)
+        _ATEXIT_REGISTERED = True
+
+
+def flush() -> int:
+    """Spool everything collected so far (one write) and start the flusher.
+
+    Returns the number of items spooled.
+    """
+    if not _BATCH:
+        return 0
+    items = list(_BATCH)
+    _BATCH.clear()
+    if not _spool_append(items, capped=True):
+        return 0
+    _start_flusher()
+    return len(items)
 
 
 def emit_event(trace_id: str, name: str, metadata: dict | str | None = None):
-    """Emit an event to Langfuse (fire-and-forget)."""
+    """Emit a hook event (collected; spooled by flush())."""
     if not _is_enabled():
         return
 
@@ -100,24 +1385,31 @@ def emit_event(trace_id: str, name: str, metadata: dict | str | None = None):
             metadata = {}
     elif metadata is None:
         metadata = {}
+    if not isinstance(metadata, dict):
+        metadata = {"value": metadata}
 
-    body = {
-        "batch": [{
-            "id": _generate_id(name),
-            "type": "event-create",
-            "timestamp": _now_iso(),
-            "body": {
-                "traceId": trace_id,
-                "name": name,
-                "metadata": metadata,
-            },
-        }],
-    }
-    _post_background("/ingestion", body)
+    if not _admit_event(trace_id, name, metadata):
+        _SPANS.clear()
+        return
+
+    event_id = _uuid7()
+    _enqueue({
+        "id": _uuid7(),
+        "type": "event-create",
+        "timestamp": _now_iso(),
+        "body": {
+            "id": event_id,
+            "traceId": trace_id,
+            "name": name,
+            "metadata": metadata,
+        },
+    })
+    for item in _span_items(trace_id, event_id):
+        _enqueue(item)
 
 
 def emit_score(trace_id: str, name: str, value, data_type: str = "NUMERIC"):
-    """Emit a score to Langfuse (fire-and-forget)."""
+    """Emit a score (collected; spooled by flush())."""
     if not _is_enabled():
         return
 
@@ -130,20 +1422,33 @@ def emit_score(trace_id: str, name: str, value, data_type: str = "NUMERIC"):
         except (ValueError, TypeError):
             value = 0
 
+    keep, rate = _admit_score(trace_id, name)
+    if not keep:
+        return
+
     body = {
-        "batch": [{
-            "id": _generate_id(name),
-            "type": "score-create",
-            "timestamp": _now_iso(),
-            "body": {
-                "traceId": trace_id,
-                "name": name,
-                "value": value,
-                "dataType": data_type,
-            },
-        }],
+        "id": _uuid7(),
+        "traceId": trace_id,
+        "name": name,
+        "value": value,
+        "dataType": data_type,
     }
-    _post_background("/ingestion", body)
+    if rate < 1.0:
+        body["metadata"] = {"sampleRate": rate}
+    _enqueue({
+        "id": _uuid7(),
+        "type": "score-create",
+        "timestamp": _now_iso(),
+        "body": body,
+    })
+
+
+def _arg(args: list, flag: str, default: str = "") -> str:
+    if flag in args:
+        idx = args.index(flag)
+        if idx + 1 < len(args):
+            return args[idx + 1]
+    return default
 
 
 def main():
@@ -151,6 +1456,26 @@ def main():
         sys.exit(0)
 
     mode = sys.argv[1]
+
+    if mode == "flush":
+        drain_spool(_arg(sys.argv[2:], "--spool") or None)
+        sys.exit(0)
+
+    if mode == "stats":
+        args = sys.argv[2:]
+        window = _arg(args, "--window", DEFAULT_STATS_WINDOW)
+        try:
+            rows = latency_stats(parse_window(window))
+        except ValueError as e:
+            print(f"telemetry-stats: {e}", file=sys.stderr)
+            sys.exit(1)
+        if "--json" in args:
+            for row in rows:
+                print(json.dumps(row))
+        else:
+            print(format_stats(rows, window))
+        sys.exit(0)
+
     trace_id = sys.argv[2] if len(sys.argv) > 2 else ""
 
     if not mode or not trace_id: